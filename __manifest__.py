@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 {
     'name': 'SMS es',
-    'version': '1.0.0',
+    'version': '1.0.1',
     'author': 'Rafael Solitario',
     'category': 'Marketing/SMS Marketing',
     'summary': 'Conector para envío de SMS a través de proveedores españoles.',
@@ -22,10 +22,18 @@
         'security/ir.model.access.csv', # Asegúrate de crear este archivo
         #'views/sms_es_connector_menus.xml',
         
+        'data/sms_es_connector_config.xml',
         'data/sms_es_dashboard_data.xml',
 
         'views/sms_es_message_views.xml',
+        'views/sms_es_campaign_views.xml',
         'views/sms_es_dlr_event_views.xml',
+        'views/sms_es_message_stat_views.xml',
+        'views/sms_es_latency_stat_views.xml',
+        'views/sms_es_metric_views.xml',
+        'views/sms_es_worker_run_views.xml',
+        'views/sms_es_archive_views.xml',
+        'views/sms_es_account_views.xml',
         'views/sms_es_dashboard_views.xml',
         'views/res_partner_views.xml',
         'views/crm_lead_views.xml',
@@ -3,10 +3,14 @@ import hashlib
 import hmac
 import json
 import logging
+import time
 
 from odoo import http
 from odoo.http import request
 
+from ..models.sms_es_metrics import REGISTRY
+from ..models.sms_es_profiler import profile_sample
+
 _logger = logging.getLogger(__name__)
 
 # Mapeo de eventos DLR a estados del modelo sms_es.message
@@ -33,6 +37,27 @@ class SmsEsWebhookController(http.Controller):
         """
         Controlador para recibir y procesar los informes de entrega (DLR).
         """
+        start = time.perf_counter()
+        with profile_sample(request.env, "dlr_webhook"):
+            response = self._process_dlr(**kwargs)
+        REGISTRY.observe(
+            "sms_es_dlr_ingest_seconds",
+            time.perf_counter() - start,
+            {"status": str(response.status_code)},
+        )
+        try:
+            if request.env["sms_es.metric"].sudo()._flush_metrics():
+                request.env.cr.commit()
+        except Exception as e:
+            _logger.warning("No se pudieron guardar las métricas: %s", e)
+            request.env.cr.rollback()
+        return response
+
+    def _process_dlr(self, **kwargs):
+        """
+        Valida, concilia y registra un DLR.
+        :return: Respuesta HTTP para el proveedor.
+        """
         _logger.info(
             "Recibido DLR de SMS.es. Headers: %s, Body: %s",
             request.httprequest.headers,
@@ -90,7 +115,9 @@ class SmsEsWebhookController(http.Controller):
 
         # --- 3. Conciliación con el Mensaje de Odoo ---
         message = request.env["sms_es.message"].sudo().browse()
-        odoo_message_id = dlr_data.get("custom", {}).get("odoo_message_id")
+        custom = dlr_data.get("custom", {})
+        odoo_message_id = custom.get("odoo_message_id")
+        odoo_account_id = custom.get("odoo_account_id")
         msg_id = dlr_data.get("msgId")
 
         # Prioridad 1: Buscar por odoo_message_id
@@ -112,11 +139,15 @@ class SmsEsWebhookController(http.Controller):
                 )
 
         # Prioridad 2 (Fallback): Buscar por msgId
+        # El msgId solo es único dentro de la cuenta que hizo el envío
         if not message and msg_id:
+            domain = [("msg_id", "=", msg_id)]
+            if odoo_account_id:
+                domain.append(("account_id", "=", odoo_account_id))
             message = (
                 request.env["sms_es.message"]
                 .sudo()
-                .search([("msg_id", "=", msg_id)], limit=1)
+                .search(domain, limit=1)
             )
 
         if not message:
@@ -126,6 +157,7 @@ class SmsEsWebhookController(http.Controller):
                 odoo_message_id,
                 msg_id,
             )
+            REGISTRY.inc("sms_es_dlr_unmatched_total")
             # Devolvemos 200 para que el proveedor
             # no reintente. El DLR es válido.
             return request.make_response("OK: Message not found", status=200)
@@ -133,10 +165,14 @@ class SmsEsWebhookController(http.Controller):
         # --- 4. Actualización y Registro ---
         try:
             # a) Actualizar estado del mensaje principal
+            # y su resumen de entrega en una única escritura
             event = dlr_data.get("event")
             new_state = DLR_EVENT_TO_STATE.get(event)
+            message_vals = message._prepare_dlr_summary_vals(dlr_data)
+            if new_state:
+                message_vals["state"] = new_state
+            message.sudo().write(message_vals)
             if new_state:
-                message.sudo().write({"state": new_state})
                 _logger.info(
                     "Mensaje ID %d actualizado al estado\
                           '%s' por el evento DLR '%s'.",
@@ -179,3 +215,39 @@ class SmsEsWebhookController(http.Controller):
             return request.make_response("Internal Server Error", status=500)
 
         return request.make_response("OK", status=200)
+
+    @http.route(
+        "/sms_es_connector/metrics",
+        type="http",
+        auth="none",
+        methods=["GET"],
+        csrf=False,
+        save_session=False,
+    )
+    def metrics(self, **kwargs):
+        """
+        Métricas del conector en formato de texto de Prometheus.
+        Requiere el token de métricas, en la URL (?token=) o en la
+        cabecera 'Authorization: Bearer'.
+        """
+        config = request.env["ir.config_parameter"].sudo()
+        expected_token = config.get_param("sms_es_connector.metrics_token")
+        if not expected_token:
+            return request.make_response("Not Found", status=404)
+
+        received_token = kwargs.get("token")
+        authorization = request.httprequest.headers.get("Authorization", "")
+        if not received_token and authorization.startswith("Bearer "):
+            received_token = authorization[len("Bearer "):]
+        if not received_token or not hmac.compare_digest(
+            received_token, expected_token
+        ):
+            return request.make_response("Unauthorized", status=401)
+
+        body = request.env["sms_es.metric"].sudo()._render_metrics()
+        return request.make_response(
+            body,
+            headers=[
+                ("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            ],
+        )
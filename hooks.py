@@ -16,6 +16,17 @@ except ImportError:
 
 module_path = os.path.dirname(__file__)
 
+# Tareas programadas del módulo que dependen de la versión de Odoo
+CRON_XML_IDS = [
+    "sms_es_connector.ir_cron_sms_queue_worker",
+    "sms_es_connector.ir_cron_sms_stats_refresh",
+    "sms_es_connector.ir_cron_sms_latency_refresh",
+    "sms_es_connector.ir_cron_sms_retention",
+    "sms_es_connector.ir_cron_sms_campaign_prepare",
+    "sms_es_connector.ir_cron_sms_campaign_counters",
+    "sms_es_connector.ir_cron_sms_metrics_flush",
+]
+
 # =============================================================================
 # SECCIÓN DE AYUDANTES (HELPERS) - ESTAS FUNCIONES YA ESTÁN PERFECTAS
 # =============================================================================
@@ -66,45 +77,56 @@ def _configure_settings_view(env, odoo_version):
         )
 
 
+def _get_odoo_version():
+    """Versión principal de Odoo en ejecución (p. ej. 14)."""
+    try:
+        return int(release.major_version.split(".")[0])
+    except Exception:
+        odoo_version = 16  # Fallback
+        _logger.warning(
+            "No se pudo determinar la versión de Odoo, asumiendo v%s", 
+            odoo_version
+        )
+        return odoo_version
+
+
 def _configure_cron_job(env, odoo_version):
     """
-    Encuentra la tarea programada y establece los campos 'numbercall' / 'doall'
-    según la versión de Odoo para garantizar la compatibilidad.
+    Encuentra las tareas programadas y establece los campos 'numbercall' /
+    'doall' según la versión de Odoo para garantizar la compatibilidad.
     """
-    _logger.info("2/2: Configurando la tarea programada (cron)...")
-    try:
-        cron_job = env.ref(
-            "sms_es_connector.ir_cron_sms_queue_worker", 
-            raise_if_not_found=True
-        )
-        vals_to_write = {}
-
-        if odoo_version <= 14:
-            if "numbercall" in cron_job._fields:
-                vals_to_write["numbercall"] = -1
-            if "doall" in cron_job._fields:
-                vals_to_write["doall"] = False
-        else:  # Para v15+
-            if "number_of_calls" in cron_job._fields:
-                vals_to_write["number_of_calls"] = -1
-
-        if vals_to_write:
-            cron_job.write(vals_to_write)
-            _logger.info(
-                f"   -> Tarea programada actualizada con los campos:\
-                          {list(vals_to_write.keys())}."
-            )
-        else:
-            _logger.info(
-                "   -> No se necesitaron cambios en la tarea \
-                         programada para esta versión."
-            )
+    _logger.info("2/2: Configurando las tareas programadas (cron)...")
+    for cron_xml_id in CRON_XML_IDS:
+        try:
+            cron_job = env.ref(cron_xml_id, raise_if_not_found=True)
+            vals_to_write = {}
+
+            if odoo_version <= 14:
+                if "numbercall" in cron_job._fields:
+                    vals_to_write["numbercall"] = -1
+                if "doall" in cron_job._fields:
+                    vals_to_write["doall"] = False
+            else:  # Para v15+
+                if "number_of_calls" in cron_job._fields:
+                    vals_to_write["number_of_calls"] = -1
+
+            if vals_to_write:
+                cron_job.write(vals_to_write)
+                _logger.info(
+                    f"   -> Tarea programada '{cron_xml_id}' actualizada \
+                        con los campos: {list(vals_to_write.keys())}."
+                )
+            else:
+                _logger.info(
+                    "   -> No se necesitaron cambios en la tarea \
+                             programada '%s' para esta versión.",
+                    cron_xml_id,
+                )
 
-    except ValueError:
-        _logger.warning(
-            "   -> No se encontró el cron \
-                        'ir_cron_sms_queue_worker'."
-        )
+        except ValueError:
+            _logger.warning(
+                "   -> No se encontró el cron '%s'.", cron_xml_id
+            )
 
 
 # =====================================================================
@@ -276,14 +298,7 @@ def _post_init_hook(*args):
         return
 
     # --- A partir de aquí, el resto del código es el que ya tenías ---
-    try:
-        odoo_version = int(release.major_version.split(".")[0])
-    except Exception:
-        odoo_version = 16  # Fallback
-        _logger.warning(
-            "No se pudo determinar la versión de Odoo, asumiendo v%s", 
-            odoo_version
-        )
+    odoo_version = _get_odoo_version()
 
     _logger.info(
         f"== Ejecutando Post-Init Hook para 'sms_es_connector' \
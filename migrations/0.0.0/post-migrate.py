@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+# Se ejecuta en cada actualización del módulo. El post_init_hook solo
+# corre al instalar, así que las tareas programadas añadidas en una
+# actualización se configuran aquí (en Odoo <= 14 se crearían con
+# numbercall=1 y se desactivarían tras su primera ejecución).
+from odoo import api, SUPERUSER_ID
+
+from odoo.addons.sms_es_connector.hooks import (
+    _configure_cron_job,
+    _get_odoo_version,
+)
+
+
+def migrate(cr, version):
+    if not version:
+        return
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    _configure_cron_job(env, _get_odoo_version())
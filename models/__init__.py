@@ -1,11 +1,25 @@
 # -*- coding: utf-8 -*-
+from . import sms_es_encoding
+from . import sms_es_metrics
+from . import sms_es_profiler
+from . import sms_es_backend
 from . import sms_es_client
+from . import sms_es_schedule
+from . import sms_es_phone
+from . import sms_es_template
+from . import sms_es_account
 
+from . import sms_es_campaign
 from . import sms_es_message
 from . import sms_es_dashboard
+from . import sms_es_message_stat
+from . import sms_es_latency_stat
+from . import sms_es_metric
+from . import sms_es_worker_run
 
 from . import sms_es_dlr_event
 from . import sms_es_queue_job
+from . import sms_es_archive
 
 from . import res_config_settings
 #from . import sms_compose_wizard <-- mantener comentado
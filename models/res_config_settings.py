@@ -2,6 +2,8 @@
 from odoo import models, fields, api
 import uuid
 
+from .sms_es_profiler import get_profile_report, reset_profiles
+
 
 class ResConfigSettings(models.TransientModel):
     _inherit = "res.config.settings"
@@ -49,12 +51,20 @@ class ResConfigSettings(models.TransientModel):
         [
             ("gsm", "GSM (caracteres estándar)"),
             ("ucs", "UCS-2 (caracteres especiales/Unicode)"),
+            ("auto", "Automática (según el texto del mensaje)"),
         ],
         string="Codificación de Datos (DCS)",
         config_parameter="sms_es_connector.dcs",
         default="gsm",
         required=True,
     )
+    sms_es_cost_per_part = fields.Float(
+        string="Coste por Parte",
+        config_parameter="sms_es_connector.cost_per_part",
+        default=0.0,
+        help="Precio de cada parte de SMS, para estimar el coste de un \
+            envío en el asistente.",
+    )
 
     # --- Advanced Options ---
     sms_es_use_flash = fields.Boolean(
@@ -84,6 +94,149 @@ class ResConfigSettings(models.TransientModel):
         help="Intervalo en minutos con el que el \
             cron procesará la cola de envíos.",
     )
+    sms_es_instant_dispatch = fields.Boolean(
+        string="Despacho Inmediato",
+        config_parameter="sms_es_connector.instant_dispatch",
+        help="Al encolar SMS transaccionales se despierta al worker de la \
+            cola al momento (ir.cron._trigger / NOTIFY de PostgreSQL). El \
+            cron periódico sigue procesando el resto.",
+    )
+    sms_es_account_routing = fields.Selection(
+        [
+            ("weighted", "Por peso"),
+            ("least_cost", "Por menor coste"),
+        ],
+        string="Reparto entre Cuentas",
+        config_parameter="sms_es_connector.account_routing",
+        default="weighted",
+        help="Con varias cuentas del proveedor, reparte los envíos según \
+            el peso de cada una o los envía por las más baratas y usa el \
+            resto solo como respaldo.",
+    )
+    sms_es_api_rate_limit = fields.Float(
+        string="Límite de Envío",
+        config_parameter="sms_es_connector.api_rate_limit",
+        default=0.0,
+        help="Envíos por segundo permitidos a cada proceso de Odoo, \
+            compartidos entre el worker y send_now(). 0 desactiva el \
+            límite.",
+    )
+
+    sms_es_lane_transactional_share = fields.Integer(
+        string="Capacidad Reservada Transaccional (%)",
+        config_parameter="sms_es_connector.lane_transactional_share",
+        default=50,
+        help="Porcentaje de cada ciclo del worker reservado a los SMS \
+            transaccionales. La capacidad que no usa un carril pasa al otro.",
+    )
+    sms_es_lane_transactional_target = fields.Integer(
+        string="Objetivo de Latencia Transaccional (segundos)",
+        config_parameter="sms_es_connector.lane_transactional_target",
+        default=60,
+    )
+    sms_es_lane_bulk_target = fields.Integer(
+        string="Objetivo de Latencia Masivo (segundos)",
+        config_parameter="sms_es_connector.lane_bulk_target",
+        default=3600,
+    )
+    sms_es_source_weights = fields.Char(
+        string="Pesos por Modelo de Origen",
+        config_parameter="sms_es_connector.source_weights",
+        help='JSON con el peso de cada modelo de origen en el reparto \
+            de la cola, p. ej. {"account.move": 3, "res.partner": 1}. \
+            Los modelos no indicados tienen peso 1.',
+    )
+    sms_es_quiet_hours_start = fields.Float(
+        string="Horario de Silencio Desde",
+        config_parameter="sms_es_connector.quiet_hours_start",
+        default=21.0,
+        help="Hora local a partir de la cual no se programan envíos de \
+            campañas repartidas en una ventana.",
+    )
+    sms_es_quiet_hours_end = fields.Float(
+        string="Horario de Silencio Hasta",
+        config_parameter="sms_es_connector.quiet_hours_end",
+        default=9.0,
+    )
+    sms_es_dashboard_cache_ttl = fields.Integer(
+        string="Caché de KPIs del Dashboard (segundos)",
+        config_parameter="sms_es_connector.dashboard_cache_ttl",
+        default=900,
+        help="Antigüedad máxima de los KPIs que precalcula el cron de \
+            estadísticas; pasado este tiempo se calculan en cada lectura. \
+            0 desactiva la caché.",
+    )
+
+    # --- History Retention ---
+    sms_es_retention_job_success_days = fields.Integer(
+        string="Retención de Trabajos con Éxito (días)",
+        config_parameter="sms_es_connector.retention_job_success_days",
+        default=7,
+        help="Días tras los que los trabajos con éxito se mueven al \
+            archivo. 0 desactiva el archivado.",
+    )
+    sms_es_retention_job_failed_days = fields.Integer(
+        string="Retención de Trabajos Fallidos (días)",
+        config_parameter="sms_es_connector.retention_job_failed_days",
+        default=30,
+        help="Días tras los que los trabajos fallidos se mueven al \
+            archivo. 0 desactiva el archivado.",
+    )
+    sms_es_retention_job_cancelled_days = fields.Integer(
+        string="Retención de Trabajos Cancelados (días)",
+        config_parameter="sms_es_connector.retention_job_cancelled_days",
+        default=7,
+        help="Días tras los que los trabajos cancelados se mueven al \
+            archivo. 0 desactiva el archivado.",
+    )
+    sms_es_retention_dlr_event_days = fields.Integer(
+        string="Retención de Eventos DLR (días)",
+        config_parameter="sms_es_connector.retention_dlr_event_days",
+        default=90,
+        help="Días tras los que los eventos DLR se mueven al archivo. \
+            0 desactiva el archivado.",
+    )
+    sms_es_retention_message_days = fields.Integer(
+        string="Retención de Mensajes Finalizados (días)",
+        config_parameter="sms_es_connector.retention_message_days",
+        default=0,
+        help="Días tras los que los mensajes en estado final se mueven \
+            al archivo junto con su historial. 0 los conserva siempre.",
+    )
+    sms_es_retention_job_purge = fields.Boolean(
+        string="Eliminar Trabajos sin Archivar",
+        config_parameter="sms_es_connector.retention_job_purge",
+        help="Si se activa, los trabajos terminados se eliminan \
+            directamente en lugar de moverse a la tabla de archivo.",
+    )
+    sms_es_retention_archive_days = fields.Integer(
+        string="Retención del Archivo (días)",
+        config_parameter="sms_es_connector.retention_archive_days",
+        default=0,
+        help="Días tras los que se eliminan las filas de las tablas de \
+            archivo. 0 las conserva siempre (por defecto).",
+    )
+    sms_es_retention_batch_size = fields.Integer(
+        string="Tamaño de Lote de Archivado",
+        config_parameter="sms_es_connector.retention_batch_size",
+        default=5000,
+        help="Número de filas movidas al archivo en cada transacción.",
+    )
+
+    # --- Envíos masivos en segundo plano ---
+    sms_es_async_send_threshold = fields.Integer(
+        string="Umbral de Envío en Segundo Plano",
+        config_parameter="sms_es_connector.async_send_threshold",
+        default=1000,
+        help="Las selecciones con más registros se preparan por bloques \
+            en segundo plano. 0 para preparar siempre en la petición.",
+    )
+    sms_es_async_send_batch_size = fields.Integer(
+        string="Tamaño de Bloque de Envío",
+        config_parameter="sms_es_connector.async_send_batch_size",
+        default=1000,
+        help="Mensajes creados y encolados en cada transacción.",
+    )
 
     # --- Webhook Security ---
     sms_es_webhook_token = fields.Char(
@@ -101,6 +254,27 @@ class ResConfigSettings(models.TransientModel):
             la firma HMAC-SHA256 de la solicitud.",
     )
 
+    # --- Métricas ---
+    sms_es_metrics_token = fields.Char(
+        string="Token de Métricas",
+        config_parameter="sms_es_connector.metrics_token",
+        help="Token para leer /sms_es_connector/metrics. Si está vacío, \
+            el endpoint de métricas está desactivado.",
+    )
+
+    # --- Perfilado ---
+    sms_es_profile_sample_rate = fields.Integer(
+        string="Perfilar 1 de cada N Ejecuciones",
+        config_parameter="sms_es_connector.profile_sample_rate",
+        default=0,
+        help="Perfila con cProfile una de cada N ejecuciones del worker \
+            de la cola y del webhook DLR. 0 desactiva el perfilado.",
+    )
+    sms_es_profile_report = fields.Text(
+        string="Funciones más Costosas",
+        compute="_compute_profile_report",
+    )
+
     @api.model
     def get_values(self):
         res = super(ResConfigSettings, self).get_values()
@@ -128,6 +302,15 @@ class ResConfigSettings(models.TransientModel):
                 }
             )
 
+    def _compute_profile_report(self):
+        report = get_profile_report(self.env) or "Sin perfiles guardados."
+        for settings in self:
+            settings.sms_es_profile_report = report
+
+    def action_sms_es_reset_profiles(self):
+        """Borra los perfiles acumulados."""
+        reset_profiles(self.env)
+
     @api.depends(
         "sms_es_api_url", "sms_es_webhook_token"
     )  # Añadir dependencia del token
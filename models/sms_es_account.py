@@ -0,0 +1,338 @@
+# -*- coding: utf-8 -*-
+import logging
+import threading
+from datetime import timedelta
+
+from odoo import models, fields, api
+from .sms_es_backend import (
+    BACKENDS,
+    OUTCOME_AUTH_FAILED,
+    OUTCOME_THROTTLED,
+    get_backend_class,
+)
+from .sms_es_client import SmsEsClient
+
+_logger = logging.getLogger(__name__)
+
+# Pausa de una cuenta tras un fallo transitorio; se duplica con cada
+# fallo consecutivo hasta el máximo
+ACCOUNT_COOLDOWN_SECONDS = 30
+ACCOUNT_MAX_COOLDOWN_SECONDS = 900
+
+# Reparto de los envíos entre cuentas: 'weighted' o 'least_cost'
+PARAM_ACCOUNT_ROUTING = "sms_es_connector.account_routing"
+
+# Peso actual de cada cuenta en el reparto (compartido por el proceso)
+_current_weights = {}
+_weights_lock = threading.Lock()
+
+# Salud de cada cuenta vista por este proceso: {id: (fallos seguidos,
+# en pausa hasta)}. Decide el reparto sin escribir en la transacción
+# del envío; la base de datos solo la refleja para el resto de procesos
+_account_health = {}
+_health_lock = threading.Lock()
+
+
+def pick_weighted(candidates):
+    """
+    Elige una cuenta con round robin ponderado suave (como nginx): cada
+    cuenta recibe una parte de los envíos proporcional a su peso, sin
+    ráfagas seguidas a la misma cuenta.
+    :param candidates: Lista de (clave, peso).
+    :return: Clave elegida, o None si no hay candidatas.
+    """
+    if not candidates:
+        return None
+    with _weights_lock:
+        total = 0
+        best = None
+        for key, weight in candidates:
+            weight = max(weight, 1)
+            _current_weights[key] = _current_weights.get(key, 0) + weight
+            total += weight
+            current = _current_weights[key]
+            if best is None or current > _current_weights[best]:
+                best = key
+        _current_weights[best] -= total
+    return best
+
+
+class SmsEsAccount(models.Model):
+    _name = "sms_es.account"
+    _description = "Cuenta del Proveedor de SMS"
+    _order = "sequence, id"
+
+    name = fields.Char(string="Nombre", required=True)
+    active = fields.Boolean(string="Activa", default=True)
+    sequence = fields.Integer(string="Secuencia", default=10)
+    backend = fields.Selection(
+        selection="_get_backend_selection",
+        string="Proveedor",
+        required=True,
+        default=SmsEsClient.code,
+    )
+    api_url = fields.Char(
+        string="URL del Endpoint de Envío",
+        help="Si se deja vacía se usa la URL de los ajustes generales.",
+    )
+    api_username = fields.Char(string="Usuario de la API", required=True)
+    api_password = fields.Char(
+        string="Contraseña de la API",
+        required=True,
+        groups="base.group_system",
+    )
+    weight = fields.Integer(
+        string="Peso",
+        default=1,
+        help="Parte de los envíos que recibe la cuenta respecto a las \
+            demás (por ejemplo, 3 frente a 1 recibe el triple).",
+    )
+    cost_per_part = fields.Float(
+        string="Coste por Parte",
+        digits=(16, 4),
+        help="Coste de cada parte de SMS con esta cuenta, para el reparto \
+            por menor coste. 0 usa el coste de los ajustes generales.",
+    )
+    rate_limit = fields.Float(
+        string="Límite de Envío (SMS/s)",
+        help="Envíos por segundo de cada proceso de Odoo con esta cuenta. \
+            0 usa el límite general.",
+    )
+    cooldown_until = fields.Datetime(
+        string="En Pausa Hasta",
+        readonly=True,
+        help="Tras un throttling o un fallo transitorio la cuenta deja de \
+            recibir envíos hasta esta fecha.",
+    )
+    consecutive_failures = fields.Integer(
+        string="Fallos Consecutivos", readonly=True
+    )
+    last_error = fields.Char(string="Último Error", readonly=True)
+    message_count = fields.Integer(
+        string="Mensajes Enviados", compute="_compute_message_count"
+    )
+
+    @api.model
+    def _get_backend_selection(self):
+        return [(code, backend.label) for code, backend in BACKENDS.items()]
+
+    def _compute_message_count(self):
+        groups = self.env["sms_es.message"].read_group(
+            [("account_id", "in", self.ids)],
+            ["account_id"],
+            ["account_id"],
+            lazy=False,
+        )
+        counts = {
+            group["account_id"][0]: group["__count"]
+            for group in groups
+        }
+        for account in self:
+            account.message_count = counts.get(account.id, 0)
+
+    @api.model
+    def _get_available_accounts(self):
+        """Cuentas activas que no están en pausa."""
+        now = fields.Datetime.now()
+        accounts = self.sudo().search(
+            [
+                "|",
+                ("cooldown_until", "=", False),
+                ("cooldown_until", "<=", now),
+            ]
+        )
+        return accounts.filtered(
+            lambda account: not account._is_paused_in_process(now)
+        )
+
+    def _get_process_health(self):
+        """
+        Fallos seguidos y fin de la pausa de la cuenta según este proceso.
+        :return: Tupla (fallos, datetime o None).
+        """
+        self.ensure_one()
+        with _health_lock:
+            return _account_health.get(self.id, (0, None))
+
+    def _is_paused_in_process(self, now):
+        cooldown_until = self._get_process_health()[1]
+        return bool(cooldown_until and cooldown_until > now)
+
+    def _persist_health(self, vals):
+        """
+        Refleja el estado de la cuenta en la base de datos con un cursor
+        propio y de vida corta. Un bloqueo o un error de serialización
+        solo se registra: nunca debe deshacer un envío ya hecho.
+        """
+        try:
+            with self.pool.cursor() as cr:
+                self.with_env(self.env(cr=cr)).sudo().write(vals)
+        except Exception as e:
+            _logger.warning(
+                "No se pudo guardar el estado de la cuenta de SMS '%s': %s",
+                self.name,
+                e,
+            )
+
+    def _report_result(self, result):
+        """
+        Actualiza el estado de la cuenta tras un envío. Un throttling, un
+        fallo transitorio o un error de autenticación la dejan en pausa,
+        cada vez más larga si se repiten; un envío correcto la rehabilita.
+        :param result: Resultado de SmsBackend.send_sms.
+        :return: True si la cuenta ha quedado en pausa.
+        """
+        self.ensure_one()
+        process_failures = self._get_process_health()[0]
+        if result.get("status") == "success":
+            with _health_lock:
+                _account_health.pop(self.id, None)
+            if process_failures or self.consecutive_failures:
+                self._persist_health(
+                    {"consecutive_failures": 0, "cooldown_until": False}
+                )
+            return False
+
+        error = result.get("error", {})
+        auth_failed = result.get("reason") == OUTCOME_AUTH_FAILED
+        if not result.get("transient") and not auth_failed:
+            return False
+        failures = max(process_failures, self.consecutive_failures) + 1
+        cooldown = min(
+            ACCOUNT_COOLDOWN_SECONDS * 2 ** (failures - 1),
+            ACCOUNT_MAX_COOLDOWN_SECONDS,
+        )
+        cooldown_until = fields.Datetime.now() + timedelta(seconds=cooldown)
+        with _health_lock:
+            _account_health[self.id] = (failures, cooldown_until)
+        self._persist_health(
+            {
+                "consecutive_failures": failures,
+                "cooldown_until": cooldown_until,
+                "last_error": f"{error.get('code')}: {error.get('message')}",
+            }
+        )
+        _logger.warning(
+            "Cuenta de SMS '%s' en pausa %d segundos tras el error %s.",
+            self.name,
+            cooldown,
+            error.get("code"),
+        )
+        return True
+
+    def action_reset_cooldown(self):
+        """Vuelve a poner la cuenta en el reparto de envíos."""
+        with _health_lock:
+            for account_id in self.ids:
+                _account_health.pop(account_id, None)
+        self.sudo().write(
+            {"consecutive_failures": 0, "cooldown_until": False}
+        )
+
+
+class SmsEsAccountPool:
+    """
+    Clientes de las cuentas disponibles y reparto de los envíos entre
+    ellas. Cada cuenta usa el backend de su proveedor, por lo que pueden
+    combinarse varios proveedores. Sin cuentas configuradas usa la cuenta
+    de SMS.es de los ajustes.
+    Esta clase no es un modelo de Odoo, sino una clase de utilidad.
+    """
+
+    def __init__(self, env):
+        """
+        :param env: El entorno de Odoo.
+        :raise UserError: Si la configuración de una cuenta no está
+            completa. Si todas las cuentas están en pausa, el pool queda
+            sin cuentas disponibles y send devuelve un fallo transitorio.
+        """
+        Account = env["sms_es.account"].sudo()
+        config = env["ir.config_parameter"].sudo()
+        self.least_cost = (
+            config.get_param(PARAM_ACCOUNT_ROUTING) == "least_cost"
+        )
+        self.default_cost = float(
+            config.get_param("sms_es_connector.cost_per_part") or 0
+        )
+        self.accounts = {}
+        self.clients = {}
+        # Cuentas puestas en pausa durante la vida del pool
+        self.paused = set()
+        if not Account.search_count([]):
+            self.clients[False] = SmsEsClient(env)
+            return
+        for account in Account._get_available_accounts():
+            self.accounts[account.id] = account
+            backend_class = get_backend_class(account.backend)
+            self.clients[account.id] = backend_class(env, account=account)
+
+    @property
+    def available(self):
+        """Ids de las cuentas que siguen en el reparto."""
+        return [key for key in self.clients if key not in self.paused]
+
+    @property
+    def stats(self):
+        """Estadísticas sumadas de los clientes de todas las cuentas."""
+        totals = {"requests": 0, "throttled": 0, "http_time": 0.0}
+        for client in self.clients.values():
+            for key in totals:
+                totals[key] += client.stats[key]
+        return totals
+
+    def _get_cost(self, key):
+        account = self.accounts.get(key)
+        if account and account.cost_per_part:
+            return account.cost_per_part
+        return self.default_cost
+
+    def pick(self, exclude=()):
+        """
+        Siguiente cuenta del reparto ponderado. Con el reparto por menor
+        coste solo se eligen las cuentas más baratas disponibles, de modo
+        que las demás actúan como respaldo.
+        """
+        keys = [key for key in self.available if key not in exclude]
+        if self.least_cost and keys:
+            cheapest = min(self._get_cost(key) for key in keys)
+            keys = [key for key in keys if self._get_cost(key) == cheapest]
+        return pick_weighted(
+            [(key, self.accounts[key].weight if key else 1) for key in keys]
+        )
+
+    def send(self, message_data, **kwargs):
+        """
+        Envía un mensaje por la siguiente cuenta. Si el fallo es
+        transitorio, la cuenta se retira del reparto y se prueba con la
+        siguiente hasta agotar las disponibles.
+        :param kwargs: Argumentos adicionales de SmsBackend.send_sms.
+        :return: Tupla (resultado, id de la cuenta usada o False).
+        """
+        tried = set()
+        last = None
+        while True:
+            account_id = self.pick(exclude=tried)
+            if account_id is None:
+                return last or (
+                    {
+                        "status": "failed",
+                        "error": {
+                            "code": -1,
+                            "message": "Todas las cuentas están en pausa.",
+                        },
+                        "transient": True,
+                        "reason": OUTCOME_THROTTLED,
+                    },
+                    False,
+                )
+            result = self.clients[account_id].send_sms(message_data, **kwargs)
+            if not account_id:
+                return result, False
+            tried.add(account_id)
+            last = (result, account_id)
+            if self.accounts[account_id]._report_result(result):
+                self.paused.add(account_id)
+            if result.get("status") == "success" or not result.get(
+                "transient"
+            ):
+                return result, account_id
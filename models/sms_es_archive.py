@@ -0,0 +1,403 @@
+# -*- coding: utf-8 -*-
+import logging
+import time
+from datetime import timedelta
+
+from odoo import models, fields, api
+
+from .sms_es_profiler import compact_profiles
+
+_logger = logging.getLogger(__name__)
+
+try:
+    JsonField = fields.Json
+except AttributeError:
+    JsonField = fields.Text
+
+# Estados finales de un mensaje que permiten archivarlo
+MESSAGE_ARCHIVE_STATES = [
+    "delivered",
+    "undelivered",
+    "rejected",
+    "invalid_number",
+    "api_failed",
+    "cancelled",
+]
+
+# Parámetros de retención (días) y sus valores por defecto.
+# Un valor 0 desactiva el archivado correspondiente.
+RETENTION_JOB_DAYS_PARAMS = {
+    "success": ("sms_es_connector.retention_job_success_days", 7),
+    "failed": ("sms_es_connector.retention_job_failed_days", 30),
+    "cancelled": ("sms_es_connector.retention_job_cancelled_days", 7),
+}
+PARAM_RETENTION_DLR_EVENT_DAYS = "sms_es_connector.retention_dlr_event_days"
+PARAM_RETENTION_MESSAGE_DAYS = "sms_es_connector.retention_message_days"
+PARAM_RETENTION_BATCH_SIZE = "sms_es_connector.retention_batch_size"
+PARAM_RETENTION_JOB_PURGE = "sms_es_connector.retention_job_purge"
+PARAM_RETENTION_ARCHIVE_DAYS = "sms_es_connector.retention_archive_days"
+
+# Modelos de archivo cuyas filas caducan tras la retención del archivo
+ARCHIVE_MODELS = [
+    "sms_es.queue_job_archive",
+    "sms_es.dlr_event_archive",
+    "sms_es.message_archive",
+]
+
+# Tiempo máximo (segundos) de una ejecución del cron de retención
+RETENTION_TIME_BUDGET = 600
+
+
+class SmsEsArchiveMixin(models.AbstractModel):
+    _name = "sms_es.archive.mixin"
+    _description = "Utilidades de Archivado del Histórico SMS"
+
+    # Tabla de origen y correspondencia columna origen -> columna archivo
+    _source_table = None
+    _column_map = []
+
+    original_id = fields.Integer(string="ID Original", index=True)
+    archived_on = fields.Datetime(string="Archivado el", index=True)
+
+    @api.model
+    def _archive_rows(self, where, params, limit=None, skip_locked=True):
+        """
+        Mueve a la tabla de archivo las filas de la tabla de origen que
+        cumplen la condición, con una única sentencia DELETE ... RETURNING.
+        :param where: Condición SQL sobre la tabla de origen.
+        :param params: Parámetros de la condición.
+        :param limit: Número máximo de filas a mover.
+        :param skip_locked: Omite las filas bloqueadas por otra
+        transacción en lugar de esperar a que se liberen.
+        :return: Número de filas archivadas.
+        """
+        source_columns = ", ".join(f'"{src}"' for src, _ in self._column_map)
+        target_columns = ", ".join(f'"{dst}"' for _, dst in self._column_map)
+        limit_sql = "LIMIT %s" if limit else ""
+        lock_sql = "FOR UPDATE SKIP LOCKED" if skip_locked else "FOR UPDATE"
+        self.env.cr.execute(
+            f"""
+            WITH moved AS (
+                DELETE FROM {self._source_table}
+                 WHERE id IN (
+                       SELECT id FROM {self._source_table}
+                        WHERE {where}
+                        ORDER BY id
+                        {limit_sql}
+                          {lock_sql}
+                 )
+                RETURNING {source_columns}
+            )
+            INSERT INTO {self._table} ({target_columns}, archived_on)
+            SELECT {source_columns}, now() at time zone 'UTC' FROM moved
+            """,
+            list(params) + ([limit] if limit else []),
+        )
+        return self.env.cr.rowcount
+
+    @api.model
+    def _purge_rows(self, table, where, params, limit):
+        """
+        Elimina por lotes las filas de `table` que cumplen la condición,
+        sin copiarlas al archivo.
+        :return: Número de filas eliminadas.
+        """
+        self.env.cr.execute(
+            f"""
+            DELETE FROM {table}
+             WHERE id IN (
+                   SELECT id FROM {table}
+                    WHERE {where}
+                    ORDER BY id
+                    LIMIT %s
+                      FOR UPDATE SKIP LOCKED
+             )
+            """,
+            list(params) + [limit],
+        )
+        return self.env.cr.rowcount
+
+
+class SmsEsQueueJobArchive(models.Model):
+    _name = "sms_es.queue_job_archive"
+    _inherit = "sms_es.archive.mixin"
+    _description = "Archivo de Trabajos de la Cola SMS"
+    _order = "original_id desc"
+    _log_access = False
+
+    _source_table = "sms_es_queue_job"
+    _column_map = [
+        ("id", "original_id"),
+        ("message_id", "message_id"),
+        ("name", "name"),
+        ("state", "state"),
+        ("retry_count", "retry_count"),
+        ("max_retries", "max_retries"),
+        ("priority", "priority"),
+        ("lane", "lane"),
+        ("campaign_id", "campaign_id"),
+        ("error_message", "error_message"),
+        ("create_date", "job_create_date"),
+        ("write_date", "job_write_date"),
+    ]
+
+    # El mensaje puede haberse archivado también: se guarda solo su ID
+    message_id = fields.Integer(string="ID del Mensaje", index=True)
+    name = fields.Char(string="Nombre del Trabajo")
+    state = fields.Char(string="Estado")
+    retry_count = fields.Integer(string="Contador de Reintentos")
+    max_retries = fields.Integer(string="Máximos Reintentos")
+    priority = fields.Integer(string="Prioridad")
+    lane = fields.Char(string="Carril")
+    campaign_id = fields.Integer(string="ID de la Campaña", index=True)
+    error_message = fields.Text(string="Mensaje de Error")
+    job_create_date = fields.Datetime(string="Fecha de Creación")
+    job_write_date = fields.Datetime(string="Última Modificación")
+
+
+class SmsEsDlrEventArchive(models.Model):
+    _name = "sms_es.dlr_event_archive"
+    _inherit = "sms_es.archive.mixin"
+    _description = "Archivo de Eventos DLR"
+    _order = "original_id desc"
+    _log_access = False
+
+    _source_table = "sms_es_dlr_event"
+    _column_map = [
+        ("id", "original_id"),
+        ("message_id", "message_id"),
+        ("event", "event"),
+        ("errorCode", "errorCode"),
+        ("errorMessage", "errorMessage"),
+        ("partNum", "partNum"),
+        ("numParts", "numParts"),
+        ("sendTime", "sendTime"),
+        ("dlrTime", "dlrTime"),
+        ("custom", "custom"),
+        ("create_date", "event_create_date"),
+    ]
+
+    message_id = fields.Integer(string="ID del Mensaje", index=True)
+    event = fields.Char(string="Evento")
+    errorCode = fields.Integer(string="Código de Error")
+    errorMessage = fields.Char(string="Mensaje de Error")
+    partNum = fields.Integer(string="Número de Parte")
+    numParts = fields.Integer(string="Total de Partes")
+    sendTime = fields.Float(string="Tiempo de Envío (s)")
+    dlrTime = fields.Float(string="Tiempo de DLR (s)")
+    custom = JsonField(string="Datos Personalizados")
+    event_create_date = fields.Datetime(string="Fecha del Evento")
+
+
+class SmsEsMessageArchive(models.Model):
+    _name = "sms_es.message_archive"
+    _inherit = "sms_es.archive.mixin"
+    _description = "Archivo de Mensajes SMS"
+    _order = "original_id desc"
+    _log_access = False
+
+    _source_table = "sms_es_message"
+    _column_map = [
+        ("id", "original_id"),
+        ("name", "name"),
+        ("text", "text"),
+        ("sender", "sender"),
+        ("receiver", "receiver"),
+        ("msg_id", "msg_id"),
+        ("num_parts", "num_parts"),
+        ("dcs", "dcs"),
+        ("state", "state"),
+        ("lane", "lane"),
+        ("scheduled_datetime", "scheduled_datetime"),
+        ("campaign_id", "campaign_id"),
+        ("account_id", "account_id"),
+        ("res_id", "res_id"),
+        ("res_model", "res_model"),
+        ("partner_id", "partner_id"),
+        ("lead_id", "lead_id"),
+        ("sale_order_id", "sale_order_id"),
+        ("account_move_id", "account_move_id"),
+        ("last_event", "last_event"),
+        ("last_dlr_time", "last_dlr_time"),
+        ("delivered_parts", "delivered_parts"),
+        ("last_error_code", "last_error_code"),
+        ("create_date", "message_create_date"),
+        ("write_date", "message_write_date"),
+    ]
+
+    name = fields.Char(string="Descripción")
+    text = fields.Text(string="Contenido del Mensaje")
+    sender = fields.Char(string="Remitente")
+    receiver = fields.Char(string="Receptor", index=True)
+    msg_id = fields.Char(string="UUID de la API", index=True)
+    num_parts = fields.Integer(string="Número de Partes")
+    dcs = fields.Char(string="Codificación (DCS)")
+    state = fields.Char(string="Estado")
+    lane = fields.Char(string="Carril")
+    scheduled_datetime = fields.Datetime(string="Envío Programado")
+    # La campaña y la cuenta pueden borrarse: se guarda solo su ID
+    campaign_id = fields.Integer(string="ID de la Campaña", index=True)
+    account_id = fields.Integer(string="ID de la Cuenta del Proveedor")
+    res_id = fields.Integer(string="ID del Registro de Origen")
+    res_model = fields.Char(string="Modelo de Origen")
+    partner_id = fields.Integer(string="ID del Cliente")
+    lead_id = fields.Integer(string="ID de la Oportunidad/Lead")
+    sale_order_id = fields.Integer(string="ID del Pedido de Venta")
+    account_move_id = fields.Integer(string="ID de la Factura")
+    last_event = fields.Char(string="Último Evento DLR")
+    last_dlr_time = fields.Float(string="Último Tiempo de DLR (s)")
+    delivered_parts = fields.Integer(string="Partes Entregadas")
+    last_error_code = fields.Integer(string="Último Código de Error")
+    message_create_date = fields.Datetime(string="Fecha de Creación")
+    message_write_date = fields.Datetime(string="Última Modificación")
+
+
+class SmsEsRetention(models.AbstractModel):
+    _name = "sms_es.retention"
+    _description = "Retención del Histórico SMS"
+
+    @api.model
+    def _get_int_param(self, param, default):
+        config = self.env["ir.config_parameter"].sudo()
+        return int(config.get_param(param, default) or 0)
+
+    @api.model
+    def _run_retention(self, auto_commit=True):
+        """
+        Método principal del cron de retención.
+        Mueve por lotes a las tablas de archivo los trabajos terminados,
+        los eventos DLR antiguos y, si está activado, los mensajes en
+        estado final, para que las consultas de la cola, la deduplicación
+        y la conciliación de DLR trabajen solo sobre el histórico reciente.
+        :param auto_commit: Confirma la transacción tras cada lote.
+        """
+        batch_size = (
+            self._get_int_param(PARAM_RETENTION_BATCH_SIZE, 5000) or 5000
+        )
+        deadline = time.monotonic() + RETENTION_TIME_BUDGET
+        now = fields.Datetime.now()
+
+        def run_batches(archive_model, where, params, purge_table=None):
+            total = 0
+            while time.monotonic() < deadline:
+                if purge_table:
+                    moved = archive_model._purge_rows(
+                        purge_table, where, params, batch_size
+                    )
+                else:
+                    moved = archive_model._archive_rows(
+                        where, params, batch_size
+                    )
+                total += moved
+                if auto_commit:
+                    self.env.cr.commit()
+                if moved < batch_size:
+                    break
+            return total
+
+        # 1. Trabajos de la cola terminados, con retención por estado.
+        # Pueden eliminarse directamente si no interesa conservarlos.
+        job_archive = self.env["sms_es.queue_job_archive"]
+        purge_jobs = self.env["ir.config_parameter"].sudo().get_param(
+            PARAM_RETENTION_JOB_PURGE
+        )
+        for state, (param, default) in RETENTION_JOB_DAYS_PARAMS.items():
+            days = self._get_int_param(param, default)
+            if days <= 0:
+                continue
+            moved = run_batches(
+                job_archive,
+                "state = %s AND write_date < %s",
+                [state, now - timedelta(days=days)],
+                purge_table=job_archive._source_table if purge_jobs else None,
+            )
+            _logger.info(
+                "Retención: %d trabajos '%s' %s.",
+                moved,
+                state,
+                "eliminados" if purge_jobs else "archivados",
+            )
+
+        # 2. Eventos DLR antiguos
+        days = self._get_int_param(PARAM_RETENTION_DLR_EVENT_DAYS, 90)
+        if days > 0:
+            moved = run_batches(
+                self.env["sms_es.dlr_event_archive"],
+                "create_date < %s",
+                [now - timedelta(days=days)],
+            )
+            _logger.info("Retención: %d eventos DLR archivados.", moved)
+
+        # 3. Mensajes en estado final (desactivado por defecto)
+        days = self._get_int_param(PARAM_RETENTION_MESSAGE_DAYS, 0)
+        if days > 0:
+            moved = self._archive_messages(
+                now - timedelta(days=days), batch_size, deadline, auto_commit
+            )
+            _logger.info("Retención: %d mensajes archivados.", moved)
+
+        # 4. Purga de las propias tablas de archivo (desactivada por
+        # defecto: borrar el historial debe ser una decisión explícita)
+        days = self._get_int_param(PARAM_RETENTION_ARCHIVE_DAYS, 0)
+        if days > 0:
+            for model_name in ARCHIVE_MODELS:
+                archive_model = self.env[model_name]
+                purged = run_batches(
+                    archive_model,
+                    "archived_on < %s",
+                    [now - timedelta(days=days)],
+                    purge_table=archive_model._table,
+                )
+                _logger.info(
+                    "Retención: %d filas eliminadas de '%s'.",
+                    purged,
+                    model_name,
+                )
+
+        # 5. Estadísticas de las ejecuciones del worker
+        self.env["sms_es.worker_run"]._gc_worker_runs()
+
+        # 6. Perfiles de procesos e hilos que ya no existen
+        compact_profiles(self.env)
+
+    @api.model
+    def _archive_messages(self, cutoff, batch_size, deadline, auto_commit):
+        """
+        Archiva los mensajes en estado final anteriores a `cutoff` junto
+        con sus trabajos y eventos DLR, que de lo contrario se borrarían
+        en cascada.
+        :return: Número de mensajes archivados.
+        """
+        cr = self.env.cr
+        total = 0
+        while time.monotonic() < deadline:
+            cr.execute(
+                """
+                SELECT id FROM sms_es_message
+                 WHERE state = ANY(%s) AND write_date < %s
+                 ORDER BY id
+                 LIMIT %s
+                   FOR UPDATE SKIP LOCKED
+                """,
+                [MESSAGE_ARCHIVE_STATES, cutoff, batch_size],
+            )
+            message_ids = [row[0] for row in cr.fetchall()]
+            if not message_ids:
+                break
+
+            # Los hijos no pueden omitirse si están bloqueados: el borrado
+            # del mensaje los eliminaría en cascada sin archivarlos
+            self.env["sms_es.dlr_event_archive"]._archive_rows(
+                "message_id = ANY(%s)", [message_ids], skip_locked=False
+            )
+            self.env["sms_es.queue_job_archive"]._archive_rows(
+                "message_id = ANY(%s)", [message_ids], skip_locked=False
+            )
+            total += self.env["sms_es.message_archive"]._archive_rows(
+                "id = ANY(%s)", [message_ids]
+            )
+            if auto_commit:
+                cr.commit()
+            if len(message_ids) < batch_size:
+                break
+        return total
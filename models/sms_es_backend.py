@@ -0,0 +1,305 @@
+# -*- coding: utf-8 -*-
+import json
+import logging
+import requests
+import time
+
+from odoo.exceptions import UserError
+
+from .sms_es_metrics import REGISTRY
+from .sms_es_transport import (
+    PARAM_API_RATE_LIMIT,
+    get_rate_limiter,
+    get_session,
+)
+
+_logger = logging.getLogger(__name__)
+
+# Clasificación de las respuestas de un proveedor
+OUTCOME_SUCCESS = "success"
+OUTCOME_THROTTLED = "throttled"
+OUTCOME_SERVER_ERROR = "server_error"
+OUTCOME_AUTH_FAILED = "auth_failed"
+OUTCOME_REJECTED = "rejected"
+
+# Backends disponibles, por código
+BACKENDS = {}
+
+
+def register_backend(backend_class):
+    """
+    Decorador que registra un backend de proveedor por su código.
+    :param backend_class: Subclase de SmsBackend con 'code' y 'label'.
+    """
+    BACKENDS[backend_class.code] = backend_class
+    return backend_class
+
+
+def get_backend_class(code):
+    """
+    Clase del backend registrado con un código.
+    :raise UserError: Si no hay ningún backend con ese código.
+    """
+    backend_class = BACKENDS.get(code)
+    if backend_class is None:
+        raise UserError(f"El proveedor de SMS '{code}' no está disponible.")
+    return backend_class
+
+
+class SmsBackend:
+    """
+    Núcleo común de los proveedores de SMS: sesión HTTP compartida,
+    limitador de envío, reintentos según la clase de fallo y métricas.
+    Cada proveedor implementa la construcción del payload, la petición y
+    la clasificación de sus respuestas.
+    Esta clase no es un modelo de Odoo, sino una clase de utilidad.
+    """
+
+    # Identificador y nombre del proveedor
+    code = None
+    label = None
+
+    # Código de error que se devuelve al agotar el límite de envío local
+    throttling_error_code = -1
+
+    # Segundos de espera antes de reintentar, según la clase de fallo
+    retry_delays = {
+        OUTCOME_THROTTLED: 1,
+        OUTCOME_SERVER_ERROR: 60,
+        "connection": 60,
+    }
+    request_timeout = 20
+
+    def __init__(self, env, account=None):
+        """
+        Inicializa el backend cargando la configuración desde Odoo.
+        :param env: El entorno de Odoo (self.env de un modelo).
+        :param account: Cuenta sms_es.account a usar; por defecto, la
+        cuenta de los ajustes generales.
+        """
+        self.env = env
+        self.account_id = account.id if account else False
+        # Peticiones, respuestas de throttling y segundos en HTTP
+        # acumulados por este cliente (una ejecución del worker)
+        self.stats = {"requests": 0, "throttled": 0, "http_time": 0.0}
+        config_params = self.env["ir.config_parameter"].sudo()
+        self.api_url, self.username, self.password = (
+            self._get_default_credentials(config_params)
+        )
+        rate_limit = float(config_params.get_param(PARAM_API_RATE_LIMIT) or 0)
+        if account:
+            account = account.sudo()
+            self.api_url = account.api_url or self.api_url
+            self.username = account.api_username
+            self.password = account.api_password
+            rate_limit = account.rate_limit or rate_limit
+        self._load_settings(config_params)
+
+        # Conexiones y cupo de envío compartidos por todo el proceso
+        self.session = get_session()
+        self.rate_limiter = get_rate_limiter(rate_limit, self.account_id)
+
+        if not all([self.api_url, self.username, self.password]):
+            raise UserError(
+                f"La configuración de la API de {self.label} \
+                    (URL, usuario, contraseña) no está completa."
+            )
+
+    # --- Puntos de extensión de cada proveedor ---
+
+    def _get_default_credentials(self, config_params):
+        """
+        URL, usuario y contraseña cuando no se indica una cuenta.
+        :return: Tupla (api_url, username, password).
+        """
+        return None, None, None
+
+    def _load_settings(self, config_params):
+        """Carga las opciones propias del proveedor."""
+
+    def _build_payload(self, message_data):
+        """
+        Construye el payload de la petición a partir de los datos del
+        mensaje.
+        :param message_data: Diccionario con 'receiver', 'text',
+        'sender', 'odoo_message_id' y, opcionalmente, 'dcs'.
+        """
+        raise NotImplementedError()
+
+    def _post(self, payload):
+        """
+        Hace la petición HTTP de envío con la sesión compartida.
+        :return: Respuesta de requests.
+        """
+        return self.session.post(
+            self.api_url,
+            data=json.dumps(payload).encode("utf-8"),
+            headers={"Content-Type": "application/json; charset=utf-8"},
+            timeout=self.request_timeout,
+        )
+
+    def _classify_response(self, response):
+        """
+        Clasifica la respuesta del proveedor.
+        :return: Tupla (OUTCOME_*, datos del envío si es un éxito o
+        diccionario de error con 'code' y 'message'). Los datos de un
+        éxito usan las claves comunes 'msgId' (identificador del envío en
+        el proveedor) y 'numParts' (partes facturadas, si las indica).
+        """
+        raise NotImplementedError()
+
+    # --- Núcleo común ---
+
+    def _record_request(self, start, status):
+        """
+        Acumula la duración de una petición HTTP en las estadísticas del
+        cliente y en las métricas del proceso.
+        :param start: Valor de time.perf_counter() al iniciar la petición.
+        :param status: Código HTTP o 'error' si no hubo respuesta.
+        """
+        elapsed = time.perf_counter() - start
+        self.stats["requests"] += 1
+        self.stats["http_time"] += elapsed
+        REGISTRY.observe(
+            "sms_es_api_request_seconds", elapsed, {"status": str(status)}
+        )
+
+    def _normalize_send_data(self, data):
+        """
+        Reduce los datos de un envío aceptado a las claves comunes que
+        guardan el worker y send_now.
+        :return: Diccionario {'msgId': ..., 'numParts': ...}.
+        """
+        data = data or {}
+        if not data.get("msgId"):
+            _logger.warning(
+                "El proveedor %s aceptó el SMS sin devolver su msgId. \
+                    Datos: %s",
+                self.label,
+                data,
+            )
+        return {"msgId": data.get("msgId"), "numParts": data.get("numParts")}
+
+    def _wait_before_retry(self, reason, attempts, max_retries):
+        """Espera antes del siguiente intento, salvo tras el último."""
+        if attempts < max_retries:
+            REGISTRY.inc("sms_es_api_retries_total", {"reason": reason})
+            time.sleep(self.retry_delays[reason])
+
+    def send_sms(self, message_data, max_retries=3, rate_limit_timeout=None):
+        """
+        Envía un SMS, gestionando la construcción del
+        payload y la lógica de reintentos.
+        :param message_data: Diccionario con los datos del mensaje.
+        :param max_retries: Número máximo de
+        reintentos para errores transitorios.
+        :param rate_limit_timeout: Segundos máximos de espera por el
+        limitador de envío; None espera lo necesario.
+        :return: Un diccionario con el resultado:
+        {'status': 'success'/'failed',
+        'data': {'msgId': ..., 'numParts': ...}, 'error': ...,
+        'transient': True si el fallo puede resolverse reintentando,
+        'reason': clase del fallo (OUTCOME_*)}
+        """
+        try:
+            payload = self._build_payload(message_data)
+            _logger.info("Enviando SMS. Payload: %s", json.dumps(payload))
+        except Exception as e:
+            _logger.error("Error construyendo el payload del SMS: %s", e)
+            return {
+                "status": "failed",
+                "error": {"code": -1, "message": f"Error de payload: {e}"},
+                "transient": False,
+                "reason": OUTCOME_REJECTED,
+            }
+
+        attempts = 0
+        reason = None
+        while attempts < max_retries:
+            attempts += 1
+            if self.rate_limiter and not self.rate_limiter.acquire(
+                rate_limit_timeout
+            ):
+                _logger.info("Límite de envíos por segundo alcanzado.")
+                return {
+                    "status": "failed",
+                    "error": {
+                        "code": self.throttling_error_code,
+                        "message": "Límite de envío local alcanzado.",
+                    },
+                    "transient": True,
+                    "reason": OUTCOME_THROTTLED,
+                }
+
+            request_start = time.perf_counter()
+            try:
+                response = self._post(payload)
+            except requests.exceptions.RequestException as e:
+                self._record_request(request_start, "error")
+                reason = "connection"
+                _logger.error(
+                    "Error de conexión con la API de %s: %s.",
+                    self.label,
+                    e,
+                )
+                self._wait_before_retry("connection", attempts, max_retries)
+                continue  # Reintentar
+            self._record_request(request_start, response.status_code)
+
+            outcome, data = self._classify_response(response)
+            if outcome == OUTCOME_SUCCESS:
+                _logger.info(
+                    "SMS aceptado por la API. Respuesta: %s", response.text
+                )
+                return {
+                    "status": "success",
+                    "data": self._normalize_send_data(data),
+                }
+
+            if outcome in (OUTCOME_THROTTLED, OUTCOME_SERVER_ERROR):
+                reason = outcome
+            if outcome == OUTCOME_THROTTLED:
+                self.stats["throttled"] += 1
+                _logger.info(
+                    "Throttling de la API de %s. Reintentando...", self.label
+                )
+                self._wait_before_retry(outcome, attempts, max_retries)
+                continue  # Reintentar
+
+            if outcome == OUTCOME_SERVER_ERROR:
+                _logger.error(
+                    "Error del servidor de la API de %s (%s). \
+                        Reintentando...",
+                    self.label,
+                    response.status_code,
+                )
+                self._wait_before_retry(outcome, attempts, max_retries)
+                continue  # Reintentar
+
+            # Error definitivo, no reintentar
+            _logger.warning(
+                "SMS rechazado por la API de %s. Código: %s, Mensaje: %s",
+                self.label,
+                data.get("code"),
+                data.get("message"),
+            )
+            return {
+                "status": "failed",
+                "error": data,
+                "transient": False,
+                "reason": outcome,
+            }
+
+        _logger.error(
+            "El envío del SMS ha fallado después de %d intentos.",
+            max_retries,
+        )
+        return {
+            "status": "failed",
+            "error": {
+                "code": -1,
+                "message": f"Falló después de {max_retries} reintentos.",
+            },
+            "transient": True,
+            "reason": reason,
+        }
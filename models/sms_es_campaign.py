@@ -0,0 +1,418 @@
+# -*- coding: utf-8 -*-
+import json
+import logging
+import time
+from collections import defaultdict
+
+from odoo import models, fields, api
+
+from .sms_es_queue_job import QUEUE_LANES
+
+_logger = logging.getLogger(__name__)
+
+# Contador de la campaña en el que se cuenta cada estado del mensaje.
+# Los contadores reflejan el estado actual: cada mensaje está en uno solo.
+MESSAGE_STATE_COUNTERS = {
+    "draft": "queued_count",
+    "queued": "queued_count",
+    "sending": "queued_count",
+    "api_sent": "sent_count",
+    "dlr_buffered": "sent_count",
+    "dlr_sent_to_smsc": "sent_count",
+    "delivered": "delivered_count",
+    "api_failed": "failed_count",
+    "undelivered": "failed_count",
+    "rejected": "failed_count",
+    # Un número no válido no llega al proveedor: no es un fallo del envío
+    "invalid_number": "cancelled_count",
+    "cancelled": "cancelled_count",
+}
+# Preparación en segundo plano de los envíos grandes
+PARAM_ASYNC_SEND_BATCH_SIZE = "sms_es_connector.async_send_batch_size"
+DEFAULT_ASYNC_SEND_BATCH_SIZE = 1000
+# Tiempo máximo (segundos) de cada ejecución del cron de preparación
+PREPARE_TIME_BUDGET = 240
+
+CAMPAIGN_COUNTER_FIELDS = [
+    "message_count",
+    "queued_count",
+    "sent_count",
+    "delivered_count",
+    "failed_count",
+    "cancelled_count",
+]
+
+
+class SmsEsCampaign(models.Model):
+    _name = "sms_es.campaign"
+    _description = "Campaña de SMS"
+    _order = "create_date desc, id desc"
+
+    name = fields.Char(string="Nombre", required=True)
+    state = fields.Selection(
+        [
+            ("draft", "Borrador"),
+            ("preparing", "Preparando"),
+            ("running", "En Curso"),
+            ("paused", "Pausada"),
+            ("done", "Finalizada"),
+            ("cancelled", "Cancelada"),
+        ],
+        string="Estado",
+        default="draft",
+        required=True,
+        index=True,
+        readonly=True,
+    )
+    res_model = fields.Char(string="Modelo de Origen", readonly=True)
+    lane = fields.Selection(
+        QUEUE_LANES, string="Carril de Envío", default="bulk", readonly=True
+    )
+    message_ids = fields.One2many(
+        "sms_es.message", "campaign_id", string="Mensajes", readonly=True
+    )
+
+    # Contadores mantenidos de forma incremental por el worker y el webhook
+    # DLR, para leer el progreso sin recorrer los mensajes. Se actualizan
+    # desde sms_es.campaign_counter_delta, con hasta un minuto de retraso
+    message_count = fields.Integer(
+        string="Mensajes", default=0, readonly=True
+    )
+    queued_count = fields.Integer(
+        string="Pendientes", default=0, readonly=True
+    )
+    sent_count = fields.Integer(string="Enviados", default=0, readonly=True)
+    delivered_count = fields.Integer(
+        string="Entregados", default=0, readonly=True
+    )
+    failed_count = fields.Integer(string="Fallidos", default=0, readonly=True)
+    cancelled_count = fields.Integer(
+        string="Cancelados", default=0, readonly=True
+    )
+    progress = fields.Float(
+        string="Progreso (%)", compute="_compute_progress"
+    )
+
+    # Selección pendiente de un envío grande preparado en segundo plano
+    send_options = fields.Text(string="Opciones de Envío", readonly=True)
+    # Sin precarga: la lista puede ser muy larga y solo la lee el cron de
+    # preparación, una vez por ejecución
+    send_res_ids = fields.Text(
+        string="Registros a Enviar", readonly=True, prefetch=False
+    )
+    send_total = fields.Integer(
+        string="Registros Seleccionados", default=0, readonly=True
+    )
+    send_offset = fields.Integer(
+        string="Registros Preparados", default=0, readonly=True
+    )
+    skipped_count = fields.Integer(
+        string="Registros Omitidos",
+        default=0,
+        readonly=True,
+        help="Registros sin número de teléfono válido.",
+    )
+    prepare_progress = fields.Float(
+        string="Preparación (%)", compute="_compute_prepare_progress"
+    )
+    prepare_error = fields.Text(string="Error de Preparación", readonly=True)
+
+    @api.depends("message_count", "queued_count")
+    def _compute_progress(self):
+        for campaign in self:
+            if campaign.message_count:
+                processed = campaign.message_count - campaign.queued_count
+                campaign.progress = 100.0 * processed / campaign.message_count
+            else:
+                campaign.progress = 0.0
+
+    @api.depends("send_total", "send_offset")
+    def _compute_prepare_progress(self):
+        for campaign in self:
+            if campaign.send_total:
+                campaign.prepare_progress = (
+                    100.0 * campaign.send_offset / campaign.send_total
+                )
+            else:
+                campaign.prepare_progress = 100.0
+
+    def _invalidate_counters(self):
+        """Descarta de la caché los contadores actualizados por SQL."""
+        fnames = CAMPAIGN_COUNTER_FIELDS + ["state"]
+        if hasattr(self, "invalidate_recordset"):
+            # Odoo 16+
+            self.invalidate_recordset(fnames)
+        else:
+            self.invalidate_cache(fnames, self.ids)
+
+    @api.model
+    def _apply_counter_deltas(self, deltas):
+        """
+        Registra variaciones de los contadores con un único INSERT, sin
+        leer ni bloquear los mensajes ni la fila de la campaña: los envíos
+        y los DLR de una misma campaña no compiten por ella. El cron de
+        contadores las suma a la campaña con _fold_counter_deltas.
+        :param deltas: Diccionario {campaign_id: {contador: variación}}.
+        """
+        rows = [
+            (campaign_id, fname, delta)
+            for campaign_id, counters in deltas.items()
+            if campaign_id
+            for fname, delta in counters.items()
+            if delta and fname in CAMPAIGN_COUNTER_FIELDS
+        ]
+        if not rows:
+            return
+        self.env.cr.execute(
+            """
+            INSERT INTO sms_es_campaign_counter_delta
+                   (campaign_id, counter, delta)
+            VALUES """
+            + ", ".join(["(%s, %s, %s)"] * len(rows)),
+            [value for row in rows for value in row],
+        )
+
+    @api.model
+    def _fold_counter_deltas(self):
+        """
+        Método del cron de contadores.
+        Suma a cada campaña las variaciones pendientes con un único UPDATE
+        por campaña y da por terminadas las que no tienen mensajes
+        pendientes. Las filas en uso por otra transacción se dejan para
+        la siguiente ejecución.
+        """
+        self.env.cr.execute(
+            """
+            DELETE FROM sms_es_campaign_counter_delta
+             WHERE id IN (
+                SELECT id
+                  FROM sms_es_campaign_counter_delta
+                   FOR UPDATE SKIP LOCKED
+             )
+         RETURNING campaign_id, counter, delta
+            """
+        )
+        deltas = defaultdict(lambda: defaultdict(int))
+        for campaign_id, fname, delta in self.env.cr.fetchall():
+            deltas[campaign_id][fname] += delta
+
+        updated_ids = []
+        for campaign_id, counters in deltas.items():
+            counters = {
+                fname: delta
+                for fname, delta in counters.items()
+                if delta and fname in CAMPAIGN_COUNTER_FIELDS
+            }
+            if not counters:
+                continue
+            # Los nombres de columna provienen de CAMPAIGN_COUNTER_FIELDS
+            assignments = ", ".join(
+                f"{fname} = {fname} + %s" for fname in counters
+            )
+            self.env.cr.execute(
+                f"""
+                UPDATE sms_es_campaign
+                   SET {assignments}, write_date = now() at time zone 'UTC'
+                 WHERE id = %s
+                """,
+                list(counters.values()) + [campaign_id],
+            )
+            updated_ids.append(campaign_id)
+
+        if not updated_ids:
+            return
+        # Una campaña en curso sin mensajes pendientes ha terminado
+        self.env.cr.execute(
+            """
+            UPDATE sms_es_campaign
+               SET state = 'done'
+             WHERE id IN %s
+               AND state = 'running'
+               AND queued_count <= 0
+            """,
+            (tuple(updated_ids),),
+        )
+        self.browse(updated_ids)._invalidate_counters()
+
+    def action_start(self):
+        """Marca como en curso las campañas en borrador."""
+        self.filtered(lambda c: c.state == "draft").write(
+            {"state": "running"}
+        )
+
+    def _get_job_domain(self):
+        return [("campaign_id", "in", self.ids)]
+
+    def action_pause(self):
+        """
+        Pausa las campañas en curso: sus trabajos pendientes dejan de ser
+        reclamados por el worker hasta que se reanuden.
+        """
+        campaigns = self.filtered(lambda c: c.state == "running")
+        if not campaigns:
+            return
+        self.env["sms_es.queue_job"].pause_jobs(campaigns._get_job_domain())
+        campaigns.write({"state": "paused"})
+
+    def action_resume(self):
+        """Reanuda las campañas pausadas."""
+        campaigns = self.filtered(lambda c: c.state == "paused")
+        if not campaigns:
+            return
+        self.env["sms_es.queue_job"].resume_jobs(campaigns._get_job_domain())
+        campaigns.write({"state": "running"})
+
+    def action_cancel(self):
+        """Cancela las campañas y todos sus mensajes aún no enviados."""
+        campaigns = self.filtered(
+            lambda c: c.state in ("draft", "preparing", "running", "paused")
+        )
+        if not campaigns:
+            return
+        campaigns.write({"state": "cancelled"})
+        self.env["sms_es.queue_job"].cancel_jobs(campaigns._get_job_domain())
+
+    # ====================================================== #
+    # PREPARACIÓN DE ENVÍOS GRANDES EN SEGUNDO PLANO           #
+    # ====================================================== #
+    @api.model
+    def _process_pending_sends(self, batch_size=None, auto_commit=True):
+        """
+        Método del cron de preparación de envíos.
+        Crea y encola, en bloques confirmados uno a uno, los mensajes de
+        las campañas cuya selección supera el umbral del asistente.
+        :param batch_size: Registros por bloque; por defecto, el parámetro
+            de configuración.
+        :param auto_commit: Confirma la transacción tras cada bloque.
+        """
+        if not batch_size:
+            batch_size = int(
+                self.env["ir.config_parameter"]
+                .sudo()
+                .get_param(
+                    PARAM_ASYNC_SEND_BATCH_SIZE, DEFAULT_ASYNC_SEND_BATCH_SIZE
+                )
+            )
+        deadline = time.monotonic() + PREPARE_TIME_BUDGET
+        for campaign in self.search(
+            [("state", "=", "preparing")], order="id"
+        ):
+            # La selección se lee una sola vez por ejecución del cron,
+            # no en cada bloque
+            res_ids = campaign._get_send_res_ids()
+            while (
+                campaign.state == "preparing"
+                and time.monotonic() < deadline
+            ):
+                # Un error en una campaña no debe bloquear a las demás:
+                # se deshace solo su bloque y la campaña se cancela
+                try:
+                    with self.env.cr.savepoint():
+                        campaign._prepare_next_batch(res_ids, batch_size)
+                except Exception as e:
+                    _logger.exception(
+                        "Error preparando la campaña %d. Se cancela.",
+                        campaign.id,
+                    )
+                    campaign._invalidate_counters()
+                    campaign._fail_preparation(str(e))
+                if auto_commit:
+                    self.env.cr.commit()
+                # Relee el estado por si la campaña se ha cancelado
+                campaign._invalidate_counters()
+            if time.monotonic() >= deadline:
+                break
+
+    def _fail_preparation(self, error):
+        """
+        Cancela una campaña cuya preparación ha fallado, junto con los
+        mensajes ya encolados, y guarda el error para consultarlo.
+        """
+        self.write({"prepare_error": error, "send_res_ids": False})
+        self.action_cancel()
+
+    def _get_send_res_ids(self):
+        """
+        Devuelve la selección pendiente de la campaña.
+        :return: Lista de ids de los registros a enviar.
+        """
+        self.ensure_one()
+        return [int(i) for i in (self.send_res_ids or "").split(",") if i]
+
+    def _prepare_next_batch(self, res_ids, batch_size):
+        """
+        Crea y encola los mensajes del siguiente bloque de la selección,
+        con los permisos y la zona horaria de quien lanzó el envío.
+        :param res_ids: Selección completa, leída con _get_send_res_ids.
+        :param batch_size: Registros por bloque.
+        """
+        self.ensure_one()
+        chunk_ids = res_ids[self.send_offset:self.send_offset + batch_size]
+
+        if chunk_ids:
+            user = self.create_uid
+            options = json.loads(self.send_options or "{}")
+            wizard = (
+                self.env["sms_es.compose.wizard"]
+                .with_user(user)
+                .with_context(tz=user.tz)
+                .new(options)
+            )
+            records = wizard.env[options["res_model"]].browse(chunk_ids)
+            _messages, skipped = wizard._send_to_records(
+                records, self, offset=self.send_offset, total=len(res_ids)
+            )
+            self.write(
+                {
+                    "send_offset": self.send_offset + len(chunk_ids),
+                    "skipped_count": self.skipped_count + len(skipped),
+                }
+            )
+
+        if self.send_offset >= len(res_ids):
+            # Selección completa: la campaña pasa a enviarse. Cada registro
+            # crea un mensaje o se omite; los contadores aún no reflejan
+            # los mensajes de este bloque
+            message_count = len(res_ids) - self.skipped_count
+            self.write(
+                {
+                    "state": "running" if message_count else "done",
+                    "send_res_ids": False,
+                }
+            )
+            _logger.info(
+                "Campaña %d preparada: %d mensajes, %d registros omitidos.",
+                self.id,
+                message_count,
+                self.skipped_count,
+            )
+
+    def action_view_messages(self):
+        self.ensure_one()
+        action = self.env["ir.actions.actions"]._for_xml_id(
+            "sms_es_connector.action_sms_es_message"
+        )
+        action["domain"] = [("campaign_id", "=", self.id)]
+        return action
+
+
+class SmsEsCampaignCounterDelta(models.Model):
+    """
+    Variaciones pendientes de los contadores de las campañas. Los envíos
+    y los DLR solo insertan filas aquí; el cron de contadores las suma a
+    la campaña y las borra.
+    """
+
+    _name = "sms_es.campaign_counter_delta"
+    _description = "Variación Pendiente de Contador de Campaña"
+    _log_access = False
+
+    campaign_id = fields.Many2one(
+        "sms_es.campaign",
+        string="Campaña",
+        required=True,
+        ondelete="cascade",
+        index=True,
+    )
+    counter = fields.Char(string="Contador", required=True)
+    delta = fields.Integer(string="Variación", required=True)
@@ -1,7 +1,26 @@
 # -*- coding: utf-8 -*-
+import json
+import logging
 from odoo import models, fields, api
 from datetime import timedelta
 
+_logger = logging.getLogger(__name__)
+
+# Número de días mostrados en el historial de envíos
+HISTORY_DAYS = 30
+
+# Parámetro con la duración (segundos) de la caché de KPIs
+PARAM_KPI_CACHE_TTL = "sms_es_connector.dashboard_cache_ttl"
+DEFAULT_KPI_CACHE_TTL = 900
+
+KPI_FIELDS = [
+    "total_sent",
+    "total_delivered",
+    "total_undelivered",
+    "total_failed",
+    "delivery_rate",
+]
+
 
 class SmsDashboard(models.Model):
     _name = "sms_es.dashboard"
@@ -29,38 +48,212 @@ class SmsDashboard(models.Model):
         group_operator="avg",
     )
 
+    # --- Estado de la cola por carril ---
+    transactional_queue_depth = fields.Integer(
+        compute="_compute_lane_status", string="Cola Transaccional"
+    )
+    transactional_oldest_age = fields.Float(
+        compute="_compute_lane_status",
+        string="Espera Máxima Transaccional (s)",
+    )
+    transactional_over_target = fields.Boolean(
+        compute="_compute_lane_status",
+        string="Transaccional Fuera de Objetivo",
+    )
+    bulk_queue_depth = fields.Integer(
+        compute="_compute_lane_status", string="Cola Masiva"
+    )
+    bulk_oldest_age = fields.Float(
+        compute="_compute_lane_status", string="Espera Máxima Masiva (s)"
+    )
+    bulk_over_target = fields.Boolean(
+        compute="_compute_lane_status", string="Masivo Fuera de Objetivo"
+    )
+
+    # --- Latencia de entrega (último día con datos) ---
+    latency_date = fields.Date(
+        compute="_compute_latency", string="Fecha de Latencia"
+    )
+    latency_p50 = fields.Float(
+        compute="_compute_latency", string="Latencia p50 (s)"
+    )
+    latency_p95 = fields.Float(
+        compute="_compute_latency", string="Latencia p95 (s)"
+    )
+    latency_p99 = fields.Float(
+        compute="_compute_latency", string="Latencia p99 (s)"
+    )
+
+    # --- Caché de KPIs compartida entre workers ---
+    kpi_cache = fields.Text(string="Caché de KPIs", readonly=True)
+    kpi_cache_date = fields.Datetime(
+        string="KPIs Actualizados el", readonly=True
+    )
+
     # --- Gráficos (controlados por la vista) ---
-    message_count_by_state = fields.Char(string="Mensajes por Estado")
-    messages_over_time = fields.Char(string="Historial de Envíos")
+    # Series en JSON calculadas a partir de sms_es.message_stat
+    message_count_by_state = fields.Char(
+        compute="_compute_charts", string="Mensajes por Estado"
+    )
+    messages_over_time = fields.Char(
+        compute="_compute_charts", string="Historial de Envíos"
+    )
+
+    @api.model
+    def _get_message_count_by_state(self):
+        """
+        Obtiene el número de mensajes por estado con una única
+        consulta agrupada (GROUP BY state) sobre la tabla de estadísticas
+        precalculadas, que contiene unos pocos cientos de filas.
+        :return: Diccionario {estado: número de mensajes}.
+        """
+        groups = self.env["sms_es.message_stat"].read_group(
+            [], ["state", "message_count"], ["state"]
+        )
+        return {
+            group["state"]: group["message_count"] or 0 for group in groups
+        }
+
+    @api.model
+    def _get_daily_message_counts(self, days=HISTORY_DAYS):
+        """
+        Devuelve el número de mensajes creados por día durante los
+        últimos días, leído de la tabla de estadísticas.
+        :return: Lista de pares [fecha ISO, número de mensajes].
+        """
+        since = fields.Date.today() - timedelta(days=days)
+        self.env.cr.execute(
+            """
+            SELECT date, sum(message_count)
+              FROM sms_es_message_stat
+             WHERE date >= %s
+             GROUP BY date
+             ORDER BY date
+            """,
+            [since],
+        )
+        return [
+            [fields.Date.to_string(date), count]
+            for date, count in self.env.cr.fetchall()
+        ]
+
+    @api.model
+    def _compute_kpi_values(self):
+        """
+        Calcula los KPIs globales a partir del conteo por estado.
+        :return: Diccionario {campo KPI: valor}.
+        """
+        counts = self._get_message_count_by_state()
+
+        def count(states):
+            return sum(counts.get(state, 0) for state in states)
+
+        # Estados finales para el cálculo de la tasa de entrega
+        final_states = ["delivered", "undelivered", "rejected"]
+
+        total_delivered = count(["delivered"])
+        total_final = count(final_states)
+
+        # Cálculo de la tasa de entrega
+        if total_final > 0:
+            delivery_rate = (total_delivered / total_final) * 100
+        else:
+            delivery_rate = 0.0
+
+        return {
+            "total_sent": sum(counts.values())
+            - count(["draft", "queued", "api_failed", "invalid_number"]),
+            "total_delivered": total_delivered,
+            "total_undelivered": count(["undelivered"]),
+            "total_failed": count(["api_failed", "rejected"]),
+            "delivery_rate": delivery_rate,
+        }
+
+    @api.model
+    def _get_kpi_cache_holder(self):
+        """Registro singleton del dashboard que almacena la caché."""
+        return self.env.ref(
+            "sms_es_connector.sms_dashboard_data", raise_if_not_found=False
+        )
+
+    @api.model
+    def _get_cached_kpi_values(self):
+        """
+        Devuelve los KPIs desde la caché compartida que mantiene el cron
+        de estadísticas. Es de solo lectura: si la caché no existe o ha
+        caducado (el cron no se ejecuta) se calculan sin guardarlos, para
+        no escribir ni bloquear el registro durante una lectura.
+        :return: Diccionario {campo KPI: valor}.
+        """
+        config = self.env["ir.config_parameter"].sudo()
+        ttl = int(config.get_param(PARAM_KPI_CACHE_TTL, DEFAULT_KPI_CACHE_TTL))
+        holder = self._get_kpi_cache_holder()
+        if ttl <= 0 or not holder:
+            return self._compute_kpi_values()
+
+        holder = holder.sudo()
+        if (
+            holder.kpi_cache
+            and holder.kpi_cache_date
+            and holder.kpi_cache_date + timedelta(seconds=ttl)
+            > fields.Datetime.now()
+        ):
+            return json.loads(holder.kpi_cache)
+        return self._compute_kpi_values()
+
+    @api.model
+    def _refresh_kpi_cache(self):
+        """
+        Recalcula los KPIs y los guarda en la caché compartida. Lo llaman
+        el cron de estadísticas y el botón de refresco manual.
+        """
+        holder = self._get_kpi_cache_holder()
+        if not holder:
+            return
+        holder.sudo().write(
+            {
+                "kpi_cache": json.dumps(self._compute_kpi_values()),
+                "kpi_cache_date": fields.Datetime.now(),
+            }
+        )
 
     @api.depends("name")
     def _compute_kpis(self):
-        message_model = self.env["sms_es.message"]
+        kpis = self._get_cached_kpi_values()
+        # Los KPIs son globales: se calculan una vez para todos los registros
+        for record in self:
+            for field_name in KPI_FIELDS:
+                record[field_name] = kpis.get(field_name, 0)
+
+    def action_refresh_kpis(self):
+        """Botón de refresco manual: recalcula la caché de KPIs."""
+        self._refresh_kpi_cache()
+        return True
+
+    @api.depends("name")
+    def _compute_charts(self):
+        by_state = json.dumps(self._get_message_count_by_state())
+        over_time = json.dumps(self._get_daily_message_counts())
+        for record in self:
+            record.message_count_by_state = by_state
+            record.messages_over_time = over_time
+
+    @api.depends("name")
+    def _compute_latency(self):
+        latest = self.env["sms_es.latency_stat"].search(
+            [("dimension", "=", "total")], order="date desc", limit=1
+        )
+        for record in self:
+            record.latency_date = latest.date
+            record.latency_p50 = latest.latency_p50
+            record.latency_p95 = latest.latency_p95
+            record.latency_p99 = latest.latency_p99
+
+    @api.depends("name")
+    def _compute_lane_status(self):
+        status = self.env["sms_es.queue_job"].sudo()._get_lane_status()
         for record in self:
-            # Estados finales para el cálculo de la tasa de entrega
-            final_states = ["delivered", "undelivered", "rejected"]
-
-            # Conteo de mensajes por estado
-            record.total_sent = message_model.search_count(
-                [("state", "not in", ["draft", "queued", "api_failed"])]
-            )
-            record.total_delivered = message_model.search_count(
-                [("state", "=", "delivered")]
-            )
-            record.total_undelivered = message_model.search_count(
-                [("state", "=", "undelivered")]
-            )
-            record.total_failed = message_model.search_count(
-                [("state", "in", ["api_failed", "rejected"])]
-            )
-
-            # Cálculo de la tasa de entrega
-            total_final = message_model.search_count(
-                [("state", "in", final_states)]
-            )
-            if total_final > 0:
-                record.delivery_rate = (
-                    record.total_delivered / total_final
-                ) * 100
-            else:
-                record.delivery_rate = 0.0
+            for lane in ("transactional", "bulk"):
+                record[f"{lane}_queue_depth"] = status[lane]["depth"]
+                record[f"{lane}_oldest_age"] = status[lane]["oldest_age"]
+                record[f"{lane}_over_target"] = status[lane]["over_target"]
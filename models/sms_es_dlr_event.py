@@ -16,7 +16,8 @@ class SmsEsDlrEvent(models.Model):
         "sms_es.message", 
         string="Mensaje SMS", 
         required=True, 
-        ondelete="cascade"
+        ondelete="cascade",
+        index=True,
     )
     event = fields.Char(string="Evento", index=True)
     errorCode = fields.Integer(string="Código de Error", default=0)
@@ -26,3 +27,12 @@ class SmsEsDlrEvent(models.Model):
     sendTime = fields.Float(string="Tiempo de Envío (s)")
     dlrTime = fields.Float(string="Tiempo de DLR (s)")
     custom = JsonField(string="Datos Personalizados")
+
+    def init(self):
+        # Índice usado por el refresco incremental de latencias
+        self.env.cr.execute(
+            """
+            CREATE INDEX IF NOT EXISTS sms_es_dlr_event_create_date_idx
+                ON sms_es_dlr_event (create_date)
+            """
+        )
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+
+# Alfabeto básico GSM 03.38 (sin el carácter de escape 0x1B)
+GSM7_BASIC_CHARS = frozenset(
+    "@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞÆæßÉ"
+    " !\"#¤%&'()*+,-./0123456789:;<=>?"
+    "¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿"
+    "abcdefghijklmnopqrstuvwxyzäöñüà"
+)
+# Tabla de extensión: cada carácter ocupa dos septetos (escape + código)
+GSM7_EXTENSION_CHARS = frozenset("\f^{}\\[~]|€")
+
+# Capacidad de un mensaje simple y de cada parte de un mensaje
+# concatenado (la cabecera UDH ocupa parte de cada fragmento)
+SEGMENT_LIMITS = {
+    "gsm": (160, 153),
+    "ucs": (70, 67),
+}
+
+
+def get_non_gsm_chars(text):
+    """
+    Caracteres del texto que no pueden codificarse en GSM-7.
+    :return: Cadena con los caracteres, sin repetir y en orden.
+    """
+    return "".join(
+        char
+        for char in dict.fromkeys(text or "")
+        if char not in GSM7_BASIC_CHARS and char not in GSM7_EXTENSION_CHARS
+    )
+
+
+def detect_charset(text):
+    """
+    Codificación más barata capaz de representar el texto.
+    :return: 'gsm' o 'ucs'.
+    """
+    if set(text or "") - GSM7_BASIC_CHARS - GSM7_EXTENSION_CHARS:
+        return "ucs"
+    return "gsm"
+
+
+def _unit_sizes(text, charset):
+    """Tamaño de cada carácter en septetos (GSM) o unidades UTF-16."""
+    if charset == "gsm":
+        return [2 if char in GSM7_EXTENSION_CHARS else 1 for char in text]
+    return [2 if ord(char) > 0xFFFF else 1 for char in text]
+
+
+def count_segments(text, dcs="auto"):
+    """
+    Calcula cuántas partes ocupará un SMS antes de enviarlo.
+    Los caracteres de dos unidades (extensión GSM o pares sustitutos en
+    UCS-2) nunca se parten entre dos fragmentos.
+    :param text: Texto del mensaje.
+    :param dcs: 'gsm', 'ucs' o 'auto' para elegir según el texto.
+    :return: Tupla (codificación, número de partes, longitud en unidades).
+    """
+    text = text or ""
+    charset = detect_charset(text) if dcs not in ("gsm", "ucs") else dcs
+    single_limit, part_limit = SEGMENT_LIMITS[charset]
+
+    # Camino rápido: texto GSM sin caracteres de extensión
+    if charset == "gsm" and set(text) <= GSM7_BASIC_CHARS:
+        length = len(text)
+        if length <= single_limit:
+            return charset, 1, length
+        return charset, -(-length // part_limit), length
+
+    sizes = _unit_sizes(text, charset)
+    length = sum(sizes)
+    if length <= single_limit:
+        return charset, 1, length
+
+    parts = 1
+    used = 0
+    for size in sizes:
+        if used + size > part_limit:
+            parts += 1
+            used = 0
+        used += size
+    return charset, parts, length
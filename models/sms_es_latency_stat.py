@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+import logging
+from datetime import timedelta
+
+from odoo import models, fields, api
+from .sms_es_message_stat import STATS_REFRESH_OVERLAP
+
+_logger = logging.getLogger(__name__)
+
+# Parámetro con la marca de tiempo del último refresco de latencias
+PARAM_LATENCY_LAST_REFRESH = "sms_es_connector.latency_last_refresh"
+
+# Prefijo de operador: tres primeras cifras del número nacional
+CARRIER_PREFIX_SQL = """
+    left(
+        regexp_replace(
+            regexp_replace(m.receiver, '[^0-9]', '', 'g'), '^(00)?34', ''
+        ),
+        3
+    )
+"""
+
+# Valor de GROUPING(sender, prefix) para cada conjunto de agrupación
+GROUPING_TO_DIMENSION = {3: "total", 1: "sender", 2: "prefix"}
+
+
+class SmsEsLatencyStat(models.Model):
+    _name = "sms_es.latency_stat"
+    _description = "Estadísticas Diarias de Latencia de Entrega"
+    _order = "date desc, dimension, sender, carrier_prefix"
+
+    date = fields.Date(string="Fecha", required=True, index=True)
+    dimension = fields.Selection(
+        [
+            ("total", "Total"),
+            ("sender", "Por Remitente"),
+            ("prefix", "Por Prefijo de Operador"),
+        ],
+        string="Agrupación",
+        required=True,
+        index=True,
+    )
+    sender = fields.Char(string="Remitente")
+    carrier_prefix = fields.Char(string="Prefijo de Operador")
+    sample_count = fields.Integer(string="Partes Entregadas")
+    latency_avg = fields.Float(
+        string="Latencia Media (s)", group_operator="avg"
+    )
+    latency_p50 = fields.Float(string="Latencia p50 (s)", group_operator="avg")
+    latency_p95 = fields.Float(string="Latencia p95 (s)", group_operator="avg")
+    latency_p99 = fields.Float(string="Latencia p99 (s)", group_operator="avg")
+
+    @api.model
+    def _refresh_latency_stats(self):
+        """
+        Método del cron de latencias.
+        Recalcula los percentiles de tiempo de entrega (dlrTime - sendTime)
+        solo para los días que han recibido nuevos DLR de entrega desde el
+        último refresco. Los percentiles no se pueden acumular, por lo que
+        cada día afectado se recalcula completo.
+        """
+        config = self.env["ir.config_parameter"].sudo()
+        last_refresh = config.get_param(PARAM_LATENCY_LAST_REFRESH)
+        refresh_start = fields.Datetime.now()
+        cr = self.env.cr
+
+        if last_refresh:
+            since = fields.Datetime.from_string(last_refresh)
+            cr.execute(
+                """
+                SELECT DISTINCT create_date::date
+                  FROM sms_es_dlr_event
+                 WHERE create_date >= %s
+                   AND event = 'DELIVERED'
+                """,
+                [since - STATS_REFRESH_OVERLAP],
+            )
+        else:
+            cr.execute(
+                """
+                SELECT DISTINCT create_date::date
+                  FROM sms_es_dlr_event
+                 WHERE event = 'DELIVERED'
+                """
+            )
+        days = sorted(row[0] for row in cr.fetchall() if row[0])
+
+        if days:
+            cr.execute(
+                f"""
+                SELECT day, GROUPING(sender, prefix), sender, prefix,
+                       count(*), avg(latency),
+                       percentile_cont(ARRAY[0.5, 0.95, 0.99])
+                           WITHIN GROUP (ORDER BY latency)
+                  FROM (
+                        SELECT e.create_date::date AS day,
+                               m.sender AS sender,
+                               {CARRIER_PREFIX_SQL} AS prefix,
+                               e."dlrTime" - e."sendTime" AS latency
+                          FROM sms_es_dlr_event e
+                          JOIN sms_es_message m ON m.id = e.message_id
+                         WHERE e.create_date >= %s
+                           AND e.create_date < %s
+                           AND e.create_date::date = ANY(%s)
+                           AND e.event = 'DELIVERED'
+                           AND e."sendTime" > 0
+                           AND e."dlrTime" >= e."sendTime"
+                       ) samples
+                 GROUP BY GROUPING SETS (
+                       (day), (day, sender), (day, prefix)
+                 )
+                """,
+                [days[0], days[-1] + timedelta(days=1), days],
+            )
+            rows = cr.fetchall()
+
+            self.search([("date", "in", days)]).unlink()
+            self.create(
+                [
+                    {
+                        "date": day,
+                        "dimension": GROUPING_TO_DIMENSION[grouping],
+                        "sender": sender,
+                        "carrier_prefix": prefix,
+                        "sample_count": count,
+                        "latency_avg": avg,
+                        "latency_p50": percentiles[0],
+                        "latency_p95": percentiles[1],
+                        "latency_p99": percentiles[2],
+                    }
+                    for (
+                        day,
+                        grouping,
+                        sender,
+                        prefix,
+                        count,
+                        avg,
+                        percentiles,
+                    ) in rows
+                ]
+            )
+
+        config.set_param(
+            PARAM_LATENCY_LAST_REFRESH,
+            fields.Datetime.to_string(refresh_start),
+        )
+        _logger.info(
+            "Latencias de entrega actualizadas. %d días recalculados.",
+            len(days),
+        )
@@ -1,8 +1,18 @@
 # -*- coding: utf-8 -*-
 from odoo import models, fields, api
+from odoo.exceptions import UserError
 import uuid
 import logging
 
+from collections import defaultdict
+
+from .sms_es_campaign import MESSAGE_STATE_COUNTERS
+from .sms_es_account import SmsEsAccountPool
+from .sms_es_encoding import count_segments
+from .sms_es_metrics import REGISTRY
+from .sms_es_phone import normalize_phones
+from .sms_es_queue_job import QUEUE_LANES, invalidate_model_cache
+
 _logger = logging.getLogger(__name__)
 
 # Estados que consideramos 'finales' o 'enviados con éxito' 
@@ -16,6 +26,15 @@ DUPLICATION_CHECK_STATES = [
     "rejected",
 ]
 
+# Prefijo del nombre de los mensajes descartados por número no válido
+INVALID_NUMBER_PREFIX = "[NÚMERO INVÁLIDO] "
+
+# Si está activo, encolar SMS transaccionales despierta al worker al momento
+PARAM_INSTANT_DISPATCH = "sms_es_connector.instant_dispatch"
+
+# Segundos máximos que send_now() espera por el limitador de envío
+SEND_NOW_RATE_LIMIT_TIMEOUT = 2
+
 # Estructura para compatibilidad multi-versión
 try:
     from odoo.tools.sql import column_exists, create_column
@@ -39,6 +58,15 @@ class SmsEsMessage(models.Model):
         default=lambda self: str(uuid.uuid4()),
     )
     num_parts = fields.Integer(string="Número de Partes", default=1)
+    dcs = fields.Selection(
+        [
+            ("gsm", "GSM"),
+            ("ucs", "UCS-2"),
+        ],
+        string="Codificación",
+        help="Codificación con la que se envía el mensaje. Si no se \
+            indica, se elige según el texto al crear el mensaje.",
+    )
     state = fields.Selection(
         [
             ("draft", "Borrador"),
@@ -51,6 +79,7 @@ class SmsEsMessage(models.Model):
             ("delivered", "Entregado"),
             ("undelivered", "No Entregado"),
             ("rejected", "Rechazado"),
+            ("invalid_number", "Número Inválido"),
             ("cancelled", "Cancelado"),
         ],
         string="Estado",
@@ -59,6 +88,36 @@ class SmsEsMessage(models.Model):
         index=True,
     )
 
+    lane = fields.Selection(
+        QUEUE_LANES,
+        string="Carril de Envío",
+        default="transactional",
+        required=True,
+        help="Los SMS transaccionales tienen capacidad reservada en cada \
+            ciclo del worker y no esperan detrás de las campañas masivas.",
+    )
+
+    scheduled_datetime = fields.Datetime(
+        string="Envío Programado",
+        help="Momento a partir del cual el worker puede enviar el mensaje. \
+            Si está vacío, se envía en el siguiente ciclo.",
+    )
+
+    campaign_id = fields.Many2one(
+        "sms_es.campaign",
+        string="Campaña",
+        ondelete="set null",
+        index=True,
+        readonly=True,
+    )
+    account_id = fields.Many2one(
+        "sms_es.account",
+        string="Cuenta del Proveedor",
+        ondelete="set null",
+        index=True,
+        readonly=True,
+    )
+
     # Campos genéricos para relación polimórfica
     res_id = fields.Integer(string="ID del Registro de Origen")
     res_model = fields.Char(string="Modelo de Origen")
@@ -75,6 +134,117 @@ class SmsEsMessage(models.Model):
         "sms_es.dlr_event", "message_id", string="Historial de Entrega (DLR)"
     )
 
+    # Resumen de entrega mantenido de forma incremental por el webhook DLR,
+    # para no tener que recorrer dlr_event_ids en vistas e informes
+    last_event = fields.Char(string="Último Evento DLR", readonly=True)
+    last_dlr_time = fields.Float(
+        string="Último Tiempo de DLR (s)", readonly=True
+    )
+    delivered_parts = fields.Integer(
+        string="Partes Entregadas", default=0, readonly=True
+    )
+    # Números de parte ya entregados, separados por comas, para no contar
+    # dos veces un DLR reenviado sin consultar los eventos
+    delivered_part_nums = fields.Char(
+        string="Números de Parte Entregados", readonly=True
+    )
+    last_error_code = fields.Integer(
+        string="Último Código de Error", default=0, readonly=True
+    )
+
+    def init(self):
+        # Índices usados por el refresco incremental de estadísticas
+        self.env.cr.execute(
+            """
+            CREATE INDEX IF NOT EXISTS sms_es_message_create_date_idx
+                ON sms_es_message (create_date)
+            """
+        )
+        self.env.cr.execute(
+            """
+            CREATE INDEX IF NOT EXISTS sms_es_message_write_date_idx
+                ON sms_es_message (write_date)
+            """
+        )
+
+    # ====================================================== #
+    # NORMALIZACIÓN Y SEGMENTOS                                #
+    # ====================================================== #
+    @api.model
+    def _normalize_receivers(self, vals_list):
+        """
+        Normaliza en una sola pasada el receptor de una lista de valores.
+        Los números no válidos se conservan tal cual para que
+        action_queue_sms los rechace.
+        """
+        normalized = normalize_phones(
+            vals["receiver"] for vals in vals_list if vals.get("receiver")
+        )
+        for vals in vals_list:
+            if normalized.get(vals.get("receiver")):
+                vals["receiver"] = normalized[vals["receiver"]]
+        return vals_list
+
+    @api.model
+    def _prepare_segment_vals(self, vals_list):
+        """
+        Calcula la codificación y el número de partes de cada mensaje
+        antes de enviarlo. La API confirma numParts al aceptar el envío.
+        """
+        default_dcs = (
+            self.env["ir.config_parameter"]
+            .sudo()
+            .get_param("sms_es_connector.dcs", "gsm")
+        )
+        for vals in vals_list:
+            if not vals.get("text"):
+                continue
+            charset, parts, _length = count_segments(
+                vals["text"], vals.get("dcs") or default_dcs
+            )
+            vals.setdefault("dcs", charset)
+            vals.setdefault("num_parts", parts)
+        return vals_list
+
+    # ====================================================== #
+    # CONTADORES DE CAMPAÑA                                    #
+    # ====================================================== #
+    @api.model_create_multi
+    def create(self, vals_list):
+        vals_list = self._normalize_receivers(vals_list)
+        vals_list = self._prepare_segment_vals(vals_list)
+        messages = super(SmsEsMessage, self).create(vals_list)
+        deltas = defaultdict(lambda: defaultdict(int))
+        for message in messages.filtered("campaign_id"):
+            counters = deltas[message.campaign_id.id]
+            counters["message_count"] += 1
+            counters[MESSAGE_STATE_COUNTERS.get(message.state)] += 1
+        if deltas:
+            self.env["sms_es.campaign"]._apply_counter_deltas(deltas)
+        return messages
+
+    def write(self, vals):
+        if vals.get("receiver"):
+            vals = self._normalize_receivers([dict(vals)])[0]
+        if "state" not in vals and "campaign_id" not in vals:
+            return super(SmsEsMessage, self).write(vals)
+
+        # Resta los mensajes de su contador actual antes de escribir y los
+        # suma al nuevo después, agrupando por campaña
+        deltas = defaultdict(lambda: defaultdict(int))
+        for message in self.filtered("campaign_id"):
+            counters = deltas[message.campaign_id.id]
+            counters["message_count"] -= 1
+            counters[MESSAGE_STATE_COUNTERS.get(message.state)] -= 1
+        res = super(SmsEsMessage, self).write(vals)
+        for message in self.filtered("campaign_id"):
+            counters = deltas[message.campaign_id.id]
+            counters["message_count"] += 1
+            counters[MESSAGE_STATE_COUNTERS.get(message.state)] += 1
+        if deltas:
+            self.env["sms_es.campaign"]._apply_counter_deltas(deltas)
+        return res
+
     # ====================================================== #
     # MÉTODO PARA VALORES POR DEFECTO AL CREAR MANUALMENTE     #
     # ====================================================== #
@@ -113,6 +283,51 @@ class SmsEsMessage(models.Model):
         ]
         return self.search_count(domain) > 0
 
+    def _prepare_dlr_summary_vals(self, dlr_data):
+        """
+        Calcula los valores del resumen de entrega a partir de un DLR
+        recibido, partiendo del resumen ya almacenado en el mensaje.
+        :param dlr_data: Diccionario con el cuerpo del DLR.
+        :return: Diccionario de valores a escribir en el mensaje.
+        """
+        self.ensure_one()
+        vals = {}
+        event = dlr_data.get("event")
+
+        if event == "DELIVERED":
+            # Si el proveedor reenvía el DLR de una parte ya entregada no
+            # se cuenta de nuevo; sin número de parte, al menos no se
+            # superan las partes del mensaje
+            part_num = str(dlr_data.get("partNum") or "")
+            part_nums = [
+                num for num in (self.delivered_part_nums or "").split(",")
+                if num
+            ]
+            if part_num and part_num not in part_nums:
+                vals["delivered_part_nums"] = ",".join(part_nums + [part_num])
+            if not part_num or part_num not in part_nums:
+                total_parts = max(
+                    self.num_parts or 1, dlr_data.get("numParts") or 1
+                )
+                vals["delivered_parts"] = min(
+                    self.delivered_parts + 1, total_parts
+                )
+
+        try:
+            dlr_time = float(dlr_data.get("dlrTime") or 0.0)
+        except (TypeError, ValueError):
+            dlr_time = 0.0
+
+        # Los DLR pueden llegar desordenados: solo el más reciente
+        # sustituye al último evento registrado
+        if not dlr_time or dlr_time >= self.last_dlr_time:
+            vals["last_event"] = event
+            vals["last_error_code"] = dlr_data.get("errorCode") or 0
+            if dlr_time:
+                vals["last_dlr_time"] = dlr_time
+
+        return vals
+
     def action_queue_sms(self):
         """
         Acción principal para encolar mensajes.
@@ -120,8 +335,53 @@ class SmsEsMessage(models.Model):
         Esta es la función que debe ser llamada desde otros módulos 
         (CRM, Ventas, etc.).
         """
+        messages_to_queue = self._filter_sendable()
+        if not messages_to_queue:
+            return
+
+        messages_to_queue._create_queue_jobs()
+        self._trigger_instant_dispatch(messages_to_queue)
+
+    def _mark_invalid_number(self):
+        """
+        Marca los mensajes como número no válido con una sola escritura y
+        añade el prefijo a sus nombres con un único UPDATE. Es un estado
+        propio: no lo causa el proveedor, así que no cuenta como fallo del
+        envío ni bloquea como duplicado un envío posterior corregido.
+        """
+        _logger.info(
+            "Número de receptor no válido en %d mensajes. \
+                Descartando mensajes IDs %s.",
+            len(self),
+            self.ids,
+        )
+        self.write({"state": "invalid_number"})
+        self.env.cr.execute(
+            """
+            UPDATE sms_es_message
+               SET name = %s || name
+             WHERE id IN %s
+            """,
+            (INVALID_NUMBER_PREFIX, tuple(self.ids)),
+        )
+        invalidate_model_cache(self, ["name"])
+
+    def _filter_sendable(self):
+        """
+        Descarta los mensajes en borrador con un número no válido y cancela
+        los duplicados de otros ya enviados.
+        :return: Mensajes en borrador que pueden enviarse.
+        """
+        drafts = self.filtered(lambda m: m.state == "draft")
+        # Los números no válidos se descartan antes de ocupar un trabajo de
+        # la cola y una llamada a la API
+        normalized = normalize_phones(drafts.mapped("receiver"))
+        invalid = drafts.filtered(lambda m: not normalized.get(m.receiver))
+        if invalid:
+            invalid._mark_invalid_number()
+
         messages_to_queue = self.browse()
-        for message in self.filtered(lambda m: m.state == "draft"):
+        for message in drafts - invalid:
             is_duplicate = self._check_for_duplicates(
                 message.sender, message.receiver, message.text
             )
@@ -143,22 +403,131 @@ class SmsEsMessage(models.Model):
 
             messages_to_queue |= message
 
-        if not messages_to_queue:
-            return
+        return messages_to_queue
+
+    def _create_queue_jobs(self):
+        """Crea un trabajo en la cola por mensaje y los marca encolados."""
+        job_vals_list = []
+        for message in self:
+            job_vals = {
+                "name": f"SMS para {message.receiver}: {message.name}",
+                "message_id": message.id,
+                "lane": message.lane,
+                "campaign_id": message.campaign_id.id,
+            }
+            # Sin programación, next_try_datetime se establece a now() por
+            # defecto, para que el worker lo recoja en el siguiente ciclo.
+            if message.scheduled_datetime:
+                job_vals["next_try_datetime"] = message.scheduled_datetime
+            job_vals_list.append(job_vals)
+        self.env["sms_es.queue_job"].create(job_vals_list)
+
+        self.write({"state": "queued"})
+        _logger.info(
+            "%d mensajes SMS han sido añadidos a la cola de envío.",
+            len(self),
+        )
 
-        # Encolar todos los mensajes no duplicados
-        for message in messages_to_queue:
-            self.env["sms_es.queue_job"].create(
+    def _get_send_data(self):
+        """Datos del mensaje que necesita el cliente de la API."""
+        self.ensure_one()
+        return {
+            "receiver": self.receiver,
+            "sender": self.sender,
+            "text": self.text,
+            "dcs": self.dcs,
+            "odoo_message_id": self.id,
+        }
+
+    def send_now(self):
+        """
+        Envía el mensaje al momento, sin pasar por la cola, y devuelve el
+        identificador del proveedor. Pensado para SMS transaccionales
+        individuales (2FA, recordatorios) que necesitan el resultado en
+        la misma llamada.
+        Usa la sesión HTTP y el limitador de envío compartidos con el
+        worker. Si el fallo es transitorio (throttling, error del servidor
+        o de red) el mensaje se encola para que lo reintente el worker.
+        :return: msgId del proveedor, o False si el mensaje no se ha
+            enviado (consulte su estado: encolado, rechazado, cancelado o
+            fallido).
+        """
+        self.ensure_one()
+        if self.state != "draft":
+            raise UserError(
+                "Solo pueden enviarse mensajes en estado borrador."
+            )
+        if not self._filter_sendable():
+            return False
+
+        # Una configuración incompleta se propaga como UserError; si todas
+        # las cuentas están en pausa, el resultado es un fallo transitorio
+        result, account_id = SmsEsAccountPool(self.env).send(
+            self._get_send_data(),
+            max_retries=1,
+            rate_limit_timeout=SEND_NOW_RATE_LIMIT_TIMEOUT,
+        )
+        if result.get("status") == "success":
+            self.write(
                 {
-                    "name": f"SMS para {message.receiver}: {message.name}",
-                    "message_id": message.id,
-                    # next_try_datetime se establece a now() por defecto,
-                    # para que el worker lo recoja en el siguiente ciclo.
+                    "state": "api_sent",
+                    "msg_id": result["data"].get("msgId"),
+                    "num_parts": result["data"].get("numParts"),
+                    "account_id": account_id,
                 }
             )
+            REGISTRY.inc("sms_es_send_now_total", {"outcome": "sent"})
+            return self.msg_id
 
-        messages_to_queue.write({"state": "queued"})
-        _logger.info(
-            "%d mensajes SMS han sido añadidos a la cola de envío.",
-            len(messages_to_queue),
+        error = result.get("error", {})
+        if result.get("transient"):
+            _logger.warning(
+                "Envío inmediato del mensaje ID %d aplazado (%s). \
+                    Se encola para reintentarlo.",
+                self.id,
+                error.get("message"),
+            )
+            self._create_queue_jobs()
+            self._trigger_instant_dispatch(self)
+            REGISTRY.inc("sms_es_send_now_total", {"outcome": "queued"})
+        else:
+            _logger.error(
+                "Envío inmediato del mensaje ID %d fallido. \
+                    Código: %s, Mensaje: %s",
+                self.id,
+                error.get("code"),
+                error.get("message"),
+            )
+            self.write({"state": "api_failed"})
+            REGISTRY.inc("sms_es_send_now_total", {"outcome": "failed"})
+        return False
+
+    @api.model
+    def _trigger_instant_dispatch(self, messages):
+        """
+        Despierta el worker de la cola en cuanto se confirme la
+        transacción si hay mensajes transaccionales listos para enviar,
+        en lugar de esperar hasta un minuto al siguiente ciclo del cron.
+        ir.cron._trigger registra el disparo y, tras el commit, emite un
+        NOTIFY de PostgreSQL que despierta a los hilos de cron. El cron de
+        cada minuto sigue funcionando como red de seguridad, y es el único
+        mecanismo en versiones anteriores a Odoo 14, sin ir.cron._trigger.
+        :param messages: Mensajes recién encolados.
+        """
+        config = self.env["ir.config_parameter"].sudo()
+        if not config.get_param(PARAM_INSTANT_DISPATCH):
+            return
+        now = fields.Datetime.now()
+        urgent = messages.filtered(
+            lambda m: m.lane == "transactional"
+            and (not m.scheduled_datetime or m.scheduled_datetime <= now)
+        )
+        if not urgent:
+            return
+        cron = self.env.ref(
+            "sms_es_connector.ir_cron_sms_queue_worker",
+            raise_if_not_found=False,
         )
+        if cron and hasattr(cron, "_trigger"):
+            # Odoo 14+
+            cron.sudo()._trigger()
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+import logging
+from datetime import timedelta
+
+from odoo import models, fields, api
+
+_logger = logging.getLogger(__name__)
+
+# Parámetro con la marca de tiempo del último refresco de estadísticas
+PARAM_STATS_LAST_REFRESH = "sms_es_connector.stats_last_refresh"
+
+# Margen de solape para no perder mensajes escritos por transacciones
+# largas que confirman después del último refresco
+STATS_REFRESH_OVERLAP = timedelta(minutes=10)
+
+
+class SmsEsMessageStat(models.Model):
+    _name = "sms_es.message_stat"
+    _description = "Estadísticas Horarias de Mensajes SMS"
+    _order = "bucket desc"
+
+    bucket = fields.Datetime(string="Hora", required=True, index=True)
+    date = fields.Date(string="Fecha", required=True, index=True)
+    hour = fields.Integer(string="Hora del Día")
+    state = fields.Selection(
+        selection="_get_state_selection", string="Estado", index=True
+    )
+    sender = fields.Char(string="Remitente")
+    res_model = fields.Char(string="Modelo de Origen")
+    message_count = fields.Integer(string="Número de Mensajes")
+
+    @api.model
+    def _get_state_selection(self):
+        return self.env["sms_es.message"]._fields["state"].selection
+
+    @api.model
+    def _refresh_stats(self):
+        """
+        Método del cron de estadísticas.
+        Recalcula únicamente las horas que contienen mensajes creados o
+        modificados desde el último refresco, en lugar de recorrer toda
+        la tabla de mensajes.
+        """
+        config = self.env["ir.config_parameter"].sudo()
+        last_refresh = config.get_param(PARAM_STATS_LAST_REFRESH)
+        refresh_start = fields.Datetime.now()
+        cr = self.env.cr
+
+        if last_refresh:
+            since = fields.Datetime.from_string(last_refresh)
+            cr.execute(
+                """
+                SELECT DISTINCT date_trunc('hour', create_date)
+                  FROM sms_es_message
+                 WHERE write_date >= %s
+                """,
+                [since - STATS_REFRESH_OVERLAP],
+            )
+        else:
+            cr.execute(
+                """
+                SELECT DISTINCT date_trunc('hour', create_date)
+                  FROM sms_es_message
+                """
+            )
+        buckets = sorted(row[0] for row in cr.fetchall() if row[0])
+
+        if buckets:
+            # El rango sobre create_date permite usar su índice
+            cr.execute(
+                """
+                SELECT date_trunc('hour', create_date) AS bucket,
+                       state, sender, res_model, count(*)
+                  FROM sms_es_message
+                 WHERE create_date >= %s
+                   AND create_date < %s
+                   AND date_trunc('hour', create_date) = ANY(%s)
+                 GROUP BY 1, 2, 3, 4
+                """,
+                [buckets[0], buckets[-1] + timedelta(hours=1), buckets],
+            )
+            rows = cr.fetchall()
+
+            self.search([("bucket", "in", buckets)]).unlink()
+            self.create(
+                [
+                    {
+                        "bucket": bucket,
+                        "date": bucket.date(),
+                        "hour": bucket.hour,
+                        "state": state,
+                        "sender": sender,
+                        "res_model": res_model,
+                        "message_count": count,
+                    }
+                    for bucket, state, sender, res_model, count in rows
+                ]
+            )
+
+        config.set_param(
+            PARAM_STATS_LAST_REFRESH, fields.Datetime.to_string(refresh_start)
+        )
+        # Los KPIs del dashboard se precalculan aquí para que su lectura
+        # no tenga que escribir la caché
+        self.env["sms_es.dashboard"]._refresh_kpi_cache()
+        _logger.info(
+            "Estadísticas de SMS actualizadas. %d horas recalculadas.",
+            len(buckets),
+        )
@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+import logging
+from datetime import timedelta
+
+from odoo import models, fields, api
+from .sms_es_metrics import REGISTRY, render_totals
+
+_logger = logging.getLogger(__name__)
+
+# Segundos mínimos entre dos volcados de las métricas de un proceso
+METRICS_FLUSH_INTERVAL = 60
+# Días que se conservan las muestras guardadas
+METRICS_RETENTION_DAYS = 30
+
+
+def _join_labels(label_pairs):
+    """Etiquetas guardadas como texto: 'state=pending,lane=bulk'."""
+    return ",".join(f"{name}={value}" for name, value in label_pairs)
+
+
+def _split_labels(labels):
+    """Pares (etiqueta, valor) de unas etiquetas guardadas como texto."""
+    return tuple(
+        tuple(pair.split("=", 1)) for pair in (labels or "").split(",") if pair
+    )
+
+
+class SmsEsMetric(models.Model):
+    _name = "sms_es.metric"
+    _description = "Métricas del Conector SMS"
+    _order = "timestamp desc"
+
+    timestamp = fields.Datetime(
+        string="Fecha", required=True, index=True, default=fields.Datetime.now
+    )
+    name = fields.Char(string="Métrica", required=True, index=True)
+    labels = fields.Char(string="Etiquetas")
+    kind = fields.Selection(
+        [
+            ("counter", "Contador"),
+            ("histogram", "Histograma"),
+            ("gauge", "Indicador"),
+        ],
+        string="Tipo",
+        required=True,
+    )
+    count = fields.Float(
+        string="Número",
+        help="Incremento del contador, número de observaciones del \
+            histograma o valor del indicador.",
+    )
+    total = fields.Float(
+        string="Suma", help="Suma de las observaciones del histograma."
+    )
+    average = fields.Float(
+        string="Media", group_operator="avg", readonly=True
+    )
+    # Ya sumada a sms_es.metric_total por el cron de métricas
+    folded = fields.Boolean(string="Acumulada", default=False)
+
+    def init(self):
+        # Índice parcial con solo las muestras aún no acumuladas
+        self.env.cr.execute(
+            """
+            CREATE INDEX IF NOT EXISTS sms_es_metric_unfolded_idx
+                ON sms_es_metric (id)
+             WHERE folded IS NOT TRUE
+            """
+        )
+
+    @api.model
+    def _get_queue_gauges(self):
+        """
+        Profundidad de la cola por estado y carril, leída de la base de
+        datos en el momento.
+        :return: Lista de (nombre, etiquetas, valor).
+        """
+        groups = self.env["sms_es.queue_job"].sudo().read_group(
+            [], ["state", "lane"], ["state", "lane"], lazy=False
+        )
+        return [
+            (
+                "sms_es_queue_jobs",
+                {"state": group["state"], "lane": group["lane"] or ""},
+                group["__count"],
+            )
+            for group in groups
+        ]
+
+    @api.model
+    def _flush_metrics(self, force=False, with_gauges=False):
+        """
+        Guarda en la base de datos lo registrado por este proceso desde
+        el último volcado. Sin `force`, no hace nada si el último volcado
+        es de hace menos de METRICS_FLUSH_INTERVAL segundos, así que puede
+        llamarse desde el código caliente.
+        :param with_gauges: Guarda también la profundidad de la cola.
+        :return: Número de muestras guardadas.
+        """
+        if not force and not REGISTRY.flush_due(METRICS_FLUSH_INTERVAL):
+            return 0
+        now = fields.Datetime.now()
+        vals_list = [
+            {
+                "timestamp": now,
+                "name": delta["name"],
+                "labels": _join_labels(delta["labels"]),
+                "kind": delta["kind"],
+                "count": delta["count"],
+                "total": delta["sum"],
+                "average": (
+                    delta["sum"] / delta["count"]
+                    if delta["kind"] == "histogram"
+                    else 0.0
+                ),
+            }
+            for delta in REGISTRY.collect_deltas()
+        ]
+        if with_gauges:
+            vals_list += [
+                {
+                    "timestamp": now,
+                    "name": name,
+                    "labels": _join_labels(sorted(labels.items())),
+                    "kind": "gauge",
+                    "count": value,
+                }
+                for name, labels, value in self._get_queue_gauges()
+            ]
+        if vals_list:
+            self.sudo().create(vals_list)
+        return len(vals_list)
+
+    @api.model
+    def _run_metrics_flush(self):
+        """
+        Método del cron de métricas: guarda las métricas del proceso y la
+        profundidad de la cola, suma las muestras nuevas a los totales,
+        avisa de los carriles que superan su objetivo de latencia y borra
+        las muestras antiguas.
+        """
+        saved = self._flush_metrics(force=True, with_gauges=True)
+        self._fold_metric_totals()
+        self.env["sms_es.queue_job"].sudo()._check_lane_latency_targets()
+        limit = fields.Datetime.now() - timedelta(days=METRICS_RETENTION_DAYS)
+        self.env.cr.execute(
+            "DELETE FROM sms_es_metric WHERE timestamp < %s", [limit]
+        )
+        _logger.info(
+            "Métricas de SMS guardadas: %d muestras nuevas, %d eliminadas.",
+            saved,
+            self.env.cr.rowcount,
+        )
+
+    @api.model
+    def _fold_metric_totals(self):
+        """
+        Suma a sms_es.metric_total los contadores e histogramas guardados
+        por todos los procesos desde la última ejecución. Solo lo llama el
+        cron de métricas, de modo que los totales no compiten entre
+        procesos y nunca disminuyen, aunque se borren las muestras.
+        :return: Número de muestras acumuladas.
+        """
+        self.env.cr.execute(
+            """
+            UPDATE sms_es_metric
+               SET folded = TRUE
+             WHERE folded IS NOT TRUE
+               AND kind IN ('counter', 'histogram')
+         RETURNING name, coalesce(labels, ''), kind, count, total
+            """
+        )
+        rows = self.env.cr.fetchall()
+        totals = {}
+        for name, labels, kind, count, total in rows:
+            current = totals.setdefault((name, labels, kind), [0.0, 0.0])
+            current[0] += count or 0.0
+            current[1] += total or 0.0
+        for (name, labels, kind), (count, total) in totals.items():
+            self.env.cr.execute(
+                """
+                INSERT INTO sms_es_metric_total
+                       (name, labels, kind, count, total)
+                VALUES (%s, %s, %s, %s, %s)
+                ON CONFLICT (name, labels) DO UPDATE
+                   SET count = sms_es_metric_total.count + EXCLUDED.count,
+                       total = sms_es_metric_total.total + EXCLUDED.total
+                """,
+                (name, labels, kind, count, total),
+            )
+        return len(rows)
+
+    @api.model
+    def _render_metrics(self):
+        """
+        Texto del endpoint de métricas: totales de todos los procesos
+        hasta el último cron de métricas y profundidad actual de la cola.
+        El resultado es el mismo lo sirva el worker HTTP que lo sirva.
+        """
+        self.env.cr.execute(
+            """
+            SELECT name, labels, kind, count, total
+              FROM sms_es_metric_total
+            """
+        )
+        totals = [
+            (name, _split_labels(labels), kind, count, total)
+            for name, labels, kind, count, total in self.env.cr.fetchall()
+        ]
+        return render_totals(totals, gauges=self._get_queue_gauges())
+
+
+class SmsEsMetricTotal(models.Model):
+    """
+    Totales acumulados de los contadores e histogramas de todos los
+    procesos desde la instalación, expuestos por el endpoint de métricas.
+    """
+
+    _name = "sms_es.metric_total"
+    _description = "Total Acumulado de Métrica del Conector SMS"
+    _log_access = False
+
+    name = fields.Char(string="Métrica", required=True)
+    labels = fields.Char(string="Etiquetas", required=True, default="")
+    kind = fields.Selection(
+        [("counter", "Contador"), ("histogram", "Histograma")],
+        string="Tipo",
+        required=True,
+    )
+    count = fields.Float(string="Número")
+    total = fields.Float(string="Suma")
+
+    _sql_constraints = [
+        (
+            "name_labels_uniq",
+            "unique(name, labels)",
+            "Solo puede haber un total por métrica y etiquetas.",
+        )
+    ]
@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+from contextlib import contextmanager
+
+# Límites (en segundos) de los intervalos de los histogramas
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30,
+)
+
+# Métricas del conector: nombre -> (tipo, descripción)
+METRICS = {
+    "sms_es_api_request_seconds": (
+        "histogram",
+        "Duración de las peticiones a la API de SMS.es por código HTTP.",
+    ),
+    "sms_es_api_retries_total": (
+        "counter",
+        "Reintentos de envío a la API por clase de error.",
+    ),
+    "sms_es_queue_claim_seconds": (
+        "histogram",
+        "Duración de la selección de trabajos en cada ciclo del worker.",
+    ),
+    "sms_es_queue_commit_seconds": (
+        "histogram",
+        "Duración de los commits del worker de la cola.",
+    ),
+    "sms_es_queue_jobs_processed_total": (
+        "counter",
+        "Trabajos procesados por el worker por resultado.",
+    ),
+    "sms_es_queue_retries_total": (
+        "counter",
+        "Reintentos programados por el worker por código de error.",
+    ),
+    "sms_es_send_now_total": (
+        "counter",
+        "Envíos inmediatos (send_now) por resultado.",
+    ),
+    "sms_es_dlr_ingest_seconds": (
+        "histogram",
+        "Duración del procesamiento de cada DLR recibido.",
+    ),
+    "sms_es_dlr_unmatched_total": (
+        "counter",
+        "DLR recibidos sin un mensaje de Odoo correspondiente.",
+    ),
+    "sms_es_queue_jobs": (
+        "gauge",
+        "Trabajos de la cola por estado y carril.",
+    ),
+}
+
+
+def _label_key(labels):
+    """Clave ordenada e inmutable de un diccionario de etiquetas."""
+    return tuple(sorted((labels or {}).items()))
+
+
+def format_labels(label_key, extra=()):
+    """
+    Etiquetas en el formato de exposición de Prometheus.
+    :param label_key: Tupla de pares (etiqueta, valor).
+    :return: Cadena '{a="1",b="2"}' o '' si no hay etiquetas.
+    """
+    pairs = list(label_key) + list(extra)
+    if not pairs:
+        return ""
+    return "{%s}" % ",".join(
+        '%s="%s"'
+        % (
+            name,
+            str(value)
+            .replace("\\", "\\\\")
+            .replace('"', '\\"')
+            .replace("\n", "\\n"),
+        )
+        for name, value in pairs
+    )
+
+
+def _format_number(value):
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _add_gauges(samples, gauges):
+    for name, labels, value in gauges or []:
+        samples.setdefault(name, []).append(
+            f"{name}{format_labels(_label_key(labels))} "
+            f"{_format_number(value)}"
+        )
+
+
+def _render_samples(samples, kinds=None):
+    """
+    Une las muestras de cada métrica con sus líneas HELP y TYPE.
+    :param samples: Diccionario {nombre: [líneas de muestra]}.
+    :param kinds: Tipos que sustituyen a los de METRICS, por nombre.
+    """
+    output = []
+    for name in sorted(samples):
+        kind, description = METRICS.get(name, ("untyped", ""))
+        kind = (kinds or {}).get(name, kind)
+        output.append(f"# HELP {name} {description}")
+        output.append(f"# TYPE {name} {kind}")
+        output.extend(samples[name])
+    return "\n".join(output) + "\n"
+
+
+def render_totals(totals, gauges=None):
+    """
+    Exposición en formato de texto de Prometheus de los totales sumados
+    de todos los procesos. Sin los intervalos de cada observación, los
+    histogramas se exponen como 'summary', solo con _sum y _count.
+    :param totals: Lista de (nombre, etiquetas, tipo, número, suma), con
+        las etiquetas como tupla de pares (etiqueta, valor).
+    :param gauges: Lista opcional de (nombre, etiquetas, valor).
+    """
+    samples = {}
+    kinds = {}
+    for name, label_key, kind, count, total in sorted(totals):
+        labels = format_labels(label_key)
+        lines = samples.setdefault(name, [])
+        if kind == "histogram":
+            kinds[name] = "summary"
+            lines.append(f"{name}_sum{labels} {_format_number(total)}")
+            lines.append(f"{name}_count{labels} {_format_number(count)}")
+        else:
+            lines.append(f"{name}{labels} {_format_number(count)}")
+    _add_gauges(samples, gauges)
+    return _render_samples(samples, kinds)
+
+
+class MetricsRegistry:
+    """
+    Registro de métricas en memoria del proceso (contadores e
+    histogramas), seguro entre hilos.
+    Esta clase no es un modelo de Odoo, sino una clase de utilidad.
+
+    Los valores son acumulados desde el arranque del proceso, como espera
+    un scraper de tipo Prometheus; `collect_deltas` devuelve además lo
+    registrado desde la última llamada, para guardarlo en la base de
+    datos.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._flushed_counters = {}
+        self._flushed_histograms = {}
+        self.last_flush = time.monotonic()
+
+    def inc(self, name, labels=None, value=1):
+        """Incrementa un contador."""
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, labels=None):
+        """Registra una observación en un histograma."""
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {
+                    "buckets": [0] * len(self.buckets),
+                    "sum": 0.0,
+                    "count": 0,
+                }
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram["buckets"][index] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+
+    @contextmanager
+    def timer(self, name, labels=None):
+        """Mide la duración del bloque y la registra en un histograma."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, labels)
+
+    def reset(self):
+        """Borra todas las métricas (usado en las pruebas)."""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self._flushed_counters.clear()
+            self._flushed_histograms.clear()
+            self.last_flush = time.monotonic()
+
+    def flush_due(self, interval):
+        """True si han pasado `interval` segundos desde el último volcado."""
+        return time.monotonic() - self.last_flush >= interval
+
+    def collect_deltas(self):
+        """
+        Valores registrados desde la última llamada.
+        :return: Lista de diccionarios con 'name', 'labels' (tupla),
+            'kind', 'count' y 'sum'.
+        """
+        deltas = []
+        with self._lock:
+            for key, value in self._counters.items():
+                delta = value - self._flushed_counters.get(key, 0)
+                if delta:
+                    deltas.append(
+                        {
+                            "name": key[0],
+                            "labels": key[1],
+                            "kind": "counter",
+                            "count": delta,
+                            "sum": delta,
+                        }
+                    )
+                    self._flushed_counters[key] = value
+            for key, histogram in self._histograms.items():
+                count, total = self._flushed_histograms.get(key, (0, 0.0))
+                if histogram["count"] > count:
+                    deltas.append(
+                        {
+                            "name": key[0],
+                            "labels": key[1],
+                            "kind": "histogram",
+                            "count": histogram["count"] - count,
+                            "sum": histogram["sum"] - total,
+                        }
+                    )
+                    self._flushed_histograms[key] = (
+                        histogram["count"],
+                        histogram["sum"],
+                    )
+            self.last_flush = time.monotonic()
+        return deltas
+
+    def render(self, gauges=None):
+        """
+        Exposición en formato de texto de Prometheus.
+        :param gauges: Lista opcional de (nombre, etiquetas, valor) con
+            valores calculados en el momento (profundidad de la cola...).
+        :return: Texto listo para devolver en el endpoint de métricas.
+        """
+        samples = {}
+        with self._lock:
+            for (name, label_key), value in sorted(self._counters.items()):
+                samples.setdefault(name, []).append(
+                    f"{name}{format_labels(label_key)} "
+                    f"{_format_number(value)}"
+                )
+            for (name, label_key), histogram in sorted(
+                self._histograms.items()
+            ):
+                lines = samples.setdefault(name, [])
+                bounds = self.buckets + (float("inf"),)
+                counts = histogram["buckets"] + [histogram["count"]]
+                for bound, count in zip(bounds, counts):
+                    labels = format_labels(
+                        label_key, [("le", _format_number(bound))]
+                    )
+                    lines.append(f"{name}_bucket{labels} {count}")
+                labels = format_labels(label_key)
+                lines.append(
+                    f"{name}_sum{labels} {_format_number(histogram['sum'])}"
+                )
+                lines.append(f"{name}_count{labels} {histogram['count']}")
+        _add_gauges(samples, gauges)
+        return _render_samples(samples)
+
+
+# Registro del proceso: cada worker de Odoo mantiene el suyo
+REGISTRY = MetricsRegistry()
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+import re
+
+# Prefijo internacional por defecto de los números nacionales
+DEFAULT_COUNTRY_CODE = "34"
+
+# Caracteres de formato que se eliminan antes de validar
+_FORMAT_CHARS_RE = re.compile(r"[\s\-./()]")
+# Número español: 9 dígitos que empiezan por 6, 7, 8 o 9
+_SPANISH_NATIONAL_RE = re.compile(r"^[6789]\d{8}$")
+# E.164: de 8 a 15 dígitos sin cero inicial
+_INTERNATIONAL_RE = re.compile(r"^[1-9]\d{7,14}$")
+
+
+def normalize_phone(number, country_code=DEFAULT_COUNTRY_CODE):
+    """
+    Normaliza un número de teléfono al formato E.164 sin el '+'
+    (p. ej. '612 345 678' -> '34612345678').
+    :param number: Número tal y como se ha introducido.
+    :param country_code: Prefijo de los números nacionales.
+    :return: Número normalizado, o None si no es válido.
+    """
+    if not number:
+        return None
+    digits = _FORMAT_CHARS_RE.sub("", str(number))
+
+    international = False
+    if digits.startswith("+"):
+        digits = digits[1:]
+        international = True
+    elif digits.startswith("00"):
+        digits = digits[2:]
+        international = True
+
+    if not digits.isdigit():
+        return None
+
+    if not international and _SPANISH_NATIONAL_RE.match(digits):
+        return country_code + digits
+
+    if digits.startswith(country_code):
+        # Un número con prefijo español debe ser un número español válido
+        national = digits[len(country_code):]
+        if _SPANISH_NATIONAL_RE.match(national):
+            return digits
+        return None
+
+    # Otros países: solo con '+' o '00'. Un número largo sin prefijo
+    # explícito puede ser un nacional mal escrito y no se adivina su país
+    if international and _INTERNATIONAL_RE.match(digits):
+        return digits
+    return None
+
+
+def normalize_phones(numbers, country_code=DEFAULT_COUNTRY_CODE):
+    """
+    Normaliza una lista de números de una sola pasada. Los números
+    repetidos (habituales en campañas) se procesan una única vez.
+    :param numbers: Iterable de números tal y como se han introducido.
+    :return: Diccionario {número original: normalizado o None}.
+    """
+    normalized = {}
+    for number in numbers:
+        if number not in normalized:
+            normalized[number] = normalize_phone(number, country_code)
+    return normalized
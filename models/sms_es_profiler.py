@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+import base64
+import cProfile
+import io
+import itertools
+import logging
+import marshal
+import os
+import pstats
+import tempfile
+import threading
+from contextlib import contextmanager
+
+_logger = logging.getLogger(__name__)
+
+# 1 de cada N ejecuciones se perfila; 0 desactiva el perfilado
+PARAM_PROFILE_SAMPLE_RATE = "sms_es_connector.profile_sample_rate"
+
+# Caminos críticos que pueden perfilarse y su descripción
+PROFILE_TARGETS = {
+    "queue_worker": "Worker de la cola (_process_sms_queue)",
+    "dlr_webhook": "Webhook DLR (handle_dlr_webhook)",
+}
+
+# Los perfiles se guardan como adjuntos de este modelo, uno por camino,
+# proceso e hilo: cada adjunto solo lo escribe un hilo, así que dos
+# ejecuciones perfiladas a la vez nunca compiten por la misma fila. El
+# cron de retención los funde en un único adjunto por camino
+PROFILE_RES_MODEL = "sms_es.queue_job"
+PROFILE_ATTACHMENT_PREFIX = "sms_es_profile_"
+
+# Contador de ejecuciones por camino en este proceso
+_invocations = {target: itertools.count(1) for target in PROFILE_TARGETS}
+
+
+def get_sample_rate(env):
+    """Valor de N del muestreo 1 de cada N (0 si está desactivado)."""
+    value = env["ir.config_parameter"].sudo().get_param(
+        PARAM_PROFILE_SAMPLE_RATE
+    )
+    try:
+        return max(int(value or 0), 0)
+    except ValueError:
+        return 0
+
+
+@contextmanager
+def profile_sample(env, target):
+    """
+    Perfila con cProfile 1 de cada N ejecuciones del bloque y acumula el
+    resultado en el adjunto del camino. Con el perfilado desactivado solo
+    cuesta leer un parámetro de configuración (en caché).
+    :param target: Clave de PROFILE_TARGETS.
+    """
+    rate = get_sample_rate(env)
+    if not rate or next(_invocations[target]) % rate:
+        yield
+        return
+
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Ya hay otro perfilador activo en este hilo
+        yield
+        return
+    try:
+        yield
+    finally:
+        profiler.disable()
+        try:
+            # El punto de guardado deja la transacción usable si falla
+            with env.cr.savepoint():
+                save_profile(env, target, profiler)
+        except Exception as e:
+            _logger.warning(
+                "No se pudo guardar el perfil de '%s': %s", target, e
+            )
+
+
+def _attachment_name(target):
+    """Nombre del adjunto del camino para el proceso e hilo actuales."""
+    return (
+        f"{PROFILE_ATTACHMENT_PREFIX}{target}_"
+        f"{os.getpid()}_{threading.get_ident()}.prof"
+    )
+
+
+def _merged_attachment_name(target):
+    """Nombre del adjunto en el que se funden los perfiles de un camino."""
+    return f"{PROFILE_ATTACHMENT_PREFIX}{target}_merged.prof"
+
+
+def _get_attachments(env, target, own=False):
+    """
+    Adjuntos con los perfiles de un camino.
+    :param own: Solo el del proceso e hilo actuales.
+    """
+    if own:
+        name_domain = [("name", "=", _attachment_name(target))]
+    else:
+        name_domain = [
+            ("name", "=like", f"{PROFILE_ATTACHMENT_PREFIX}{target}_%")
+        ]
+    return (
+        env["ir.attachment"]
+        .sudo()
+        .search([("res_model", "=", PROFILE_RES_MODEL)] + name_domain)
+    )
+
+
+def _load_stats(attachment):
+    """Carga las estadísticas guardadas en un adjunto."""
+    with tempfile.NamedTemporaryFile(suffix=".prof", delete=False) as f:
+        f.write(base64.b64decode(attachment.datas))
+    try:
+        return pstats.Stats(f.name)
+    finally:
+        os.unlink(f.name)
+
+
+def save_profile(env, target, profiler):
+    """
+    Suma el perfil de una ejecución a las estadísticas acumuladas del
+    camino, guardadas en un adjunto en formato pstats.
+    """
+    stats = pstats.Stats(profiler)
+    attachment = _get_attachments(env, target, own=True)
+    if attachment:
+        stats.add(_load_stats(attachment))
+    data = base64.b64encode(marshal.dumps(stats.stats))
+    if attachment:
+        attachment.write({"datas": data})
+    else:
+        env["ir.attachment"].sudo().create(
+            {
+                "name": _attachment_name(target),
+                "res_model": PROFILE_RES_MODEL,
+                "type": "binary",
+                "mimetype": "application/octet-stream",
+                "datas": data,
+            }
+        )
+
+
+def get_profile_report(env, limit=15):
+    """
+    Resumen legible de los perfiles acumulados: las funciones con más
+    tiempo acumulado de cada camino, sumando los de todos los procesos.
+    :param limit: Número de funciones por camino.
+    :return: Texto del informe.
+    """
+    sections = []
+    for target, label in PROFILE_TARGETS.items():
+        attachments = _get_attachments(env, target)
+        if not attachments:
+            continue
+        output = io.StringIO()
+        stats = _load_stats(attachments[0])
+        for attachment in attachments[1:]:
+            stats.add(_load_stats(attachment))
+        stats.stream = output
+        stats.strip_dirs().sort_stats("cumulative").print_stats(limit)
+        sections.append(f"== {label} ==\n{output.getvalue().strip()}")
+    return "\n\n".join(sections)
+
+
+def compact_profiles(env):
+    """
+    Funde los adjuntos de cada camino en uno solo, para que los de
+    procesos e hilos que ya no existen no se acumulen. Los adjuntos que
+    otro hilo está escribiendo se dejan para la siguiente ejecución.
+    """
+    for target in PROFILE_TARGETS:
+        attachments = _get_attachments(env, target)
+        if len(attachments) < 2:
+            continue
+        env.cr.execute(
+            """
+            SELECT id FROM ir_attachment
+             WHERE id IN %s
+               FOR UPDATE SKIP LOCKED
+            """,
+            [tuple(attachments.ids)],
+        )
+        locked = attachments.browse([row[0] for row in env.cr.fetchall()])
+        merged_name = _merged_attachment_name(target)
+        merged = locked.filtered(lambda a: a.name == merged_name)[:1]
+        others = locked - merged
+        if not others:
+            continue
+
+        stats = _load_stats(others[0])
+        for attachment in others[1:] | merged:
+            stats.add(_load_stats(attachment))
+        data = base64.b64encode(marshal.dumps(stats.stats))
+        if merged:
+            merged.write({"datas": data})
+        else:
+            env["ir.attachment"].sudo().create(
+                {
+                    "name": merged_name,
+                    "res_model": PROFILE_RES_MODEL,
+                    "type": "binary",
+                    "mimetype": "application/octet-stream",
+                    "datas": data,
+                }
+            )
+        others.unlink()
+        _logger.info(
+            "Perfiles de '%s': %d adjuntos fundidos.", target, len(others)
+        )
+
+
+def reset_profiles(env):
+    """Borra los perfiles acumulados de todos los caminos."""
+    env["ir.attachment"].sudo().search(
+        [
+            ("res_model", "=", PROFILE_RES_MODEL),
+            ("name", "=like", f"{PROFILE_ATTACHMENT_PREFIX}%"),
+        ]
+    ).unlink()
@@ -1,12 +1,84 @@
 # -*- coding: utf-8 -*-
+import json
 import logging
+import time
+from collections import defaultdict
 from datetime import datetime, timedelta
 
 from odoo import models, fields, api
-from .sms_es_client import SmsEsClient
+from .sms_es_account import SmsEsAccountPool
+from .sms_es_metrics import REGISTRY
+from .sms_es_profiler import profile_sample
 
 _logger = logging.getLogger(__name__)
 
+# Carriles de la cola, en el orden en que se procesan en cada ciclo
+QUEUE_LANES = [
+    ("transactional", "Transaccional"),
+    ("bulk", "Masivo"),
+]
+
+# Parámetros de planificación por carril y sus valores por defecto
+PARAM_LANE_TRANSACTIONAL_SHARE = "sms_es_connector.lane_transactional_share"
+DEFAULT_LANE_TRANSACTIONAL_SHARE = 50
+LANE_TARGET_PARAMS = {
+    "transactional": ("sms_es_connector.lane_transactional_target", 60),
+    "bulk": ("sms_es_connector.lane_bulk_target", 3600),
+}
+PARAM_SOURCE_WEIGHTS = "sms_es_connector.source_weights"
+# Trabajos listos que se cuentan como mucho por origen al reclamar, en
+# lotes del ciclo: basta para el reparto y acota el coste de la consulta
+BACKLOG_WINDOW_BATCHES = 10
+
+
+def fair_share(capacity, demands, weights=None):
+    """
+    Reparte una capacidad entre varias demandas de forma justa ponderada
+    (max-min fairness): cada clave recibe una parte proporcional a su peso
+    y la capacidad que no usa se reparte entre las demás.
+    :param capacity: Número de unidades a repartir.
+    :param demands: Diccionario {clave: unidades solicitadas}.
+    :param weights: Diccionario {clave: peso}; por defecto 1.
+    :return: Diccionario {clave: unidades asignadas}.
+    """
+    weights = weights or {}
+
+    def weight(key):
+        return max(float(weights.get(key, 1)), 0.01)
+
+    allocation = {key: 0 for key in demands}
+    active = [key for key, demand in demands.items() if demand > 0]
+    while capacity > 0 and active:
+        total_weight = sum(weight(key) for key in active)
+        distributed = 0
+        for key in sorted(active, key=weight, reverse=True):
+            share = max(1, int(capacity * weight(key) / total_weight))
+            given = min(
+                share,
+                demands[key] - allocation[key],
+                capacity - distributed,
+            )
+            allocation[key] += given
+            distributed += given
+            if distributed >= capacity:
+                break
+        capacity -= distributed
+        active = [key for key in active if allocation[key] < demands[key]]
+    return allocation
+
+
+def invalidate_model_cache(model, fnames=None):
+    """
+    Descarta de la caché los valores de un modelo actualizados por SQL.
+    :param model: Modelo (recordset vacío o no) a invalidar.
+    :param fnames: Lista de campos; por defecto, todos.
+    """
+    if hasattr(model, "invalidate_model"):
+        # Odoo 16+
+        model.invalidate_model(fnames)
+    else:
+        model.invalidate_cache(fnames)
+
 
 class SmsEsQueueJob(models.Model):
     _name = "sms_es.queue_job"
@@ -25,6 +97,7 @@ class SmsEsQueueJob(models.Model):
     state = fields.Selection(
         [
             ("pending", "Pendiente"),
+            ("paused", "Pausado"),
             ("in_progress", "En Progreso"),
             ("success", "Éxito"),
             ("failed", "Fallido"),
@@ -45,21 +118,80 @@ class SmsEsQueueJob(models.Model):
     delay_seconds = fields.Integer(string="Retardo (segundos)", default=60)
     error_message = fields.Text(string="Mensaje de Error", readonly=True)
     priority = fields.Integer(string="Prioridad", default=10)
+    lane = fields.Selection(
+        QUEUE_LANES,
+        string="Carril",
+        default="transactional",
+        required=True,
+        index=True,
+    )
+    campaign_id = fields.Many2one(
+        "sms_es.campaign",
+        string="Campaña",
+        ondelete="set null",
+        index=True,
+        readonly=True,
+    )
+    res_model = fields.Char(
+        related="message_id.res_model",
+        string="Modelo de Origen",
+        store=True,
+        readonly=True,
+    )
+
+    def init(self):
+        # Índice parcial que cubre solo los trabajos pendientes y sigue el
+        # ORDER BY de la consulta de reclamación del worker (por carril y
+        # origen), de modo que su coste no depende del volumen de trabajos
+        # terminados
+        self.env.cr.execute(
+            "DROP INDEX IF EXISTS sms_es_queue_job_pending_claim_idx"
+        )
+        self.env.cr.execute(
+            """
+            CREATE INDEX IF NOT EXISTS sms_es_queue_job_pending_lane_idx
+                ON sms_es_queue_job
+                   (lane, res_model, priority DESC, create_date ASC,
+                    next_try_datetime)
+             WHERE state = 'pending'
+            """
+        )
+        # Índice parcial para localizar por lotes los trabajos terminados
+        self.env.cr.execute(
+            """
+            CREATE INDEX IF NOT EXISTS sms_es_queue_job_finished_idx
+                ON sms_es_queue_job (state, write_date)
+             WHERE state IN ('success', 'failed', 'cancelled')
+            """
+        )
 
     @api.model
     def _process_sms_queue(self, limit=100):
         """
         Método principal del cron worker.
         Procesa trabajos pendientes cuyo momento de reintento ha llegado.
+        Si el perfilado está activado, se perfila 1 de cada N ejecuciones.
         """
-        # Dominio para buscar trabajos listos para ser procesados
-        domain = [
-            ("state", "=", "pending"),
-            ("next_try_datetime", "<=", fields.Datetime.now()),
-        ]
-        jobs_to_process = self.search(
-            domain, order="priority desc, create_date asc", limit=limit
-        )
+        with profile_sample(self.env, "queue_worker"):
+            self._run_sms_queue(limit)
+
+    @api.model
+    def _run_sms_queue(self, limit):
+        """
+        Envía los trabajos seleccionados para este ciclo. Cada ejecución
+        queda registrada en sms_es.worker_run.
+        """
+        run_stats = {
+            "started_at": fields.Datetime.now(),
+            "start": time.monotonic(),
+            "jobs_claimed": 0,
+            "sent_count": 0,
+            "retried_count": 0,
+            "failed_count": 0,
+        }
+        with REGISTRY.timer("sms_es_queue_claim_seconds"):
+            jobs_to_process = self._claim_jobs(limit, stats=run_stats)
+        run_stats["jobs_claimed"] = len(jobs_to_process)
 
         _logger.info(
             "Worker de la cola de SMS iniciado. %d trabajos para procesar.",
@@ -67,35 +199,47 @@ class SmsEsQueueJob(models.Model):
         )
 
         if not jobs_to_process:
+            self._record_worker_run(run_stats)
+            self.env["sms_es.metric"]._flush_metrics()
             return
 
-        # Instanciar el cliente una sola vez para mejorar el rendimiento
+        # Instanciar los clientes una sola vez para mejorar el rendimiento
         try:
-            api_client = SmsEsClient(self.env)
+            pool = SmsEsAccountPool(self.env)
         except Exception as e:
             _logger.error(
                 "No se pudo inicializar el cliente de la API de \
                     SMS.es: %s. Abortando el worker.",
                 e,
             )
+            self._record_worker_run(run_stats, error=str(e))
             return
 
         for job in jobs_to_process:
+            if not pool.available:
+                # Todas las cuentas en pausa: los trabajos restantes siguen
+                # pendientes para el siguiente ciclo
+                _logger.warning(
+                    "Todas las cuentas de SMS están en pausa. Se detiene \
+                        el worker."
+                )
+                break
+            # Una pausa o cancelación durante el ciclo retira el trabajo
+            # del lote: solo se envía si sigue pendiente al reclamarlo
+            if not job._claim_for_sending():
+                _logger.info(
+                    "El trabajo de SMS %d ya no está pendiente. Se omite.",
+                    job.id,
+                )
+                continue
             try:
-                job.write({"state": "in_progress"})
                 # Confirmar el cambio de estado para 
                 # evitar que otro worker lo tome
-                self.env.cr.commit()  
+                with REGISTRY.timer("sms_es_queue_commit_seconds"):
+                    self.env.cr.commit()
 
                 message = job.message_id
-                message_data = {
-                    "receiver": message.receiver,
-                    "sender": message.sender,
-                    "text": message.text,
-                    "odoo_message_id": message.id,
-                }
-
-                result = api_client.send_sms(message_data)
+                result, account_id = pool.send(message._get_send_data())
 
                 if result.get("status") == "success":
                     # --- Manejo de éxito ---
@@ -104,12 +248,17 @@ class SmsEsQueueJob(models.Model):
                             "state": "api_sent",
                             "msg_id": result["data"].get("msgId"),
                             "num_parts": result["data"].get("numParts"),
+                            "account_id": account_id,
                         }
                     )
                     job.write({"state": "success", "error_message": False})
+                    outcome = "success"
                 else:
                     # --- Manejo de fallo ---
-                    self._handle_send_failure(job, result.get("error", {}))
+                    retried = self._handle_send_failure(
+                        job, result.get("error", {})
+                    )
+                    outcome = "failure"
 
             except Exception as e:
                 _logger.error(
@@ -117,13 +266,407 @@ class SmsEsQueueJob(models.Model):
                     job.id, e
                 )
                 self.env.cr.rollback()
-                self._handle_send_failure(job, {"code": -1, "message": str(e)})
+                retried = self._handle_send_failure(
+                    job, {"code": -1, "message": str(e)}
+                )
+                outcome = "error"
+
+            with REGISTRY.timer("sms_es_queue_commit_seconds"):
+                self.env.cr.commit()
+            REGISTRY.inc(
+                "sms_es_queue_jobs_processed_total", {"outcome": outcome}
+            )
+            if outcome == "success":
+                run_stats["sent_count"] += 1
+            elif retried:
+                run_stats["retried_count"] += 1
+            else:
+                run_stats["failed_count"] += 1
+
+        run_stats.update(pool.stats)
+        self._record_worker_run(run_stats)
+        self.env["sms_es.metric"]._flush_metrics()
+        self.env.cr.commit()
+
+    def _claim_for_sending(self):
+        """
+        Pasa el trabajo a 'in_progress' solo si sigue pendiente, con un
+        único UPDATE. Un trabajo bloqueado por otra transacción (una
+        pausa o cancelación en curso) no se reclama.
+        :return: True si el trabajo se ha reclamado.
+        """
+        self.ensure_one()
+        try:
+            with self.env.cr.savepoint():
+                self.env.cr.execute(
+                    """
+                    UPDATE sms_es_queue_job
+                       SET state = 'in_progress',
+                           write_date = now() at time zone 'UTC',
+                           write_uid = %s
+                     WHERE id = (
+                        SELECT id
+                          FROM sms_es_queue_job
+                         WHERE id = %s
+                           AND state = 'pending'
+                           FOR UPDATE SKIP LOCKED
+                     )
+                 RETURNING id
+                    """,
+                    (self.env.uid, self.id),
+                )
+                claimed = bool(self.env.cr.fetchone())
+        except Exception as e:
+            # Modificado por otra transacción desde el inicio del ciclo
+            _logger.info(
+                "No se pudo reclamar el trabajo de SMS %d: %s", self.id, e
+            )
+            claimed = False
+        invalidate_model_cache(self, ["state", "write_date", "write_uid"])
+        return claimed
+
+    @api.model
+    def _record_worker_run(self, run_stats, error=False):
+        """
+        Guarda las estadísticas de una ejecución del worker, junto con
+        los trabajos que siguen pendientes al terminar, a partir de los
+        contados al reclamar, sin volver a recorrer la cola.
+        :param run_stats: Contadores y tiempos acumulados en la ejecución.
+        :param error: Error que ha abortado la ejecución, si lo hay.
+        """
+        wall_time = time.monotonic() - run_stats["start"]
+        http_time = run_stats.get("http_time", 0.0)
+        processed = (
+            run_stats["sent_count"]
+            + run_stats["retried_count"]
+            + run_stats["failed_count"]
+        )
+        backlog = max(run_stats.get("backlog", 0) - processed, 0)
+        self.env["sms_es.worker_run"].sudo().create(
+            {
+                "started_at": run_stats["started_at"],
+                "jobs_claimed": run_stats["jobs_claimed"],
+                "sent_count": run_stats["sent_count"],
+                "retried_count": run_stats["retried_count"],
+                "failed_count": run_stats["failed_count"],
+                "request_count": run_stats.get("requests", 0),
+                "throttled_count": run_stats.get("throttled", 0),
+                "wall_time": wall_time,
+                "http_time": http_time,
+                "db_time": max(wall_time - http_time, 0.0),
+                "backlog_remaining": backlog,
+                "error_message": error,
+            }
+        )
+
+    @api.model
+    def _get_source_weights(self):
+        """Pesos por modelo de origen configurados en JSON."""
+        config = self.env["ir.config_parameter"].sudo()
+        raw_weights = config.get_param(PARAM_SOURCE_WEIGHTS) or "{}"
+        try:
+            weights = json.loads(raw_weights)
+        except ValueError:
+            _logger.warning(
+                "El parámetro '%s' no es un JSON válido. Se ignora.",
+                PARAM_SOURCE_WEIGHTS,
+            )
+            return {}
+        return weights if isinstance(weights, dict) else {}
+
+    @api.model
+    def _claim_jobs(self, limit, stats=None):
+        """
+        Selecciona los trabajos a procesar en este ciclo.
+        Cada carril tiene una parte reservada de la capacidad del ciclo y
+        la que no usa pasa al otro; dentro de cada carril la capacidad se
+        reparte de forma justa ponderada entre los modelos de origen, para
+        que una campaña masiva no retrase a los SMS transaccionales.
+        :param limit: Número máximo de trabajos del ciclo.
+        :param stats: Diccionario en el que guardar, en 'backlog', los
+            trabajos listos contados (hasta BACKLOG_WINDOW_BATCHES lotes
+            por origen).
+        :return: Recordset de trabajos, carril transaccional primero.
+        """
+        now = fields.Datetime.now()
+        domain = [
+            ("state", "=", "pending"),
+            ("next_try_datetime", "<=", now),
+        ]
+        backlog = {}
+        for lane, _label in QUEUE_LANES:
+            lane_backlog = self._get_lane_backlog(
+                lane, now, limit * BACKLOG_WINDOW_BATCHES
+            )
+            if lane_backlog:
+                backlog[lane] = lane_backlog
+        if stats is not None:
+            stats["backlog"] = sum(
+                sum(sources.values()) for sources in backlog.values()
+            )
+        if not backlog:
+            return self.browse()
 
-            self.env.cr.commit()
+        config = self.env["ir.config_parameter"].sudo()
+        share = int(
+            config.get_param(
+                PARAM_LANE_TRANSACTIONAL_SHARE,
+                DEFAULT_LANE_TRANSACTIONAL_SHARE,
+            )
+        )
+        share = min(max(share, 0), 100)
+        lane_capacity = fair_share(
+            limit,
+            {lane: sum(sources.values()) for lane, sources in backlog.items()},
+            {"transactional": share, "bulk": 100 - share},
+        )
+
+        source_weights = self._get_source_weights()
+        jobs = self.browse()
+        for lane, _label in QUEUE_LANES:
+            if not lane_capacity.get(lane):
+                continue
+            source_capacity = fair_share(
+                lane_capacity[lane], backlog[lane], source_weights
+            )
+            for res_model, quota in source_capacity.items():
+                if not quota:
+                    continue
+                jobs |= self.search(
+                    domain
+                    + [("lane", "=", lane), ("res_model", "=", res_model)],
+                    order="priority desc, create_date asc",
+                    limit=quota,
+                )
+        return jobs
+
+    @api.model
+    def _get_lane_backlog(self, lane, now, cap):
+        """
+        Trabajos listos de un carril por modelo de origen, contando como
+        mucho 'cap' en cada uno. Solo recorre el índice parcial de
+        pendientes: salta de un origen al siguiente sin leer sus trabajos,
+        de modo que el coste no crece con la cola.
+        :param now: Fecha de referencia de los trabajos listos.
+        :param cap: Máximo de trabajos contados por origen.
+        :return: Diccionario {res_model o False: trabajos listos}.
+        """
+        self.env.cr.execute(
+            """
+            WITH RECURSIVE sources(res_model) AS (
+                (SELECT res_model
+                   FROM sms_es_queue_job
+                  WHERE state = 'pending'
+                    AND lane = %(lane)s
+                    AND res_model IS NOT NULL
+                  ORDER BY res_model
+                  LIMIT 1)
+                UNION ALL
+                SELECT (SELECT job.res_model
+                          FROM sms_es_queue_job job
+                         WHERE job.state = 'pending'
+                           AND job.lane = %(lane)s
+                           AND job.res_model > sources.res_model
+                         ORDER BY job.res_model
+                         LIMIT 1)
+                  FROM sources
+                 WHERE sources.res_model IS NOT NULL
+            )
+            SELECT res_model FROM sources WHERE res_model IS NOT NULL
+            """,
+            {"lane": lane},
+        )
+        res_models = [row[0] for row in self.env.cr.fetchall()] + [False]
+
+        backlog = {}
+        for res_model in res_models:
+            if res_model is False:
+                source_clause, params = "res_model IS NULL", [lane, now]
+            else:
+                source_clause = "res_model = %s"
+                params = [lane, now, res_model]
+            # La cláusula del origen es una de las dos constantes anteriores
+            self.env.cr.execute(
+                f"""
+                SELECT count(*)
+                  FROM (SELECT 1
+                          FROM sms_es_queue_job
+                         WHERE state = 'pending'
+                           AND lane = %s
+                           AND next_try_datetime <= %s
+                           AND {source_clause}
+                         LIMIT %s) AS due
+                """,
+                params + [cap],
+            )
+            count = self.env.cr.fetchone()[0]
+            if count:
+                backlog[res_model] = count
+        return backlog
+
+    @api.model
+    def _get_lane_status(self):
+        """
+        Estado de cada carril: profundidad de la cola, antigüedad del
+        trabajo listo más antiguo y objetivo de latencia.
+        :return: Diccionario {carril: {...}}.
+        """
+        now = fields.Datetime.now()
+        config = self.env["ir.config_parameter"].sudo()
+        depth = {
+            group["lane"]: group["lane_count"]
+            for group in self.read_group(
+                [("state", "=", "pending")], ["lane"], ["lane"]
+            )
+        }
+        oldest = {
+            group["lane"]: group["next_try_datetime"]
+            for group in self.read_group(
+                [
+                    ("state", "=", "pending"),
+                    ("next_try_datetime", "<=", now),
+                ],
+                ["lane", "next_try_datetime:min"],
+                ["lane"],
+            )
+        }
+
+        status = {}
+        for lane, _label in QUEUE_LANES:
+            param, default = LANE_TARGET_PARAMS[lane]
+            target = int(config.get_param(param, default))
+            oldest_age = (
+                (now - oldest[lane]).total_seconds()
+                if oldest.get(lane)
+                else 0.0
+            )
+            status[lane] = {
+                "depth": depth.get(lane, 0),
+                "oldest_age": oldest_age,
+                "target": target,
+                "over_target": bool(target) and oldest_age > target,
+            }
+        return status
+
+    @api.model
+    def _check_lane_latency_targets(self):
+        """
+        Avisa en el log de los carriles que superan su objetivo. Recorre
+        todos los pendientes, así que lo llama el cron de métricas y no
+        cada ciclo del worker.
+        """
+        for lane, status in self._get_lane_status().items():
+            if status["over_target"]:
+                _logger.warning(
+                    "El carril '%s' supera su objetivo de latencia: \
+                        %d trabajos pendientes, el más antiguo espera \
+                        %d s (objetivo %d s).",
+                    lane,
+                    status["depth"],
+                    status["oldest_age"],
+                    status["target"],
+                )
+
+    # ====================================================== #
+    # OPERACIONES EN BLOQUE SOBRE LA COLA                      #
+    # ====================================================== #
+    @api.model
+    def _bulk_set_state(self, domain, from_states, to_state):
+        """
+        Cambia el estado de todos los trabajos que cumplen el dominio con
+        un único UPDATE, sin cargar los registros en el ORM.
+        :param domain: Dominio de búsqueda (campaña, remitente, origen...).
+        :param from_states: Estados de los trabajos a modificar.
+        :param to_state: Nuevo estado.
+        :return: Lista de (id, message_id) de los trabajos modificados.
+        """
+        self.check_access_rights("write")
+        job_ids = self.search(
+            list(domain) + [("state", "in", list(from_states))]
+        ).ids
+        if not job_ids:
+            return []
+        self.env.cr.execute(
+            """
+            UPDATE sms_es_queue_job
+               SET state = %s, write_date = now() at time zone 'UTC',
+                   write_uid = %s
+             WHERE id = ANY(%s)
+               AND state IN %s
+         RETURNING id, message_id
+            """,
+            (to_state, self.env.uid, job_ids, tuple(from_states)),
+        )
+        rows = self.env.cr.fetchall()
+        invalidate_model_cache(self)
+        return rows
+
+    @api.model
+    def pause_jobs(self, domain):
+        """
+        Pausa los trabajos pendientes que cumplen el dominio. El worker
+        solo reclama trabajos pendientes, así que no se envían hasta que
+        se reanuden.
+        :return: Número de trabajos pausados.
+        """
+        rows = self._bulk_set_state(domain, ["pending"], "paused")
+        _logger.info("%d trabajos de SMS pausados.", len(rows))
+        return len(rows)
+
+    @api.model
+    def resume_jobs(self, domain):
+        """
+        Reanuda los trabajos pausados que cumplen el dominio.
+        :return: Número de trabajos reanudados.
+        """
+        rows = self._bulk_set_state(domain, ["paused"], "pending")
+        _logger.info("%d trabajos de SMS reanudados.", len(rows))
+        return len(rows)
+
+    @api.model
+    def cancel_jobs(self, domain):
+        """
+        Cancela los trabajos pendientes o pausados que cumplen el dominio
+        y sus mensajes aún no enviados, actualizando los contadores de
+        las campañas afectadas.
+        :return: Número de trabajos cancelados.
+        """
+        rows = self._bulk_set_state(
+            domain, ["pending", "paused"], "cancelled"
+        )
+        if not rows:
+            return 0
+
+        # Los mensajes en envío ('sending') los termina el worker
+        self.env.cr.execute(
+            """
+            UPDATE sms_es_message
+               SET state = 'cancelled', write_date = now() at time zone 'UTC',
+                   write_uid = %s
+             WHERE id = ANY(%s)
+               AND state IN ('draft', 'queued')
+         RETURNING campaign_id
+            """,
+            (self.env.uid, [message_id for _job_id, message_id in rows]),
+        )
+        cancelled = defaultdict(int)
+        for (campaign_id,) in self.env.cr.fetchall():
+            if campaign_id:
+                cancelled[campaign_id] += 1
+        invalidate_model_cache(self.env["sms_es.message"])
+        self.env["sms_es.campaign"]._apply_counter_deltas(
+            {
+                campaign_id: {"queued_count": -count, "cancelled_count": count}
+                for campaign_id, count in cancelled.items()
+            }
+        )
+        _logger.info("%d trabajos de SMS cancelados.", len(rows))
+        return len(rows)
 
     def _handle_send_failure(self, job, error_info):
         """
         Gestiona un fallo de envío, decide si reintentar o marcar como fallido.
+        :return: True si se ha programado un reintento.
         """
         error_message = (
             f"Code: {error_info.get('code')} \
@@ -135,6 +678,10 @@ class SmsEsQueueJob(models.Model):
             new_retry_count = job.retry_count + 1
             delay = job.delay_seconds * new_retry_count  # Backoff lineal 
             next_try = datetime.now() + timedelta(seconds=delay)
+            REGISTRY.inc(
+                "sms_es_queue_retries_total",
+                {"code": str(error_info.get("code"))},
+            )
 
             job.write(
                 {
@@ -152,6 +699,7 @@ class SmsEsQueueJob(models.Model):
                 job.max_retries,
                 next_try,
             )
+            return True
         else:
             # --- Marcar como fallido permanentemente ---
             job.message_id.write({"state": "api_failed"})
@@ -165,3 +713,4 @@ class SmsEsQueueJob(models.Model):
             )
             _logger.error("El trabajo de SMS %d ha fallado permanentemente.", 
                           job.id)
+            return False
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+from datetime import datetime, time, timedelta
+
+import pytz
+
+
+def _float_to_time(value):
+    """Convierte una hora en formato float (p. ej. 21.5) en `time`."""
+    value = min(max(value or 0.0, 0.0), 24.0)
+    hours = int(value)
+    minutes = int(round((value - hours) * 60))
+    if hours == 24 or minutes == 60:
+        return time(23, 59, 59)
+    return time(hours, minutes)
+
+
+class SendWindow:
+    """
+    Ventana de envío para repartir una campaña en el tiempo.
+    Esta clase no es un modelo de Odoo, sino una clase de utilidad.
+
+    La ventana se define en UTC (como los campos Datetime de Odoo) y puede
+    excluir cada día un horario de silencio expresado en hora local.
+    """
+
+    def __init__(
+        self, start, end, tz_name="UTC", quiet_start=None, quiet_end=None
+    ):
+        """
+        :param start: Inicio de la ventana (datetime UTC sin zona).
+        :param end: Fin de la ventana (datetime UTC sin zona).
+        :param tz_name: Zona horaria del horario de silencio.
+        :param quiet_start: Hora local de inicio del silencio (float).
+        :param quiet_end: Hora local de fin del silencio (float).
+        """
+        self.start = start
+        self.end = end
+        self.tz = pytz.timezone(tz_name or "UTC")
+        self.intervals = self._compute_intervals(quiet_start, quiet_end)
+        self.total_seconds = sum(
+            (stop - begin).total_seconds() for begin, stop in self.intervals
+        )
+
+    def _quiet_periods(self, quiet_start, quiet_end):
+        """Periodos de silencio (UTC) que pueden solapar la ventana."""
+        if quiet_start is None or quiet_end is None:
+            return []
+        if quiet_start == quiet_end:
+            return []
+        begin_time = _float_to_time(quiet_start)
+        end_time = _float_to_time(quiet_end)
+
+        first_day = pytz.utc.localize(self.start).astimezone(self.tz).date()
+        last_day = pytz.utc.localize(self.end).astimezone(self.tz).date()
+        periods = []
+        day = first_day - timedelta(days=1)
+        while day <= last_day:
+            begin = datetime.combine(day, begin_time)
+            end = datetime.combine(day, end_time)
+            if end <= begin:
+                # El silencio cruza la medianoche
+                end += timedelta(days=1)
+            periods.append(
+                (
+                    self.tz.localize(begin)
+                    .astimezone(pytz.utc)
+                    .replace(tzinfo=None),
+                    self.tz.localize(end)
+                    .astimezone(pytz.utc)
+                    .replace(tzinfo=None),
+                )
+            )
+            day += timedelta(days=1)
+        return periods
+
+    def _compute_intervals(self, quiet_start, quiet_end):
+        """Intervalos (UTC) de la ventana en los que se permite enviar."""
+        if not self.start or not self.end or self.end <= self.start:
+            return []
+        intervals = [(self.start, self.end)]
+        for quiet_begin, quiet_stop in self._quiet_periods(
+            quiet_start, quiet_end
+        ):
+            remaining = []
+            for begin, stop in intervals:
+                if quiet_stop <= begin or quiet_begin >= stop:
+                    remaining.append((begin, stop))
+                    continue
+                if begin < quiet_begin:
+                    remaining.append((begin, quiet_begin))
+                if quiet_stop < stop:
+                    remaining.append((quiet_stop, stop))
+            intervals = remaining
+        return intervals
+
+    def slot(self, index, count):
+        """
+        Momento de envío del elemento `index` de `count`, repartidos de
+        forma uniforme sobre el tiempo permitido de la ventana.
+        :return: datetime UTC sin zona.
+        """
+        if not self.intervals:
+            raise ValueError("La ventana de envío no tiene tiempo permitido.")
+        offset = self.total_seconds * index / max(count, 1)
+        for begin, stop in self.intervals:
+            length = (stop - begin).total_seconds()
+            if offset < length:
+                return begin + timedelta(seconds=offset)
+            offset -= length
+        return self.intervals[-1][1]
+
+    def slots(self, count, first=0, length=None):
+        """
+        Momentos de envío de los elementos [first, first + length) de un
+        total de `count`, para poder repartir una campaña por lotes.
+        :return: Lista de datetimes UTC sin zona.
+        """
+        if length is None:
+            length = count - first
+        return [
+            self.slot(index, count) for index in range(first, first + length)
+        ]
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+import re
+
+from odoo.exceptions import UserError
+
+# Marcadores del tipo {{ partner_id.name }} o {{ partner_id.name | cliente }}
+PLACEHOLDER_RE = re.compile(r"{{\s*([\w.]+)\s*(?:\|\s*(.*?)\s*)?}}")
+
+# Registros leídos por llamada a read() al obtener los valores
+TEMPLATE_READ_BATCH = 1000
+
+
+def format_value(value):
+    """Convierte el valor de un campo en el texto que se inserta."""
+    if value is False or value is None:
+        return ""
+    if isinstance(value, float):
+        return f"{value:.2f}"
+    return str(value)
+
+
+class SmsTemplate:
+    """
+    Plantilla de SMS compilada una sola vez por envío.
+    Esta clase no es un modelo de Odoo, sino una clase de utilidad.
+
+    El texto se divide en fragmentos literales y marcadores, de modo que
+    renderizar cada destinatario es solo unir cadenas.
+    """
+
+    def __init__(self, text):
+        """
+        :param text: Texto con marcadores {{ campo.subcampo | defecto }}.
+        """
+        self.text = text or ""
+        self.chunks = []
+        self.field_paths = []
+        position = 0
+        for match in PLACEHOLDER_RE.finditer(self.text):
+            if match.start() > position:
+                self.chunks.append(self.text[position:match.start()])
+            path, default = match.group(1), match.group(2) or ""
+            self.chunks.append((path, default))
+            if path not in self.field_paths:
+                self.field_paths.append(path)
+            position = match.end()
+        if position < len(self.text):
+            self.chunks.append(self.text[position:])
+
+    @property
+    def is_static(self):
+        """True si el texto no contiene marcadores."""
+        return not self.field_paths
+
+    def validate(self, model):
+        """
+        Comprueba que los marcadores son campos accesibles desde `model`.
+        Solo se admiten caminos a través de campos Many2one.
+        :raise UserError: Si algún marcador no es válido.
+        """
+        for path in self.field_paths:
+            current = model
+            names = path.split(".")
+            for index, name in enumerate(names):
+                field = current._fields.get(name)
+                if not field:
+                    raise UserError(
+                        f"El marcador '{{{{ {path} }}}}' no es válido: el \
+                            modelo '{current._name}' no tiene el campo \
+                            '{name}'."
+                    )
+                is_last = index == len(names) - 1
+                if field.type in ("one2many", "many2many") or (
+                    not is_last and field.type != "many2one"
+                ):
+                    raise UserError(
+                        f"El marcador '{{{{ {path} }}}}' no es válido: \
+                            solo se admiten campos simples y relaciones \
+                            Many2one."
+                    )
+                if field.type == "many2one":
+                    current = current.env[field.comodel_name]
+
+    def render(self, values):
+        """
+        Renderiza la plantilla para un destinatario.
+        :param values: Diccionario {marcador: texto}.
+        :return: Texto del mensaje.
+        """
+        if self.is_static:
+            return self.text
+        return "".join(
+            chunk
+            if isinstance(chunk, str)
+            else values.get(chunk[0]) or chunk[1]
+            for chunk in self.chunks
+        )
+
+    def render_records(self, records):
+        """
+        Renderiza la plantilla para todos los registros, leyendo los
+        valores de los marcadores en bloque.
+        :return: Diccionario {id del registro: texto}.
+        """
+        if self.is_static:
+            return {record_id: self.text for record_id in records.ids}
+        values = fetch_field_values(records, self.field_paths)
+        return {
+            record_id: self.render(values.get(record_id, {}))
+            for record_id in records.ids
+        }
+
+
+def fetch_field_values(records, paths):
+    """
+    Lee en bloque los valores de varios caminos de campos, agrupando los
+    registros relacionados para leer cada modelo con pocas llamadas.
+    :param records: Registros de origen.
+    :param paths: Lista de caminos ('name', 'partner_id.city'...).
+    :return: Diccionario {id: {camino: texto}}.
+    """
+    # Un Many2one sin subcampo se muestra con su nombre
+    paths_by_field = {}
+    for path in paths:
+        name, _dot, rest = path.partition(".")
+        field = records._fields[name]
+        if field.type == "many2one" and not rest:
+            rest = "display_name"
+        paths_by_field.setdefault(name, []).append((path, rest))
+
+    values = {record_id: {} for record_id in records.ids}
+    related_ids = {name: {} for name in paths_by_field}
+    ids = records.ids
+    for start in range(0, len(ids), TEMPLATE_READ_BATCH):
+        chunk = records.browse(ids[start:start + TEMPLATE_READ_BATCH])
+        # load=None devuelve los Many2one como ids, sin name_get
+        for row in chunk.read(list(paths_by_field), load=None):
+            for name, sub_paths in paths_by_field.items():
+                for path, rest in sub_paths:
+                    if rest:
+                        if row[name]:
+                            related_ids[name][row["id"]] = row[name]
+                    else:
+                        values[row["id"]][path] = format_value(row[name])
+
+    for name, sub_paths in paths_by_field.items():
+        links = related_ids[name]
+        if not links:
+            continue
+        related = records.env[records._fields[name].comodel_name].browse(
+            list(set(links.values()))
+        )
+        related_values = fetch_field_values(
+            related, list({rest for _path, rest in sub_paths if rest})
+        )
+        for record_id, related_id in links.items():
+            for path, rest in sub_paths:
+                values[record_id][path] = related_values[related_id].get(
+                    rest, ""
+                )
+    return values
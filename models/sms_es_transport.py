@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Conexiones HTTP reutilizables por proceso hacia la API
+POOL_CONNECTIONS = 4
+POOL_MAXSIZE = 16
+
+# Límite de envíos por segundo de cada proceso (0 = sin límite)
+PARAM_API_RATE_LIMIT = "sms_es_connector.api_rate_limit"
+
+_session = None
+_session_lock = threading.Lock()
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def get_session():
+    """
+    Sesión HTTP compartida por todos los envíos del proceso. Reutiliza
+    las conexiones TCP/TLS (keep-alive) en lugar de abrir una por SMS.
+    Los reintentos los gestiona el cliente, no el adaptador.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=POOL_CONNECTIONS,
+                pool_maxsize=POOL_MAXSIZE,
+                max_retries=0,
+            )
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+    return _session
+
+
+class RateLimiter:
+    """
+    Limitador de tipo token bucket, seguro entre hilos.
+    Esta clase no es un modelo de Odoo, sino una clase de utilidad.
+    """
+
+    def __init__(self, rate, burst=None):
+        """
+        :param rate: Envíos permitidos por segundo.
+        :param burst: Envíos que pueden hacerse de golpe; por defecto,
+            los de un segundo.
+        """
+        self.rate = float(rate)
+        self.capacity = float(burst or max(rate, 1))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout=None):
+        """
+        Espera a que haya un envío disponible y lo consume.
+        :param timeout: Segundos máximos de espera; None espera siempre.
+        :return: True si se ha obtenido, False si se agotó la espera.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity,
+                    self.tokens + (now - self.updated) * self.rate,
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.rate
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining < wait:
+                    return False
+            time.sleep(wait)
+
+
+def get_rate_limiter(rate, key=False):
+    """
+    Limitador compartido por el proceso para un límite dado, de modo que
+    el worker y los envíos inmediatos consumen del mismo cupo.
+    :param rate: Envíos por segundo; 0 o vacío desactiva el límite.
+    :param key: Identifica el cupo (p. ej. la cuenta del proveedor).
+    :return: RateLimiter o None.
+    """
+    if not rate:
+        return None
+    with _rate_limiters_lock:
+        limiter = _rate_limiters.get((key, rate))
+        if limiter is None:
+            limiter = _rate_limiters[(key, rate)] = RateLimiter(rate)
+    return limiter
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+import logging
+from datetime import timedelta
+
+from odoo import models, fields, api
+
+_logger = logging.getLogger(__name__)
+
+# Días que se conservan las ejecuciones registradas del worker
+WORKER_RUN_RETENTION_DAYS = 30
+
+
+class SmsEsWorkerRun(models.Model):
+    _name = "sms_es.worker_run"
+    _description = "Ejecuciones del Worker de la Cola SMS"
+    _order = "started_at desc, id desc"
+    _rec_name = "started_at"
+
+    started_at = fields.Datetime(string="Inicio", required=True, index=True)
+    jobs_claimed = fields.Integer(string="Trabajos Seleccionados")
+    sent_count = fields.Integer(string="Enviados")
+    retried_count = fields.Integer(string="Reintentos Programados")
+    failed_count = fields.Integer(string="Fallidos")
+    request_count = fields.Integer(string="Peticiones HTTP")
+    throttled_count = fields.Integer(
+        string="Throttling", help="Respuestas 420 / 105 de la API."
+    )
+    wall_time = fields.Float(string="Duración (s)", group_operator="avg")
+    http_time = fields.Float(
+        string="Tiempo HTTP (s)",
+        group_operator="avg",
+        help="Tiempo esperando las respuestas de la API.",
+    )
+    db_time = fields.Float(
+        string="Tiempo ORM/BD (s)",
+        group_operator="avg",
+        help="Resto de la ejecución: selección de trabajos, escrituras y \
+            commits.",
+    )
+    http_ratio = fields.Float(
+        string="% en HTTP",
+        compute="_compute_rates",
+        group_operator="avg",
+        store=True,
+    )
+    throughput = fields.Float(
+        string="Mensajes/s",
+        compute="_compute_rates",
+        group_operator="avg",
+        store=True,
+    )
+    backlog_remaining = fields.Integer(
+        string="Pendientes al Terminar",
+        help="Trabajos listos para enviar que quedaron en la cola, \
+            contados al inicio del ciclo hasta diez lotes por origen.",
+    )
+    error_message = fields.Char(string="Error")
+
+    @api.depends("wall_time", "http_time", "sent_count")
+    def _compute_rates(self):
+        for run in self:
+            if run.wall_time:
+                run.http_ratio = 100.0 * run.http_time / run.wall_time
+                run.throughput = run.sent_count / run.wall_time
+            else:
+                run.http_ratio = 0.0
+                run.throughput = 0.0
+
+    @api.model
+    def _gc_worker_runs(self):
+        """Borra las ejecuciones más antiguas que el periodo de retención."""
+        limit = fields.Datetime.now() - timedelta(
+            days=WORKER_RUN_RETENTION_DAYS
+        )
+        self.env.cr.execute(
+            "DELETE FROM sms_es_worker_run WHERE started_at < %s", [limit]
+        )
+        _logger.info(
+            "%d ejecuciones antiguas del worker de SMS eliminadas.",
+            self.env.cr.rowcount,
+        )
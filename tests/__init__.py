@@ -1,4 +1,13 @@
 # -*- coding: utf-8 -*-
 from . import test_sms_client
 from . import test_queue_logic
-from . import test_webhook_controller
\ No newline at end of file
+from . import test_webhook_controller
+from . import test_dashboard
+from . import test_retention
+from . import test_sms_tools
+from . import test_compose_wizard
+from . import test_simulator
+from . import test_metrics
+from . import test_accounts
+from . import test_backends
+from . import test_benchmark
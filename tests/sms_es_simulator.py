@@ -0,0 +1,326 @@
+# -*- coding: utf-8 -*-
+"""
+Simulador local de la API de SMS.es para pruebas de carga y regresión.
+
+Habla el protocolo de envío de SMS.es (202 / 420 / 105 / 5xx) con una
+latencia y una mezcla de errores configurables, y envía los DLR de vuelta
+a la URL indicada en cada petición (``dlrUrl``), firmados con HMAC si se
+configura un secreto. Solo usa la biblioteca estándar, así que puede
+ejecutarse en la misma máquina que Odoo, sin red:
+
+    python tests/sms_es_simulator.py --port 8099 --latency 0.05 \\
+        --throttle-ratio 0.02 --server-error-ratio 0.01 \\
+        --hmac-secret SECRETO
+
+y configurar ``http://127.0.0.1:8099/sendsms`` como URL de la API.
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import logging
+import random
+import threading
+import time
+import urllib.request
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_logger = logging.getLogger(__name__)
+
+# Códigos de error de la API de SMS.es devueltos con HTTP 420
+RC_AUTH_FAILED = 101
+RC_INVALID_RECEIVER = 103
+RC_THROTTLING_ERROR = 105
+
+# Capacidad de un mensaje simple y de cada parte de uno concatenado
+SEGMENT_LIMITS = {"gsm": (160, 153), "ucs": (70, 67)}
+
+
+def _count_parts(text, dcs):
+    single_limit, part_limit = SEGMENT_LIMITS.get(dcs, SEGMENT_LIMITS["gsm"])
+    length = len(text or "")
+    if length <= single_limit:
+        return 1
+    return -(-length // part_limit)
+
+
+class SmsEsSimulator:
+    """
+    Servidor HTTP que simula la API de SMS.es.
+    Esta clase no es un modelo de Odoo, sino una clase de utilidad.
+    """
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=0,
+        latency=0.0,
+        latency_jitter=0.0,
+        throttle_ratio=0.0,
+        reject_ratio=0.0,
+        server_error_ratio=0.0,
+        undelivered_ratio=0.0,
+        dlr_delay=0.0,
+        hmac_secret=None,
+        username=None,
+        password=None,
+        seed=None,
+    ):
+        """
+        :param host: Dirección en la que escucha el servidor.
+        :param port: Puerto; 0 para elegir uno libre.
+        :param latency: Segundos de espera antes de cada respuesta.
+        :param latency_jitter: Variación aleatoria máxima de la latencia.
+        :param throttle_ratio: Proporción de respuestas 420 / 105.
+        :param reject_ratio: Proporción de respuestas 420 / 103.
+        :param server_error_ratio: Proporción de respuestas 5xx.
+        :param undelivered_ratio: Proporción de DLR UNDELIVERED.
+        :param dlr_delay: Segundos entre la aceptación y el DLR.
+        :param hmac_secret: Secreto para firmar los DLR.
+        :param username: Usuario esperado (None acepta cualquiera).
+        :param password: Contraseña esperada.
+        :param seed: Semilla para obtener resultados reproducibles.
+        """
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.throttle_ratio = throttle_ratio
+        self.reject_ratio = reject_ratio
+        self.server_error_ratio = server_error_ratio
+        self.undelivered_ratio = undelivered_ratio
+        self.dlr_delay = dlr_delay
+        self.hmac_secret = hmac_secret
+        self.username = username
+        self.password = password
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {
+            "requests": 0,
+            "accepted": 0,
+            "throttled": 0,
+            "rejected": 0,
+            "server_errors": 0,
+            "dlr_sent": 0,
+            "dlr_failed": 0,
+        }
+        self._dlr_threads = []
+
+        simulator = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                simulator._handle_submit(self)
+
+            def log_message(self, format, *args):
+                _logger.debug(format, *args)
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        """URL de envío que debe configurarse como URL de la API."""
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/sendsms"
+
+    def start(self):
+        """Arranca el servidor en un hilo en segundo plano."""
+        self._thread = threading.Thread(
+            target=self.server.serve_forever, daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Detiene el servidor y espera a los DLR pendientes."""
+        self.server.shutdown()
+        self.server.server_close()
+        for thread in list(self._dlr_threads):
+            thread.join(timeout=5)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _count(self, key, value=1):
+        with self._lock:
+            self.stats[key] += value
+
+    def _roll(self):
+        with self._lock:
+            return self._random.random()
+
+    # ------------------------------------------------------------------
+    # Envío (submit)
+    # ------------------------------------------------------------------
+    def _reply(self, handler, status, body):
+        data = body if isinstance(body, bytes) else json.dumps(body).encode()
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(data)))
+        handler.end_headers()
+        handler.wfile.write(data)
+
+    def _reply_error(self, handler, code, message):
+        self._reply(
+            handler, 420, {"error": {"code": code, "message": message}}
+        )
+
+    def _handle_submit(self, handler):
+        self._count("requests")
+        length = int(handler.headers.get("Content-Length") or 0)
+        try:
+            payload = json.loads(handler.rfile.read(length).decode("utf-8"))
+        except (ValueError, UnicodeDecodeError):
+            self._count("rejected")
+            return self._reply_error(handler, 100, "Malformed JSON")
+
+        delay = self.latency
+        if self.latency_jitter:
+            delay += self._roll() * self.latency_jitter
+        if delay:
+            time.sleep(delay)
+
+        auth = payload.get("auth") or {}
+        if (self.username and auth.get("username") != self.username) or (
+            self.password and auth.get("password") != self.password
+        ):
+            self._count("rejected")
+            return self._reply_error(
+                handler, RC_AUTH_FAILED, "Authentication failed"
+            )
+        if not str(payload.get("receiver") or "").isdigit():
+            self._count("rejected")
+            return self._reply_error(
+                handler, RC_INVALID_RECEIVER, "Invalid receiver"
+            )
+
+        # Mezcla de errores configurada
+        roll = self._roll()
+        if roll < self.server_error_ratio:
+            self._count("server_errors")
+            return self._reply(handler, 503, b"Service Unavailable")
+        roll -= self.server_error_ratio
+        if roll < self.throttle_ratio:
+            self._count("throttled")
+            return self._reply_error(
+                handler, RC_THROTTLING_ERROR, "Throttling"
+            )
+        roll -= self.throttle_ratio
+        if roll < self.reject_ratio:
+            self._count("rejected")
+            return self._reply_error(
+                handler, RC_INVALID_RECEIVER, "Rejected by simulator"
+            )
+
+        msg_id = str(uuid.uuid4())
+        num_parts = _count_parts(payload.get("text"), payload.get("dcs"))
+        self._count("accepted")
+        self._reply(handler, 202, {"msgId": msg_id, "numParts": num_parts})
+
+        if payload.get("dlrUrl") and payload.get("dlrMask"):
+            self._schedule_dlr(payload, msg_id, num_parts)
+
+    # ------------------------------------------------------------------
+    # Informes de entrega (DLR)
+    # ------------------------------------------------------------------
+    def _schedule_dlr(self, payload, msg_id, num_parts):
+        send_time = time.time()
+        delivered = self._roll() >= self.undelivered_ratio
+
+        def send():
+            if self.dlr_delay:
+                time.sleep(self.dlr_delay)
+            for part_num in range(1, num_parts + 1):
+                self._post_dlr(
+                    payload["dlrUrl"],
+                    {
+                        "event": "DELIVERED" if delivered else "UNDELIVERED",
+                        "msgId": msg_id,
+                        "partNum": part_num,
+                        "numParts": num_parts,
+                        "sendTime": send_time,
+                        "dlrTime": time.time(),
+                        "errorCode": 0 if delivered else 1,
+                        "errorMessage": "" if delivered else "Absent",
+                        "custom": payload.get("custom") or {},
+                    },
+                )
+
+        thread = threading.Thread(target=send, daemon=True)
+        self._dlr_threads = [t for t in self._dlr_threads if t.is_alive()]
+        self._dlr_threads.append(thread)
+        thread.start()
+
+    def _post_dlr(self, url, dlr):
+        body = json.dumps(dlr).encode("utf-8")
+        headers = {"Content-Type": "application/json"}
+        if self.hmac_secret:
+            headers["X-SmsEs-Signature"] = hmac.new(
+                self.hmac_secret.encode("utf-8"),
+                msg=body,
+                digestmod=hashlib.sha256,
+            ).hexdigest()
+        request = urllib.request.Request(
+            url, data=body, headers=headers, method="POST"
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=10) as response:
+                response.read()
+            self._count("dlr_sent")
+        except Exception as e:
+            _logger.warning("No se pudo enviar el DLR a %s: %s", url, e)
+            self._count("dlr_failed")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Simulador local de la API de SMS.es."
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--latency-jitter", type=float, default=0.0)
+    parser.add_argument("--throttle-ratio", type=float, default=0.0)
+    parser.add_argument("--reject-ratio", type=float, default=0.0)
+    parser.add_argument("--server-error-ratio", type=float, default=0.0)
+    parser.add_argument("--undelivered-ratio", type=float, default=0.0)
+    parser.add_argument("--dlr-delay", type=float, default=0.0)
+    parser.add_argument("--hmac-secret")
+    parser.add_argument("--username")
+    parser.add_argument("--password")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    simulator = SmsEsSimulator(
+        host=args.host,
+        port=args.port,
+        latency=args.latency,
+        latency_jitter=args.latency_jitter,
+        throttle_ratio=args.throttle_ratio,
+        reject_ratio=args.reject_ratio,
+        server_error_ratio=args.server_error_ratio,
+        undelivered_ratio=args.undelivered_ratio,
+        dlr_delay=args.dlr_delay,
+        hmac_secret=args.hmac_secret,
+        username=args.username,
+        password=args.password,
+        seed=args.seed,
+    )
+    _logger.info("Simulador de SMS.es escuchando en %s", simulator.url)
+    try:
+        simulator.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        simulator.server.server_close()
+        _logger.info("Estadísticas: %s", json.dumps(simulator.stats))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+from collections import Counter
+from unittest.mock import patch
+
+from odoo import fields
+from odoo.tests.common import BaseCase, TransactionCase
+from odoo.addons.sms_es_connector.models.sms_es_account import (
+    SmsEsAccountPool,
+    _account_health,
+    pick_weighted,
+)
+from odoo.addons.sms_es_connector.models.sms_es_client import SmsEsClient
+
+THROTTLED = {
+    "status": "failed",
+    "error": {"code": 105, "message": "Throttling"},
+    "transient": True,
+}
+
+
+class TestWeightedPick(BaseCase):
+
+    def test_01_distribution_follows_weights(self):
+        """Prueba que el reparto es proporcional al peso y sin ráfagas."""
+        candidates = [("test_a", 3), ("test_b", 1)]
+        picks = [pick_weighted(candidates) for _i in range(8)]
+        self.assertEqual(Counter(picks), {"test_a": 6, "test_b": 2})
+        # La cuenta de menor peso no espera a que la otra agote su parte
+        self.assertIn("test_b", picks[:4])
+        self.assertIsNone(pick_weighted([]))
+
+
+class TestAccountPool(TransactionCase):
+
+    def setUp(self):
+        super(TestAccountPool, self).setUp()
+        self.addCleanup(_account_health.clear)
+        self.env["ir.config_parameter"].sudo().set_param(
+            "sms_es_connector.api_url", "http://fakeapi.com"
+        )
+        self.Account = self.env["sms_es.account"]
+        self.account_a = self.Account.create(
+            {
+                "name": "Cuenta A",
+                "api_username": "user_a",
+                "api_password": "pass_a",
+                "weight": 1,
+            }
+        )
+        self.account_b = self.Account.create(
+            {
+                "name": "Cuenta B",
+                "api_username": "user_b",
+                "api_password": "pass_b",
+                "weight": 1,
+            }
+        )
+
+    def test_01_transient_failure_pauses_account(self):
+        """Prueba la pausa creciente tras fallos y la rehabilitación."""
+        self.assertTrue(self.account_a._report_result(THROTTLED))
+        first_cooldown = self.account_a._get_process_health()[1]
+        self.assertTrue(first_cooldown > fields.Datetime.now())
+        self.assertNotIn(
+            self.account_a, self.Account._get_available_accounts()
+        )
+
+        self.account_a._report_result(THROTTLED)
+        failures, cooldown_until = self.account_a._get_process_health()
+        self.assertEqual(failures, 2)
+        self.assertTrue(cooldown_until > first_cooldown)
+
+        invalid = {
+            "status": "failed",
+            "error": {"code": 103, "message": "Invalid receiver"},
+        }
+        self.assertFalse(self.account_b._report_result(invalid))
+        self.assertEqual(self.account_b._get_process_health(), (0, None))
+
+        self.account_a._report_result({"status": "success", "data": {}})
+        self.assertEqual(self.account_a._get_process_health(), (0, None))
+        self.assertIn(self.account_a, self.Account._get_available_accounts())
+
+    def test_02_send_fails_over_to_next_account(self):
+        """Prueba que un throttling pasa el envío a la otra cuenta."""
+
+        def fake_send(client, message_data, **kwargs):
+            if client.username == "user_a":
+                return THROTTLED
+            return {"status": "success", "data": {"msgId": "b-1"}}
+
+        with patch.object(
+            SmsEsClient, "send_sms", autospec=True, side_effect=fake_send
+        ):
+            pool = SmsEsAccountPool(self.env)
+            for _i in range(2):
+                result, account_id = pool.send({"odoo_message_id": 1})
+                self.assertEqual(result["status"], "success")
+                self.assertEqual(account_id, self.account_b.id)
+
+        self.assertEqual(pool.available, [self.account_b.id])
+        self.assertTrue(self.account_a._get_process_health()[1])
+
+    def test_03_dlr_lookup_is_pinned_to_account(self):
+        """Prueba que el payload identifica la cuenta usada en el envío."""
+        client = SmsEsClient(self.env, account=self.account_b)
+        payload = client._build_payload(
+            {
+                "receiver": "34612345678",
+                "sender": "Odoo",
+                "text": "Test",
+                "odoo_message_id": 7,
+            }
+        )
+        self.assertEqual(
+            payload["custom"],
+            {"odoo_message_id": 7, "odoo_account_id": self.account_b.id},
+        )
+        self.assertEqual(client.username, "user_b")
+
+    def test_04_bookkeeping_errors_do_not_fail_sends(self):
+        """Prueba que un error al guardar el estado de la cuenta no se
+        propaga al envío."""
+        with patch.object(
+            type(self.account_a), "write", side_effect=Exception("lock")
+        ):
+            self.assertTrue(self.account_a._report_result(THROTTLED))
+        self.assertNotIn(
+            self.account_a, self.Account._get_available_accounts()
+        )
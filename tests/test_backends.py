@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from odoo.tests.common import TransactionCase
+from odoo.addons.sms_es_connector.models.sms_es_account import (
+    PARAM_ACCOUNT_ROUTING,
+    SmsEsAccountPool,
+    _account_health,
+)
+from odoo.addons.sms_es_connector.models.sms_es_backend import (
+    BACKENDS,
+    OUTCOME_AUTH_FAILED,
+    OUTCOME_SUCCESS,
+    OUTCOME_THROTTLED,
+    SmsBackend,
+    register_backend,
+)
+from odoo.addons.sms_es_connector.models.sms_es_client import SmsEsClient
+
+
+class FakeBackend(SmsBackend):
+    """Proveedor local que responde lo indicado en 'responses'."""
+
+    code = "test_fake"
+    label = "Proveedor de Prueba"
+    responses = []
+
+    def _build_payload(self, message_data):
+        return {"to": message_data["receiver"], "user": self.username}
+
+    def _post(self, payload):
+        return SimpleNamespace(
+            status_code=200, text="", result=self.responses.pop(0)
+        )
+
+    def _classify_response(self, response):
+        outcome, data = response.result
+        if outcome == OUTCOME_SUCCESS:
+            return outcome, {"msgId": data["id"], "parts": 1}
+        return outcome, data
+
+
+class TestBackends(TransactionCase):
+
+    def setUp(self):
+        super(TestBackends, self).setUp()
+        register_backend(FakeBackend)
+        self.addCleanup(BACKENDS.pop, FakeBackend.code)
+        self.addCleanup(_account_health.clear)
+        FakeBackend.responses = []
+        self.env["ir.config_parameter"].sudo().set_param(
+            "sms_es_connector.api_url", "http://fakeapi.com"
+        )
+        self.message_data = {
+            "receiver": "34612345678",
+            "sender": "Odoo",
+            "text": "Test",
+            "odoo_message_id": 1,
+        }
+        self.fake_account = self.env["sms_es.account"].create(
+            {
+                "name": "Proveedor Barato",
+                "backend": FakeBackend.code,
+                "api_username": "fake",
+                "api_password": "fake",
+                "cost_per_part": 0.02,
+            }
+        )
+        self.sms_es_account = self.env["sms_es.account"].create(
+            {
+                "name": "SMS.es",
+                "api_username": "user",
+                "api_password": "pass",
+                "cost_per_part": 0.05,
+            }
+        )
+
+    @patch("time.sleep", return_value=None)
+    def test_01_core_retries_and_classifies(self, mock_sleep):
+        """Prueba los reintentos y la clasificación del núcleo común."""
+        FakeBackend.responses = [
+            (OUTCOME_THROTTLED, {"code": "429", "message": "Slow down"}),
+            (OUTCOME_SUCCESS, {"id": "fake-1"}),
+        ]
+        backend = FakeBackend(self.env, account=self.fake_account)
+
+        result = backend.send_sms(self.message_data)
+
+        self.assertEqual(result["status"], "success")
+        # El núcleo solo entrega las claves comunes de un envío aceptado
+        self.assertEqual(
+            result["data"], {"msgId": "fake-1", "numParts": None}
+        )
+        self.assertEqual(backend.stats["requests"], 2)
+        self.assertEqual(backend.stats["throttled"], 1)
+        mock_sleep.assert_called_once_with(1)
+
+        FakeBackend.responses = [
+            (OUTCOME_AUTH_FAILED, {"code": "401", "message": "Bad login"})
+        ]
+        result = backend.send_sms(self.message_data)
+        self.assertFalse(result["transient"])
+        self.assertEqual(result["reason"], OUTCOME_AUTH_FAILED)
+        self.assertTrue(self.fake_account._report_result(result))
+
+    def test_02_least_cost_routing_with_failover(self):
+        """Prueba que el menor coste elige al proveedor barato y que un
+        throttling pasa el envío al otro proveedor."""
+        self.env["ir.config_parameter"].sudo().set_param(
+            PARAM_ACCOUNT_ROUTING, "least_cost"
+        )
+        FakeBackend.responses = [(OUTCOME_SUCCESS, {"id": "fake-1"})]
+        pool = SmsEsAccountPool(self.env)
+        self.assertIsInstance(
+            pool.clients[self.fake_account.id], FakeBackend
+        )
+        result, account_id = pool.send(self.message_data)
+        self.assertEqual(result["data"]["msgId"], "fake-1")
+        self.assertEqual(account_id, self.fake_account.id)
+
+        FakeBackend.responses = [
+            (OUTCOME_THROTTLED, {"code": "429", "message": "Slow down"})
+        ]
+        with patch.object(
+            SmsEsClient,
+            "send_sms",
+            return_value={"status": "success", "data": {"msgId": "es-1"}},
+        ):
+            result, account_id = pool.send(
+                self.message_data, max_retries=1
+            )
+        self.assertEqual(result["data"], {"msgId": "es-1"})
+        self.assertEqual(account_id, self.sms_es_account.id)
+        self.assertTrue(self.fake_account._get_process_health()[1])
@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark de extremo a extremo de la cola, el worker y el webhook DLR.
+
+No se ejecuta con el resto de pruebas. Para lanzarlo:
+
+    odoo-bin -d <bd> -i sms_es_connector --test-tags sms_es_benchmark \\
+        --stop-after-init
+
+Variables de entorno:
+
+- SMS_ES_BENCH_SIZES: volúmenes de histórico a medir (por defecto 10000;
+  p. ej. 10000,100000,1000000).
+- SMS_ES_BENCH_ENQUEUE: mensajes encolados en cada medida (1000).
+- SMS_ES_BENCH_DRAIN: trabajos enviados al simulador en cada medida (500).
+- SMS_ES_BENCH_DLR: DLR enviados al webhook en cada medida (200).
+- SMS_ES_BENCH_LATENCY: latencia simulada de la API en segundos (0).
+- SMS_ES_BENCH_REPORT: ruta del informe JSON (sms_es_benchmark.json).
+"""
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from unittest.mock import patch
+
+from odoo.tests.common import HttpCase, tagged
+
+from odoo.addons.sms_es_connector.models.sms_es_client import SmsEsClient
+from .sms_es_simulator import SmsEsSimulator
+
+try:
+    from odoo import release
+except ImportError:
+    from odoo.tools import release
+
+_logger = logging.getLogger(__name__)
+
+
+def _env_int(name, default):
+    return int(os.environ.get(name) or default)
+
+
+def _percentile(values, percent):
+    """Percentil por interpolación lineal, como percentile_cont."""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    position = (len(values) - 1) * percent / 100.0
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (
+        position - lower
+    )
+
+
+def _rate(count, seconds):
+    return round(count / seconds, 2) if seconds else None
+
+
+@tagged("sms_es_benchmark", "-standard", "-at_install", "post_install")
+class TestSmsEsBenchmark(HttpCase):
+
+    def setUp(self):
+        super(TestSmsEsBenchmark, self).setUp()
+        self.sizes = [
+            int(size)
+            for size in os.environ.get("SMS_ES_BENCH_SIZES", "10000").split(
+                ","
+            )
+            if size.strip()
+        ]
+        self.enqueue_count = _env_int("SMS_ES_BENCH_ENQUEUE", 1000)
+        self.drain_count = _env_int("SMS_ES_BENCH_DRAIN", 500)
+        self.dlr_count = _env_int("SMS_ES_BENCH_DLR", 200)
+        self.report_path = os.environ.get(
+            "SMS_ES_BENCH_REPORT", "sms_es_benchmark.json"
+        )
+
+        self.simulator = SmsEsSimulator(
+            latency=float(os.environ.get("SMS_ES_BENCH_LATENCY") or 0.0),
+            seed=42,
+        ).start()
+        self.addCleanup(self.simulator.stop)
+
+        config = self.env["ir.config_parameter"].sudo()
+        config.set_param("sms_es_connector.api_url", self.simulator.url)
+        config.set_param("sms_es_connector.api_username", "bench")
+        config.set_param("sms_es_connector.api_password", "bench")
+        config.set_param("sms_es_connector.webhook_token", "BENCH")
+        # Sin DLR automáticos: el benchmark los envía al webhook él mismo
+        config.set_param("sms_es_connector.dlr_mask", 0)
+        self._receiver_seq = 0
+
+    # ------------------------------------------------------------------
+    # Datos
+    # ------------------------------------------------------------------
+    def _seed_history(self, count):
+        """
+        Inserta `count` mensajes históricos (y su DLR) por SQL, repartidos
+        en los últimos 30 días, para medir con tablas de ese tamaño.
+        """
+        self.env.cr.execute(
+            """
+            WITH new_messages AS (
+                INSERT INTO sms_es_message
+                       (name, text, sender, receiver, msg_id, num_parts,
+                        state, lane, create_uid, write_uid, create_date,
+                        write_date)
+                SELECT 'Bench ' || n, 'Benchmark history', 'Bench',
+                       '34' || (600000000 + n % 99999999)::text,
+                       md5(random()::text), 1,
+                       (ARRAY['delivered', 'delivered', 'delivered',
+                              'undelivered', 'api_failed', 'rejected'])
+                           [1 + n % 6],
+                       'bulk', %s, %s,
+                       now() at time zone 'UTC'
+                           - (n % 43200) * interval '1 minute',
+                       now() at time zone 'UTC'
+                           - (n % 43200) * interval '1 minute'
+                  FROM generate_series(1, %s) AS n
+             RETURNING id, create_date, state
+            )
+            INSERT INTO sms_es_dlr_event
+                   (message_id, event, "sendTime", "dlrTime", create_uid,
+                    write_uid, create_date, write_date)
+            SELECT id, upper(state),
+                   extract(epoch FROM create_date),
+                   extract(epoch FROM create_date) + 1 + random() * 30,
+                   %s, %s, create_date, create_date
+              FROM new_messages
+             WHERE state IN ('delivered', 'undelivered')
+            """,
+            (self.env.uid, self.env.uid, count, self.env.uid, self.env.uid),
+        )
+
+    def _new_message_vals(self, count, label):
+        vals_list = []
+        for _i in range(count):
+            self._receiver_seq += 1
+            vals_list.append(
+                {
+                    "name": f"{label} {self._receiver_seq}",
+                    "sender": "Bench",
+                    "receiver": f"6{self._receiver_seq:08d}",
+                    "text": f"Benchmark {label} {self._receiver_seq}",
+                    "lane": "bulk",
+                }
+            )
+        return vals_list
+
+    # ------------------------------------------------------------------
+    # Medidas
+    # ------------------------------------------------------------------
+    def _measure_enqueue(self):
+        messages = self.env["sms_es.message"].create(
+            self._new_message_vals(self.enqueue_count, "Enqueue")
+        )
+        start = time.perf_counter()
+        messages.action_queue_sms()
+        seconds = time.perf_counter() - start
+        return {
+            "count": len(messages),
+            "seconds": round(seconds, 3),
+            "rate": _rate(len(messages), seconds),
+        }
+
+    def _measure_drain(self):
+        messages = self.env["sms_es.message"].create(
+            self._new_message_vals(self.drain_count, "Drain")
+        )
+        messages.action_queue_sms()
+
+        timings = []
+        original_send = SmsEsClient.send_sms
+
+        def timed_send(client, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original_send(client, *args, **kwargs)
+            finally:
+                timings.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        with patch.object(SmsEsClient, "send_sms", timed_send):
+            self.env["sms_es.queue_job"]._process_sms_queue(
+                limit=self.drain_count
+            )
+        seconds = time.perf_counter() - start
+        return {
+            "count": len(timings),
+            "seconds": round(seconds, 3),
+            "rate": _rate(len(timings), seconds),
+            "p50_ms": round(_percentile(timings, 50) * 1000, 3),
+            "p99_ms": round(_percentile(timings, 99) * 1000, 3),
+        }
+
+    def _measure_dlr_ingest(self):
+        messages = self.env["sms_es.message"].create(
+            [
+                dict(vals, state="api_sent", msg_id=vals["name"])
+                for vals in self._new_message_vals(self.dlr_count, "DLR")
+            ]
+        )
+        url = "/sms_es_connector/webhook/dlr?token=BENCH"
+        start = time.perf_counter()
+        for message in messages:
+            now = time.time()
+            response = self.url_open(
+                url,
+                data=json.dumps(
+                    {
+                        "event": "DELIVERED",
+                        "msgId": message.msg_id,
+                        "partNum": 1,
+                        "numParts": 1,
+                        "sendTime": now - 2,
+                        "dlrTime": now,
+                        "custom": {"odoo_message_id": message.id},
+                    }
+                ),
+                headers={"Content-Type": "application/json"},
+            )
+            self.assertEqual(response.status_code, 200)
+        seconds = time.perf_counter() - start
+        return {
+            "count": len(messages),
+            "seconds": round(seconds, 3),
+            "rate": _rate(len(messages), seconds),
+        }
+
+    def _measure_dashboard(self):
+        timings = {}
+        start = time.perf_counter()
+        self.env["sms_es.message_stat"]._refresh_stats()
+        timings["stats_refresh_seconds"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        self.env["sms_es.latency_stat"]._refresh_latency_stats()
+        timings["latency_refresh_seconds"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        self.env["sms_es.dashboard"]._compute_kpi_values()
+        timings["kpi_seconds"] = time.perf_counter() - start
+        return {key: round(value, 3) for key, value in timings.items()}
+
+    def test_benchmark(self):
+        """Mide el rendimiento de extremo a extremo para cada volumen."""
+        report = {
+            "odoo_version": release.version,
+            "date": datetime.utcnow().isoformat(),
+            "settings": {
+                "enqueue": self.enqueue_count,
+                "drain": self.drain_count,
+                "dlr": self.dlr_count,
+                "api_latency": self.simulator.latency,
+            },
+            "results": {},
+        }
+        seeded = 0
+        for size in sorted(self.sizes):
+            self._seed_history(size - seeded)
+            seeded = size
+            results = {
+                "enqueue": self._measure_enqueue(),
+                "drain": self._measure_drain(),
+                "dlr_ingest": self._measure_dlr_ingest(),
+                "dashboard": self._measure_dashboard(),
+            }
+            report["results"][str(size)] = results
+            _logger.info(
+                "Benchmark SMS-ES con %d filas: %s", size, json.dumps(results)
+            )
+
+        report["simulator"] = dict(self.simulator.stats)
+        with open(self.report_path, "w") as report_file:
+            json.dump(report, report_file, indent=2)
+        _logger.info("Informe del benchmark guardado en %s", self.report_path)
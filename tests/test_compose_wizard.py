@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+from unittest.mock import patch
+
+from odoo.exceptions import UserError
+from odoo.tests.common import TransactionCase
+
+from odoo.addons.sms_es_connector.models.sms_es_template import SmsTemplate
+
+
+class TestComposeWizard(TransactionCase):
+
+    def setUp(self):
+        super(TestComposeWizard, self).setUp()
+        Partner = self.env["res.partner"]
+        self.partner_mobile = Partner.create(
+            {"name": "Con Móvil", "mobile": "611222333", "phone": "911000000"}
+        )
+        self.partner_phone = Partner.create(
+            {"name": "Con Teléfono", "phone": "922000000"}
+        )
+        self.partner_none = Partner.create({"name": "Sin Número"})
+
+    def _get_wizard(self, records):
+        return (
+            self.env["sms_es.compose.wizard"]
+            .with_context(
+                active_model=records._name, active_ids=records.ids
+            )
+            .create({"sender": "Odoo", "text": "Hola"})
+        )
+
+    def test_01_resolve_partner_numbers(self):
+        """Prueba la resolución en bloque de los números de contactos."""
+        partners = self.partner_mobile | self.partner_phone | self.partner_none
+        wizard = self._get_wizard(partners)
+
+        recipients = wizard._get_recipient_numbers(partners)
+
+        self.assertEqual(
+            recipients[self.partner_mobile.id], ("611222333", "Con Móvil")
+        )
+        self.assertEqual(recipients[self.partner_phone.id][0], "922000000")
+        self.assertIsNone(recipients[self.partner_none.id][0])
+
+    def test_02_resolve_lead_partner_fallback(self):
+        """Prueba que un Lead sin número use el de su contacto."""
+        Lead = self.env["crm.lead"]
+        own = Lead.create({"name": "Lead propio", "mobile": "644555666"})
+        fallback = Lead.create(
+            {"name": "Lead sin número", "partner_id": self.partner_phone.id}
+        )
+        leads = own | fallback
+        wizard = self._get_wizard(leads)
+
+        recipients = wizard._get_recipient_numbers(leads)
+
+        self.assertEqual(recipients[own.id][0], "644555666")
+        self.assertEqual(recipients[fallback.id][0], "922000000")
+        self.assertEqual(
+            wizard._get_recipient_number(fallback), "922000000"
+        )
+
+    def test_03_send_creates_campaign(self):
+        """Prueba que el envío agrupe los mensajes en una campaña."""
+        partners = self.partner_mobile | self.partner_phone | self.partner_none
+        wizard = self._get_wizard(partners)
+
+        wizard.action_send_sms()
+
+        messages = self.env["sms_es.message"].search(
+            [("res_model", "=", "res.partner"), ("res_id", "in", partners.ids)]
+        )
+        self.assertEqual(len(messages), 2)
+        campaign = messages.mapped("campaign_id")
+        self.assertEqual(len(campaign), 1)
+        self.env["sms_es.campaign"]._fold_counter_deltas()
+        self.assertEqual(campaign.message_count, 2)
+        self.assertEqual(campaign.queued_count, 2)
+        self.assertEqual(campaign.lane, "bulk")
+
+    def test_04_segments_and_cost_estimate(self):
+        """Prueba el cálculo de partes y coste de toda la selección."""
+        self.env["ir.config_parameter"].set_param(
+            "sms_es_connector.cost_per_part", "0.05"
+        )
+        partners = self.partner_mobile | self.partner_phone | self.partner_none
+        wizard = self._get_wizard(partners)
+        wizard.write({"text": "Envío " + "a" * 70, "dcs": "auto"})
+
+        self.assertEqual(wizard.text_charset, "ucs")
+        self.assertEqual(wizard.text_parts, 2)
+        self.assertEqual(wizard.non_gsm_chars, "í")
+        self.assertEqual(wizard.total_parts, 6)
+        self.assertAlmostEqual(wizard.estimated_cost, 0.30)
+
+        wizard.action_send_sms()
+        message = self.env["sms_es.message"].search(
+            [
+                ("res_model", "=", "res.partner"),
+                ("res_id", "=", self.partner_mobile.id),
+            ]
+        )
+        self.assertEqual(message.dcs, "ucs")
+        self.assertEqual(message.num_parts, 2)
+
+    def test_05_personalised_templates(self):
+        """Prueba el renderizado de plantillas con valores en bloque."""
+        country = self.env.ref("base.es")
+        self.partner_mobile.country_id = country
+        partners = self.partner_mobile | self.partner_phone
+        template = SmsTemplate(
+            "Hola {{ name }} ({{ country_id.code | XX }}, {{ country_id }})"
+        )
+        template.validate(partners)
+
+        texts = template.render_records(partners)
+
+        self.assertEqual(
+            texts[self.partner_mobile.id],
+            f"Hola Con Móvil (ES, {country.display_name})",
+        )
+        self.assertEqual(
+            texts[self.partner_phone.id], "Hola Con Teléfono (XX, )"
+        )
+        with self.assertRaises(UserError):
+            SmsTemplate("{{ child_ids.name }}").validate(partners)
+        with self.assertRaises(UserError):
+            SmsTemplate("{{ not_a_field }}").validate(partners)
+
+        wizard = self._get_wizard(partners)
+        wizard.text = "Hola {{ name }}"
+        wizard.dcs = "auto"
+        self.assertEqual(wizard.preview_text, "Hola Con Móvil")
+        wizard.action_send_sms()
+        messages = self.env["sms_es.message"].search(
+            [("res_model", "=", "res.partner"), ("res_id", "in", partners.ids)]
+        )
+        self.assertEqual(
+            {message.text: message.dcs for message in messages},
+            {"Hola Con Móvil": "ucs", "Hola Con Teléfono": "gsm"},
+        )
+
+    def test_06_large_selection_prepared_in_background(self):
+        """Prueba que las selecciones grandes se preparen por bloques."""
+        self.env["ir.config_parameter"].set_param(
+            "sms_es_connector.async_send_threshold", "2"
+        )
+        partners = self.partner_mobile | self.partner_phone | self.partner_none
+        wizard = self._get_wizard(partners)
+
+        action = wizard.action_send_sms()
+
+        campaign = self.env["sms_es.campaign"].browse(action["res_id"])
+        self.assertEqual(campaign.state, "preparing")
+        self.assertEqual(campaign.send_total, 3)
+        self.assertFalse(campaign.message_ids)
+
+        Campaign = self.env["sms_es.campaign"]
+        Campaign._process_pending_sends(batch_size=2, auto_commit=False)
+
+        self.assertEqual(campaign.state, "running")
+        self.assertEqual(campaign.send_offset, 3)
+        self.assertEqual(campaign.prepare_progress, 100.0)
+        Campaign._fold_counter_deltas()
+        self.assertEqual(campaign.message_count, 2)
+        self.assertEqual(campaign.skipped_count, 1)
+        self.assertEqual(
+            set(campaign.message_ids.mapped("state")), {"queued"}
+        )
+
+    def test_07_preparation_error_is_isolated(self):
+        """Prueba que el error de una campaña no bloquee a las demás."""
+        self.env["ir.config_parameter"].set_param(
+            "sms_es_connector.async_send_threshold", "1"
+        )
+        Campaign = self.env["sms_es.campaign"]
+        partners = self.partner_mobile | self.partner_phone
+        broken = Campaign.browse(
+            self._get_wizard(partners).action_send_sms()["res_id"]
+        )
+        healthy = Campaign.browse(
+            self._get_wizard(partners).action_send_sms()["res_id"]
+        )
+        prepare_next_batch = type(Campaign)._prepare_next_batch
+
+        def fake_prepare(campaign, res_ids, batch_size):
+            if campaign == broken:
+                raise ValueError("Plantilla rota")
+            return prepare_next_batch(campaign, res_ids, batch_size)
+
+        with patch.object(
+            type(Campaign),
+            "_prepare_next_batch",
+            autospec=True,
+            side_effect=fake_prepare,
+        ):
+            Campaign._process_pending_sends(batch_size=2, auto_commit=False)
+
+        self.assertEqual(broken.state, "cancelled")
+        self.assertIn("Plantilla rota", broken.prepare_error)
+        self.assertEqual(healthy.state, "running")
+        Campaign._fold_counter_deltas()
+        self.assertEqual(healthy.message_count, 2)
+
+    def test_08_rendered_text_outside_gsm_is_refused(self):
+        """Prueba que forzar GSM omita los mensajes cuyo texto, una vez
+        personalizado, tiene caracteres fuera de GSM-7."""
+        partners = self.partner_mobile | self.partner_phone
+        wizard = self._get_wizard(partners)
+        wizard.write({"text": "Hola {{ name }}", "dcs": "gsm"})
+        wizard._check_send(partners)
+
+        messages, skipped = wizard._send_to_records(
+            partners, wizard._create_campaign(partners)
+        )
+
+        self.assertEqual(messages.mapped("text"), ["Hola Con Teléfono"])
+        self.assertEqual(skipped, ["Con Móvil (caracteres no GSM: ó)"])
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+from odoo.tests.common import TransactionCase
+
+
+class TestDashboard(TransactionCase):
+
+    def setUp(self):
+        super(TestDashboard, self).setUp()
+        self.SmsMessage = self.env["sms_es.message"]
+        self.Dashboard = self.env["sms_es.dashboard"]
+        self.MessageStat = self.env["sms_es.message_stat"]
+
+    def _create_messages(self, state, count):
+        return self.SmsMessage.create(
+            [
+                {
+                    "name": f"Dashboard {state} {i}",
+                    "sender": "Odoo",
+                    "receiver": f"6000000{i:02d}",
+                    "text": "Test dashboard.",
+                    "state": state,
+                }
+                for i in range(count)
+            ]
+        )
+
+    def test_01_kpis_match_message_states(self):
+        """Prueba que los KPIs agrupados coincidan con los conteos
+        individuales por estado."""
+        self._create_messages("delivered", 3)
+        self._create_messages("undelivered", 1)
+        self._create_messages("rejected", 1)
+        self._create_messages("api_failed", 2)
+        self._create_messages("queued", 4)
+        # Un número no válido no cuenta como enviado ni como fallo
+        self._create_messages("invalid_number", 2)
+
+        def count(domain):
+            return self.SmsMessage.search_count(domain)
+
+        self.MessageStat._refresh_stats()
+        dashboard = self.Dashboard.create({"name": "Test"})
+        self.assertEqual(
+            dashboard.total_sent,
+            count(
+                [
+                    (
+                        "state",
+                        "not in",
+                        ["draft", "queued", "api_failed", "invalid_number"],
+                    )
+                ]
+            ),
+        )
+        self.assertEqual(
+            dashboard.total_delivered, count([("state", "=", "delivered")])
+        )
+        self.assertEqual(
+            dashboard.total_undelivered,
+            count([("state", "=", "undelivered")]),
+        )
+        self.assertEqual(
+            dashboard.total_failed,
+            count([("state", "in", ["api_failed", "rejected"])]),
+        )
+        total_final = count(
+            [("state", "in", ["delivered", "undelivered", "rejected"])]
+        )
+        self.assertAlmostEqual(
+            dashboard.delivery_rate,
+            dashboard.total_delivered / total_final * 100,
+        )
+
+    def test_02_incremental_stats_refresh(self):
+        """Prueba que el refresco incremental mueva los mensajes
+        modificados al estado correcto sin duplicar conteos."""
+        messages = self._create_messages("api_sent", 2)
+        self.MessageStat._refresh_stats()
+
+        messages[0].write({"state": "delivered"})
+        self.MessageStat._refresh_stats()
+
+        counts = self.Dashboard._get_message_count_by_state()
+        self.assertEqual(
+            counts.get("api_sent"),
+            self.SmsMessage.search_count([("state", "=", "api_sent")]),
+        )
+        self.assertEqual(
+            counts.get("delivered"),
+            self.SmsMessage.search_count([("state", "=", "delivered")]),
+        )
+
+    def test_03_kpi_cache_and_manual_refresh(self):
+        """Prueba que los KPIs se sirvan desde la caché hasta que se
+        invalide manualmente."""
+        self.env["ir.config_parameter"].sudo().set_param(
+            "sms_es_connector.dashboard_cache_ttl", 3600
+        )
+        dashboard = self.env.ref("sms_es_connector.sms_dashboard_data")
+        self.MessageStat._refresh_stats()
+        before = self.Dashboard._get_cached_kpi_values()["total_delivered"]
+
+        # Las estadísticas cambian sin pasar por el refresco del cron,
+        # así que la caché sigue vigente
+        self.MessageStat.create(
+            {
+                "bucket": "2026-01-01 10:00:00",
+                "date": "2026-01-01",
+                "hour": 10,
+                "state": "delivered",
+                "message_count": 2,
+            }
+        )
+        self.assertEqual(
+            self.Dashboard._get_cached_kpi_values()["total_delivered"], before
+        )
+
+        dashboard.action_refresh_kpis()
+        self.assertEqual(
+            self.Dashboard._get_cached_kpi_values()["total_delivered"],
+            before + 2,
+        )
+
+    def test_04_latency_rollup(self):
+        """Prueba el cálculo de percentiles de latencia por día,
+        remitente y prefijo de operador."""
+        message = self.SmsMessage.create(
+            {
+                "name": "Latency",
+                "sender": "LatencyTest",
+                "receiver": "+34 612 345 678",
+                "text": "Test latency.",
+                "state": "delivered",
+            }
+        )
+        self.env["sms_es.dlr_event"].create(
+            [
+                {
+                    "message_id": message.id,
+                    "event": "DELIVERED",
+                    "sendTime": 1700000000.0,
+                    "dlrTime": 1700000000.0 + latency,
+                }
+                for latency in (10.0, 20.0, 30.0)
+            ]
+        )
+
+        LatencyStat = self.env["sms_es.latency_stat"]
+        LatencyStat._refresh_latency_stats()
+
+        by_sender = LatencyStat.search(
+            [("dimension", "=", "sender"), ("sender", "=", "LatencyTest")]
+        )
+        self.assertEqual(len(by_sender), 1)
+        self.assertEqual(by_sender.sample_count, 3)
+        self.assertAlmostEqual(by_sender.latency_p50, 20.0)
+        self.assertAlmostEqual(by_sender.latency_avg, 20.0)
+        self.assertTrue(
+            LatencyStat.search_count(
+                [("dimension", "=", "prefix"), ("carrier_prefix", "=", "612")]
+            )
+        )
+        self.assertTrue(
+            LatencyStat.search_count([("dimension", "=", "total")])
+        )
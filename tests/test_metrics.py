@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+from unittest.mock import patch, MagicMock
+
+from odoo.tests.common import BaseCase, HttpCase, TransactionCase, tagged
+from odoo.addons.sms_es_connector.models.sms_es_client import SmsEsClient
+from odoo.addons.sms_es_connector.models.sms_es_metrics import (
+    MetricsRegistry,
+    REGISTRY,
+)
+from odoo.addons.sms_es_connector.models.sms_es_profiler import (
+    PARAM_PROFILE_SAMPLE_RATE,
+    compact_profiles,
+    get_profile_report,
+    profile_sample,
+    reset_profiles,
+)
+
+
+class TestMetricsRegistry(BaseCase):
+
+    def test_01_counters_and_histograms(self):
+        """Prueba la exposición de contadores e histogramas."""
+        registry = MetricsRegistry(buckets=(0.1, 1))
+        registry.inc("sms_es_dlr_unmatched_total")
+        registry.inc("sms_es_dlr_unmatched_total", value=2)
+        registry.observe(
+            "sms_es_api_request_seconds", 0.05, {"status": "202"}
+        )
+        registry.observe("sms_es_api_request_seconds", 0.5, {"status": "202"})
+
+        text = registry.render(
+            gauges=[("sms_es_queue_jobs", {"state": "pending"}, 7)]
+        )
+        self.assertIn("# TYPE sms_es_dlr_unmatched_total counter", text)
+        self.assertIn("sms_es_dlr_unmatched_total 3\n", text)
+        self.assertIn(
+            'sms_es_api_request_seconds_bucket{status="202",le="0.1"} 1',
+            text,
+        )
+        self.assertIn(
+            'sms_es_api_request_seconds_bucket{status="202",le="+Inf"} 2',
+            text,
+        )
+        self.assertIn('sms_es_api_request_seconds_count{status="202"} 2', text)
+        self.assertIn('sms_es_queue_jobs{state="pending"} 7', text)
+
+    def test_02_collect_deltas(self):
+        """Prueba que cada volcado devuelve solo lo nuevo."""
+        registry = MetricsRegistry()
+        registry.inc("sms_es_api_retries_total", {"reason": "throttling"})
+        registry.observe("sms_es_queue_claim_seconds", 0.2)
+
+        deltas = {delta["name"]: delta for delta in registry.collect_deltas()}
+        self.assertEqual(deltas["sms_es_api_retries_total"]["count"], 1)
+        self.assertEqual(deltas["sms_es_queue_claim_seconds"]["count"], 1)
+        self.assertAlmostEqual(
+            deltas["sms_es_queue_claim_seconds"]["sum"], 0.2
+        )
+
+        self.assertEqual(registry.collect_deltas(), [])
+        registry.inc("sms_es_api_retries_total", {"reason": "throttling"})
+        deltas = registry.collect_deltas()
+        self.assertEqual(len(deltas), 1)
+        self.assertEqual(deltas[0]["count"], 1)
+
+
+class TestMetricsStorage(TransactionCase):
+
+    def setUp(self):
+        super(TestMetricsStorage, self).setUp()
+        REGISTRY.reset()
+        self.addCleanup(REGISTRY.reset)
+        config = self.env["ir.config_parameter"].sudo()
+        config.set_param("sms_es_connector.api_url", "http://fakeapi.com")
+        config.set_param("sms_es_connector.api_username", "user")
+        config.set_param("sms_es_connector.api_password", "pass")
+
+    @patch("requests.Session.post")
+    def test_01_api_latency_is_stored(self, mock_post):
+        """Prueba que la latencia de la API se guarda al volcar."""
+        mock_response = MagicMock()
+        mock_response.status_code = 202
+        mock_response.json.return_value = {"msgId": "abc", "numParts": 1}
+        mock_post.return_value = mock_response
+
+        SmsEsClient(self.env).send_sms(
+            {
+                "receiver": "34612345678",
+                "sender": "Odoo",
+                "text": "Test",
+                "odoo_message_id": 1,
+            }
+        )
+        self.env["sms_es.metric"]._flush_metrics(force=True)
+
+        metric = self.env["sms_es.metric"].search(
+            [("name", "=", "sms_es_api_request_seconds")]
+        )
+        self.assertEqual(len(metric), 1)
+        self.assertEqual(metric.labels, "status=202")
+        self.assertEqual(metric.kind, "histogram")
+        self.assertEqual(metric.count, 1)
+
+    def test_02_flush_is_throttled(self):
+        """Prueba que sin forzar no se vuelca antes del intervalo."""
+        REGISTRY.inc("sms_es_dlr_unmatched_total")
+        self.assertEqual(self.env["sms_es.metric"]._flush_metrics(), 0)
+        self.assertEqual(
+            self.env["sms_es.metric"]._flush_metrics(force=True), 1
+        )
+
+    def test_03_totals_add_up_every_process(self):
+        """Prueba que los totales suman las muestras de todos los
+        procesos y no disminuyen al borrarlas."""
+        Metric = self.env["sms_es.metric"]
+        Metric.create(
+            [
+                {
+                    "name": "sms_es_queue_jobs_processed_total",
+                    "labels": "outcome=success",
+                    "kind": "counter",
+                    "count": count,
+                    "total": count,
+                }
+                for count in (2, 3)
+            ]
+        )
+        Metric._fold_metric_totals()
+        Metric.search([]).unlink()
+        self.assertEqual(Metric._fold_metric_totals(), 0)
+
+        text = Metric._render_metrics()
+        self.assertIn(
+            'sms_es_queue_jobs_processed_total{outcome="success"} 5', text
+        )
+
+
+class TestProfiler(TransactionCase):
+
+    def _profiled_work(self):
+        return sorted(str(number) for number in range(2000))
+
+    def test_01_disabled_saves_nothing(self):
+        """Prueba que con el perfilado desactivado no se guarda nada."""
+        self.env["ir.config_parameter"].sudo().set_param(
+            PARAM_PROFILE_SAMPLE_RATE, 0
+        )
+        with profile_sample(self.env, "queue_worker"):
+            self._profiled_work()
+        self.assertFalse(get_profile_report(self.env))
+
+    def test_02_sampled_profiles_are_accumulated(self):
+        """Prueba que los perfiles se acumulan y pueden borrarse."""
+        self.env["ir.config_parameter"].sudo().set_param(
+            PARAM_PROFILE_SAMPLE_RATE, 1
+        )
+        for _i in range(2):
+            with profile_sample(self.env, "queue_worker"):
+                self._profiled_work()
+
+        report = get_profile_report(self.env)
+        self.assertIn("Worker de la cola", report)
+        self.assertIn("_profiled_work", report)
+
+        reset_profiles(self.env)
+        self.assertFalse(get_profile_report(self.env))
+
+    def test_03_profiles_of_other_processes_are_merged(self):
+        """Prueba que cada proceso guarda su propio adjunto y que el
+        resumen los suma todos."""
+        self.env["ir.config_parameter"].sudo().set_param(
+            PARAM_PROFILE_SAMPLE_RATE, 1
+        )
+        with patch("os.getpid", return_value=1):
+            with profile_sample(self.env, "queue_worker"):
+                self._profiled_work()
+        with profile_sample(self.env, "queue_worker"):
+            sorted(range(10))
+
+        attachments = self.env["ir.attachment"].search(
+            [("name", "=like", "sms_es_profile_queue_worker_%")]
+        )
+        self.assertEqual(len(attachments), 2)
+        self.assertIn("_profiled_work", get_profile_report(self.env))
+
+    def test_04_compact_merges_attachments(self):
+        """Prueba que la compactación deja un único adjunto por camino
+        sin perder los perfiles."""
+        self.env["ir.config_parameter"].sudo().set_param(
+            PARAM_PROFILE_SAMPLE_RATE, 1
+        )
+        for pid in (1, 2, 3):
+            with patch("os.getpid", return_value=pid):
+                with profile_sample(self.env, "queue_worker"):
+                    self._profiled_work()
+
+        compact_profiles(self.env)
+        with profile_sample(self.env, "queue_worker"):
+            sorted(range(10))
+        compact_profiles(self.env)
+
+        attachments = self.env["ir.attachment"].search(
+            [("name", "=like", "sms_es_profile_queue_worker_%")]
+        )
+        self.assertEqual(
+            attachments.mapped("name"),
+            ["sms_es_profile_queue_worker_merged.prof"],
+        )
+        self.assertIn("_profiled_work", get_profile_report(self.env))
+
+
+@tagged("post_install", "-at_install")
+class TestMetricsEndpoint(HttpCase):
+
+    def setUp(self):
+        super(TestMetricsEndpoint, self).setUp()
+        self.env["ir.config_parameter"].sudo().set_param(
+            "sms_es_connector.metrics_token", "METRICS_TOKEN"
+        )
+
+    def test_01_requires_token(self):
+        """Prueba que el endpoint exige el token de métricas."""
+        response = self.url_open("/sms_es_connector/metrics?token=WRONG")
+        self.assertEqual(response.status_code, 401)
+
+    def test_02_exposes_metrics(self):
+        """Prueba la exposición en formato de texto con cabecera Bearer."""
+        REGISTRY.inc("sms_es_dlr_unmatched_total")
+        self.addCleanup(REGISTRY.reset)
+        # El endpoint expone los totales acumulados por el cron de métricas
+        Metric = self.env["sms_es.metric"]
+        Metric._flush_metrics(force=True)
+        Metric._fold_metric_totals()
+        response = self.url_open(
+            "/sms_es_connector/metrics",
+            headers={"Authorization": "Bearer METRICS_TOKEN"},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("text/plain", response.headers["Content-Type"])
+        self.assertIn("sms_es_dlr_unmatched_total", response.text)
@@ -1,7 +1,11 @@
 # -*- coding: utf-8 -*-
+from odoo import fields
+from odoo.exceptions import UserError
 from odoo.tests.common import TransactionCase
 from unittest.mock import patch
 
+from odoo.addons.sms_es_connector.models.sms_es_queue_job import fair_share
+
 
 class TestQueueLogic(TransactionCase):
 
@@ -17,7 +21,7 @@ class TestQueueLogic(TransactionCase):
             {
                 "name": "Original SMS",
                 "sender": "TestSender",
-                "receiver": "111222333",
+                "receiver": "611222333",
                 "text": "This is a test message.",
                 "state": "delivered",
             }
@@ -28,7 +32,7 @@ class TestQueueLogic(TransactionCase):
             {
                 "name": "Duplicate SMS",
                 "sender": "TestSender",
-                "receiver": "111222333",
+                "receiver": "611222333",
                 "text": "This is a test message.",
                 "state": "draft",
             }
@@ -57,7 +61,7 @@ class TestQueueLogic(TransactionCase):
             {
                 "name": "Test Backoff",
                 "sender": "Odoo",
-                "receiver": "444555666",
+                "receiver": "644555666",
                 "text": "Test retry logic.",
                 "state": "draft",
             }
@@ -75,3 +79,405 @@ class TestQueueLogic(TransactionCase):
         self.assertEqual(job.state, "pending")
         self.assertEqual(job.retry_count, 1)
         self.assertTrue(job.next_try_datetime > job.create_date)
+
+    def test_03_fair_share_allocation(self):
+        """Prueba el reparto justo ponderado de la capacidad."""
+        # La capacidad sobrante de una demanda pequeña pasa a las demás
+        self.assertEqual(
+            fair_share(10, {"a": 2, "b": 100}), {"a": 2, "b": 8}
+        )
+        # Reparto proporcional a los pesos
+        self.assertEqual(
+            fair_share(8, {"a": 100, "b": 100}, {"a": 3, "b": 1}),
+            {"a": 6, "b": 2},
+        )
+        # Nunca se asigna más de lo solicitado
+        self.assertEqual(fair_share(10, {"a": 1, "b": 2}), {"a": 1, "b": 2})
+
+    def test_04_claim_reserves_transactional_capacity(self):
+        """Prueba que una campaña masiva no acapare el ciclo del worker."""
+        messages = self.SmsMessage.create(
+            [
+                {
+                    "name": f"Bulk {i}",
+                    "sender": "Odoo",
+                    "receiver": f"6110000{i:02d}",
+                    "text": "Campaign.",
+                    "lane": "bulk",
+                }
+                for i in range(10)
+            ]
+        )
+        urgent = self.SmsMessage.create(
+            {
+                "name": "OTP",
+                "sender": "Odoo",
+                "receiver": "622000000",
+                "text": "Your code is 1234.",
+                "lane": "transactional",
+            }
+        )
+        (messages | urgent).action_queue_sms()
+
+        claimed = self.QueueJob._claim_jobs(limit=4)
+
+        self.assertEqual(len(claimed), 4)
+        self.assertIn(urgent, claimed.mapped("message_id"))
+        self.assertEqual(claimed[0].lane, "transactional")
+
+    def test_05_campaign_counters_and_cancel(self):
+        """Prueba los contadores de campaña y su cancelación en bloque."""
+        campaign = self.env["sms_es.campaign"].create(
+            {"name": "Test Campaign", "state": "running"}
+        )
+        messages = self.SmsMessage.create(
+            [
+                {
+                    "name": f"Campaign {i}",
+                    "sender": "Odoo",
+                    "receiver": f"6330000{i:02d}",
+                    "text": "Campaign.",
+                    "lane": "bulk",
+                    "campaign_id": campaign.id,
+                }
+                for i in range(4)
+            ]
+        )
+        messages.action_queue_sms()
+        Campaign = self.env["sms_es.campaign"]
+        # Los contadores no se tocan hasta que el cron suma las variaciones
+        self.assertEqual(campaign.message_count, 0)
+        Campaign._fold_counter_deltas()
+        self.assertEqual(campaign.message_count, 4)
+        self.assertEqual(campaign.queued_count, 4)
+
+        messages[0].write({"state": "api_sent"})
+        messages[1].write({"state": "delivered"})
+        Campaign._fold_counter_deltas()
+        self.assertEqual(campaign.queued_count, 2)
+        self.assertEqual(campaign.sent_count, 1)
+        self.assertEqual(campaign.delivered_count, 1)
+        self.assertEqual(campaign.progress, 50.0)
+
+        # La pausa retira los trabajos pendientes del reparto del worker
+        campaign.action_pause()
+        self.assertEqual(campaign.state, "paused")
+        self.assertFalse(
+            self.QueueJob._claim_jobs(limit=10).filtered(
+                lambda j: j.campaign_id == campaign
+            )
+        )
+
+        campaign.action_cancel()
+        Campaign._fold_counter_deltas()
+        self.assertEqual(campaign.state, "cancelled")
+        self.assertEqual(campaign.queued_count, 0)
+        self.assertEqual(campaign.cancelled_count, 2)
+        self.assertEqual(messages[2].state, "cancelled")
+        jobs = self.QueueJob.search([("campaign_id", "=", campaign.id)])
+        self.assertEqual(set(jobs.mapped("state")), {"cancelled"})
+
+    def test_06_bulk_pause_resume_cancel(self):
+        """Prueba las operaciones en bloque sobre la cola por dominio."""
+        messages = self.SmsMessage.create(
+            [
+                {
+                    "name": f"Bulk {i}",
+                    "sender": "Promo" if i % 2 else "Odoo",
+                    "receiver": f"6440000{i:02d}",
+                    "text": "Bulk operation.",
+                }
+                for i in range(6)
+            ]
+        )
+        messages.action_queue_sms()
+        domain = [("message_id.sender", "=", "Promo")]
+
+        self.assertEqual(self.QueueJob.pause_jobs(domain), 3)
+        self.assertFalse(
+            self.QueueJob._claim_jobs(limit=100).filtered(
+                lambda j: j.message_id.sender == "Promo"
+            )
+        )
+        self.assertEqual(self.QueueJob.resume_jobs(domain), 3)
+        self.assertEqual(self.QueueJob.cancel_jobs(domain), 3)
+
+        promo = messages.filtered(lambda m: m.sender == "Promo")
+        self.assertEqual(set(promo.mapped("state")), {"cancelled"})
+        self.assertEqual(
+            set((messages - promo).mapped("state")), {"queued"}
+        )
+
+    def test_07_invalid_numbers_rejected_and_dedup_normalized(self):
+        """Prueba el rechazo de números no válidos y la deduplicación de
+        números escritos de distinta forma."""
+        self.SmsMessage.create(
+            {
+                "name": "Original",
+                "sender": "Odoo",
+                "receiver": "+34 655 000 111",
+                "text": "Normalized dedup.",
+                "state": "delivered",
+            }
+        )
+        same_number = self.SmsMessage.create(
+            {
+                "name": "Same number",
+                "sender": "Odoo",
+                "receiver": "655-000-111",
+                "text": "Normalized dedup.",
+            }
+        )
+        invalid = self.SmsMessage.create(
+            {
+                "name": "Invalid",
+                "sender": "Odoo",
+                "receiver": "12345",
+                "text": "Invalid number.",
+            }
+        )
+        self.assertEqual(same_number.receiver, "34655000111")
+
+        (same_number | invalid).action_queue_sms()
+
+        self.assertEqual(same_number.state, "cancelled")
+        self.assertEqual(invalid.state, "invalid_number")
+        self.assertEqual(invalid.name, "[NÚMERO INVÁLIDO] Invalid")
+        self.assertFalse(
+            self.QueueJob.search_count(
+                [("message_id", "in", (same_number | invalid).ids)]
+            )
+        )
+
+    @patch(
+        "odoo.addons.sms_es_connector.models.sms_es_client."
+        "SmsEsClient.send_sms"
+    )
+    def test_08_worker_run_recorded(self, mock_send_sms):
+        """Prueba que cada ejecución del worker queda registrada."""
+        mock_send_sms.side_effect = [
+            {"status": "success", "data": {"msgId": "ok", "numParts": 1}},
+            {"status": "failed", "error": {"code": 503, "message": "Down"}},
+        ]
+        messages = self.SmsMessage.create(
+            [
+                {
+                    "name": f"Run {index}",
+                    "sender": "Odoo",
+                    "receiver": f"61100000{index}",
+                    "text": f"Worker run {index}.",
+                }
+                for index in range(3)
+            ]
+        )
+        messages.action_queue_sms()
+        self.env["sms_es.worker_run"].search([]).unlink()
+
+        self.QueueJob._process_sms_queue(limit=2)
+
+        run = self.env["sms_es.worker_run"].search([])
+        self.assertEqual(len(run), 1)
+        self.assertEqual(run.jobs_claimed, 2)
+        self.assertEqual(run.sent_count, 1)
+        self.assertEqual(run.retried_count, 1)
+        self.assertEqual(run.failed_count, 0)
+        # El trabajo no seleccionado sigue listo para enviar
+        self.assertEqual(run.backlog_remaining, 1)
+        self.assertGreaterEqual(run.wall_time, run.http_time)
+
+    def test_09_instant_dispatch_triggers_worker(self):
+        """Prueba que solo los SMS transaccionales despiertan al worker."""
+        if "ir.cron.trigger" not in self.env:
+            self.skipTest("ir.cron.trigger requiere Odoo 14 o superior.")
+        cron = self.env.ref("sms_es_connector.ir_cron_sms_queue_worker")
+        Trigger = self.env["ir.cron.trigger"]
+        self.env["ir.config_parameter"].sudo().set_param(
+            "sms_es_connector.instant_dispatch", "True"
+        )
+
+        def queue(lane, receiver):
+            self.SmsMessage.create(
+                {
+                    "name": f"Dispatch {lane}",
+                    "sender": "Odoo",
+                    "receiver": receiver,
+                    "text": f"Instant dispatch {receiver}.",
+                    "lane": lane,
+                }
+            ).action_queue_sms()
+            return Trigger.search_count([("cron_id", "=", cron.id)])
+
+        triggers = Trigger.search_count([("cron_id", "=", cron.id)])
+        self.assertEqual(queue("bulk", "622000001"), triggers)
+        self.assertEqual(queue("transactional", "622000002"), triggers + 1)
+
+        self.env["ir.config_parameter"].sudo().set_param(
+            "sms_es_connector.instant_dispatch", False
+        )
+        self.assertEqual(queue("transactional", "622000003"), triggers + 1)
+
+    def _create_otp_message(self, receiver):
+        config = self.env["ir.config_parameter"].sudo()
+        config.set_param("sms_es_connector.api_url", "http://fakeapi.com")
+        config.set_param("sms_es_connector.api_username", "user")
+        config.set_param("sms_es_connector.api_password", "pass")
+        return self.SmsMessage.create(
+            {
+                "name": "OTP",
+                "sender": "Odoo",
+                "receiver": receiver,
+                "text": f"Su código es {receiver[-4:]}.",
+            }
+        )
+
+    @patch(
+        "odoo.addons.sms_es_connector.models.sms_es_client."
+        "SmsEsClient.send_sms"
+    )
+    def test_10_send_now_skips_queue(self, mock_send_sms):
+        """Prueba que send_now envía sin crear trabajos en la cola."""
+        mock_send_sms.return_value = {
+            "status": "success",
+            "data": {"msgId": "otp-1", "numParts": 1},
+        }
+        message = self._create_otp_message("633000001")
+
+        self.assertEqual(message.send_now(), "otp-1")
+        self.assertEqual(message.state, "api_sent")
+        self.assertFalse(
+            self.QueueJob.search_count([("message_id", "=", message.id)])
+        )
+
+    @patch(
+        "odoo.addons.sms_es_connector.models.sms_es_client."
+        "SmsEsClient.send_sms"
+    )
+    def test_11_send_now_falls_back_to_queue(self, mock_send_sms):
+        """Prueba que un fallo transitorio encola el mensaje y uno
+        definitivo lo marca como fallido."""
+        mock_send_sms.return_value = {
+            "status": "failed",
+            "error": {"code": 105, "message": "Throttling"},
+            "transient": True,
+        }
+        queued = self._create_otp_message("633000002")
+        self.assertFalse(queued.send_now())
+        self.assertEqual(queued.state, "queued")
+        self.assertEqual(
+            self.QueueJob.search_count([("message_id", "=", queued.id)]), 1
+        )
+
+        mock_send_sms.return_value = {
+            "status": "failed",
+            "error": {"code": 103, "message": "Invalid receiver"},
+            "transient": False,
+        }
+        failed = self._create_otp_message("633000003")
+        self.assertFalse(failed.send_now())
+        self.assertEqual(failed.state, "api_failed")
+
+    @patch(
+        "odoo.addons.sms_es_connector.models.sms_es_client."
+        "SmsEsClient.send_sms"
+    )
+    def test_12_send_now_fallback_wakes_worker(self, mock_send_sms):
+        """Prueba que el envío encolado por send_now despierta al worker,
+        también con todas las cuentas en pausa, y que una configuración
+        incompleta no se encola en silencio."""
+        mock_send_sms.return_value = {
+            "status": "failed",
+            "error": {"code": 105, "message": "Throttling"},
+            "transient": True,
+        }
+        SmsMessage = type(self.SmsMessage)
+        with patch.object(SmsMessage, "_trigger_instant_dispatch") as wake:
+            queued = self._create_otp_message("633000004")
+            self.assertFalse(queued.send_now())
+            wake.assert_called_once_with(queued)
+
+            account = self.env["sms_es.account"].create(
+                {
+                    "name": "Cuenta en Pausa",
+                    "api_username": "user",
+                    "api_password": "pass",
+                    "cooldown_until": "2999-01-01 00:00:00",
+                }
+            )
+            paused = self._create_otp_message("633000005")
+            self.assertFalse(paused.send_now())
+            self.assertEqual(paused.state, "queued")
+            self.assertEqual(wake.call_count, 2)
+            account.active = False
+
+        self.env["ir.config_parameter"].sudo().set_param(
+            "sms_es_connector.api_password", False
+        )
+        incomplete = self.SmsMessage.create(
+            {
+                "name": "OTP",
+                "sender": "Odoo",
+                "receiver": "633000006",
+                "text": "Su código es 0006.",
+            }
+        )
+        with self.assertRaises(UserError):
+            incomplete.send_now()
+        self.assertFalse(
+            self.QueueJob.search_count([("message_id", "=", incomplete.id)])
+        )
+
+    @patch(
+        "odoo.addons.sms_es_connector.models.sms_es_client."
+        "SmsEsClient.send_sms"
+    )
+    def test_13_cancel_during_run_stops_the_batch(self, mock_send_sms):
+        """Prueba que un trabajo cancelado después de seleccionarlo para
+        el ciclo ya no se envía."""
+        messages = self._create_otp_message("633000007")
+        messages |= self._create_otp_message("633000008")
+        messages.action_queue_sms()
+        jobs = self.QueueJob.search([("message_id", "in", messages.ids)])
+
+        def cancel_the_rest(message_data, **kwargs):
+            self.QueueJob.cancel_jobs([("id", "in", jobs.ids)])
+            return {"status": "success", "data": {"msgId": "ok"}}
+
+        mock_send_sms.side_effect = cancel_the_rest
+        self.QueueJob._process_sms_queue(limit=2)
+
+        self.assertEqual(mock_send_sms.call_count, 1)
+        self.assertEqual(
+            sorted(jobs.mapped("state")), ["cancelled", "success"]
+        )
+
+    def test_14_claim_counts_a_bounded_window_per_source(self):
+        """Prueba que la reclamación cuenta cada origen por separado, con
+        un máximo por origen, y reparte el ciclo entre todos ellos."""
+        sources = ["res.partner"] * 6 + ["crm.lead"] * 6 + [False] * 2
+        messages = self.SmsMessage.create(
+            [
+                {
+                    "name": f"Source {i}",
+                    "sender": "Odoo",
+                    "receiver": f"6550000{i:02d}",
+                    "text": f"Source {i}.",
+                    "lane": "bulk",
+                    "res_model": res_model,
+                }
+                for i, res_model in enumerate(sources)
+            ]
+        )
+        messages.action_queue_sms()
+
+        backlog = self.QueueJob._get_lane_backlog(
+            "bulk", fields.Datetime.now(), 3
+        )
+        self.assertEqual(
+            backlog, {"crm.lead": 3, "res.partner": 3, False: 2}
+        )
+
+        claimed = self.QueueJob._claim_jobs(limit=6)
+        self.assertEqual(
+            sorted(claimed.mapped(lambda j: j.res_model or "")),
+            ["", "", "crm.lead", "crm.lead", "res.partner", "res.partner"],
+        )
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+from datetime import timedelta
+
+from odoo import fields
+from odoo.tests.common import TransactionCase
+
+
+class TestRetention(TransactionCase):
+
+    def setUp(self):
+        super(TestRetention, self).setUp()
+        self.SmsMessage = self.env["sms_es.message"]
+        self.QueueJob = self.env["sms_es.queue_job"]
+        self.DlrEvent = self.env["sms_es.dlr_event"]
+        self.Retention = self.env["sms_es.retention"]
+        self.old_date = fields.Datetime.now() - timedelta(days=400)
+
+    def _age(self, table, records, column="write_date"):
+        """Envejece los registros directamente en base de datos."""
+        self.env.cr.execute(
+            f"UPDATE {table} SET {column} = %s WHERE id = ANY(%s)",
+            [self.old_date, records.ids],
+        )
+        records.invalidate_cache()
+
+    def _create_message(self, state="delivered"):
+        return self.SmsMessage.create(
+            {
+                "name": "Retention",
+                "sender": "Odoo",
+                "receiver": "611222333",
+                "text": "Test retention.",
+                "state": state,
+            }
+        )
+
+    def test_01_archive_finished_jobs_and_old_events(self):
+        """Prueba que los trabajos terminados y los DLR antiguos se
+        muevan al archivo y los pendientes se conserven."""
+        message = self._create_message()
+        done_job = self.QueueJob.create(
+            {"name": "Done", "message_id": message.id, "state": "success"}
+        )
+        pending_job = self.QueueJob.create(
+            {"name": "Pending", "message_id": message.id}
+        )
+        event = self.DlrEvent.create(
+            {"message_id": message.id, "event": "DELIVERED"}
+        )
+        self._age("sms_es_queue_job", done_job | pending_job)
+        self._age("sms_es_dlr_event", event, column="create_date")
+
+        self.Retention._run_retention(auto_commit=False)
+
+        self.assertFalse(done_job.exists())
+        self.assertTrue(pending_job.exists())
+        self.assertFalse(event.exists())
+        archived_job = self.env["sms_es.queue_job_archive"].search(
+            [("original_id", "=", done_job.id)]
+        )
+        self.assertEqual(archived_job.state, "success")
+        self.assertEqual(archived_job.message_id, message.id)
+        self.assertTrue(
+            self.env["sms_es.dlr_event_archive"].search_count(
+                [("original_id", "=", event.id)]
+            )
+        )
+
+    def test_02_archive_messages_with_history(self):
+        """Prueba el archivado de mensajes finalizados junto con su
+        historial cuando la retención de mensajes está activada."""
+        self.env["ir.config_parameter"].sudo().set_param(
+            "sms_es_connector.retention_message_days", 30
+        )
+        message = self._create_message()
+        account = self.env["sms_es.account"].create(
+            {"name": "Archivo", "api_username": "u", "api_password": "p"}
+        )
+        message.write({"account_id": account.id})
+        draft = self._create_message(state="draft")
+        event = self.DlrEvent.create(
+            {"message_id": message.id, "event": "DELIVERED"}
+        )
+        self._age("sms_es_message", message | draft)
+        message_lane = message.lane
+
+        self.Retention._run_retention(auto_commit=False)
+
+        self.assertFalse(message.exists())
+        self.assertTrue(draft.exists())
+        archived = self.env["sms_es.message_archive"].search(
+            [("original_id", "=", message.id)]
+        )
+        self.assertEqual(archived.account_id, account.id)
+        self.assertEqual(archived.lane, message_lane)
+        self.assertTrue(
+            self.env["sms_es.dlr_event_archive"].search_count(
+                [("original_id", "=", event.id)]
+            )
+        )
+
+    def test_03_purge_finished_jobs(self):
+        """Prueba que los trabajos terminados se eliminen sin archivar
+        cuando la purga está activada."""
+        self.env["ir.config_parameter"].sudo().set_param(
+            "sms_es_connector.retention_job_purge", True
+        )
+        message = self._create_message()
+        job = self.QueueJob.create(
+            {"name": "Failed", "message_id": message.id, "state": "failed"}
+        )
+        self._age("sms_es_queue_job", job)
+
+        self.Retention._run_retention(auto_commit=False)
+
+        self.assertFalse(job.exists())
+        self.assertFalse(
+            self.env["sms_es.queue_job_archive"].search_count(
+                [("original_id", "=", job.id)]
+            )
+        )
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import hmac
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+from odoo.tests.common import TransactionCase
+
+from odoo.addons.sms_es_connector.models.sms_es_client import SmsEsClient
+from .sms_es_simulator import SmsEsSimulator
+
+
+class _DlrCapture:
+    """Servidor mínimo que guarda los DLR recibidos del simulador."""
+
+    def __init__(self):
+        self.requests = []
+        capture = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                capture.requests.append(
+                    (self.path, self.headers.get("X-SmsEs-Signature"), body)
+                )
+                self.send_response(200)
+                self.end_headers()
+                self.wfile.write(b"OK")
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def base_url(self):
+        return "http://127.0.0.1:%d" % self.server.server_address[1]
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class TestSmsEsSimulator(TransactionCase):
+
+    def setUp(self):
+        super(TestSmsEsSimulator, self).setUp()
+        self.capture = _DlrCapture()
+        self.addCleanup(self.capture.stop)
+        config = self.env["ir.config_parameter"].sudo()
+        config.set_param("sms_es_connector.api_username", "user")
+        config.set_param("sms_es_connector.api_password", "pass")
+        config.set_param("sms_es_connector.webhook_token", "TOKEN")
+        config.set_param("web.base.url", self.capture.base_url)
+
+    def _start_simulator(self, **kwargs):
+        simulator = SmsEsSimulator(
+            username="user", password="pass", seed=42, **kwargs
+        ).start()
+        self.addCleanup(simulator.stop)
+        self.env["ir.config_parameter"].sudo().set_param(
+            "sms_es_connector.api_url", simulator.url
+        )
+        return simulator
+
+    def _wait_for(self, condition, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while not condition() and time.monotonic() < deadline:
+            time.sleep(0.05)
+        return condition()
+
+    def test_01_submit_and_signed_dlr_callback(self):
+        """Prueba el envío real por HTTP y el DLR firmado de vuelta."""
+        simulator = self._start_simulator(hmac_secret="SECRET")
+
+        result = SmsEsClient(self.env).send_sms(
+            {
+                "receiver": "34611222333",
+                "sender": "Odoo",
+                "text": "Simulated",
+                "odoo_message_id": 7,
+            }
+        )
+
+        self.assertEqual(result["status"], "success")
+        self.assertEqual(result["data"]["numParts"], 1)
+        self.assertTrue(self._wait_for(lambda: self.capture.requests))
+        path, signature, body = self.capture.requests[0]
+        self.assertEqual(path, "/sms_es_connector/webhook/dlr?token=TOKEN")
+        self.assertEqual(
+            signature,
+            hmac.new(b"SECRET", body, hashlib.sha256).hexdigest(),
+        )
+        dlr = json.loads(body)
+        self.assertEqual(dlr["event"], "DELIVERED")
+        self.assertEqual(dlr["msgId"], result["data"]["msgId"])
+        self.assertEqual(dlr["custom"], {"odoo_message_id": 7})
+        self.assertEqual(simulator.stats["accepted"], 1)
+
+    @patch("time.sleep", return_value=None)
+    def test_02_throttling_exhausts_retries(self, mock_sleep):
+        """Prueba los reintentos del cliente ante un throttling continuo."""
+        simulator = self._start_simulator(throttle_ratio=1.0)
+
+        result = SmsEsClient(self.env).send_sms(
+            {
+                "receiver": "34611222333",
+                "sender": "Odoo",
+                "text": "Throttled",
+                "odoo_message_id": 8,
+            },
+            max_retries=3,
+        )
+
+        self.assertEqual(result["status"], "failed")
+        self.assertEqual(simulator.stats["throttled"], 3)
+
+    def test_03_worker_drains_queue_against_simulator(self):
+        """Prueba el ciclo cola -> API con el simulador."""
+        simulator = self._start_simulator()
+        messages = self.env["sms_es.message"].create(
+            [
+                {
+                    "name": f"Simulated {i}",
+                    "sender": "Odoo",
+                    "receiver": f"6550000{i:02d}",
+                    "text": f"Simulated queue {i}",
+                }
+                for i in range(5)
+            ]
+        )
+        messages.action_queue_sms()
+
+        self.env["sms_es.queue_job"]._process_sms_queue()
+
+        messages.invalidate_cache()
+        self.assertEqual(set(messages.mapped("state")), {"api_sent"})
+        self.assertEqual(simulator.stats["accepted"], 5)
+        self.assertTrue(all(messages.mapped("msg_id")))
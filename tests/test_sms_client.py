@@ -8,6 +8,7 @@ from odoo.addons.sms_es_connector.models.sms_es_client import (
     SmsEsClient,
     RC_THROTTLING_ERROR,
 )
+from odoo.addons.sms_es_connector.models.sms_es_transport import RateLimiter
 
 
 class TestSmsEsApiClient(BaseCase):
@@ -32,7 +33,7 @@ class TestSmsEsApiClient(BaseCase):
             "odoo_message_id": 1,
         }
 
-    @patch("requests.post")
+    @patch("requests.Session.post")
     def test_01_send_sms_success_202(self, mock_post):
         """Prueba de envío exitoso con respuesta HTTP 202."""
         mock_response = MagicMock()
@@ -49,7 +50,7 @@ class TestSmsEsApiClient(BaseCase):
         self.assertEqual(result["data"]["msgId"], "fake-uuid-123")
         mock_post.assert_called_once()
 
-    @patch("requests.post")
+    @patch("requests.Session.post")
     def test_02_send_sms_rejected_420(self, mock_post):
         """Prueba de rechazo de la API con respuesta HTTP 420."""
         mock_response = MagicMock()
@@ -66,7 +67,7 @@ class TestSmsEsApiClient(BaseCase):
         mock_post.assert_called_once()
 
     @patch("time.sleep", return_value=None)
-    @patch("requests.post")
+    @patch("requests.Session.post")
     def test_03_send_sms_throttling_retry_105(self, mock_post, mock_sleep):
         """Prueba de reintento tras un error de throttling (código 105)."""
         success_response = MagicMock(
@@ -87,7 +88,7 @@ class TestSmsEsApiClient(BaseCase):
         mock_sleep.assert_called_once_with(1)  # Espera de 1 segundo
 
     @patch("time.sleep", return_value=None)
-    @patch("requests.post")
+    @patch("requests.Session.post")
     def test_04_send_sms_server_error_retry_500(self, mock_post, mock_sleep):
         """Prueba de reintento tras un error de servidor HTTP 500."""
         success_response = MagicMock(
@@ -103,3 +104,39 @@ class TestSmsEsApiClient(BaseCase):
         self.assertEqual(result["status"], "success")
         self.assertEqual(mock_post.call_count, 2)
         mock_sleep.assert_called_once_with(60)  # Espera de 1 minuto
+
+    def test_05_payload_uses_message_dcs(self):
+        """Prueba que la codificación del mensaje prevalezca."""
+        payload = self.client._build_payload(
+            dict(self.message_data, dcs="ucs")
+        )
+        self.assertEqual(payload["dcs"], "ucs")
+        self.client.dcs = "auto"
+        payload = self.client._build_payload(
+            dict(self.message_data, text="Envío")
+        )
+        self.assertEqual(payload["dcs"], "ucs")
+
+    @patch("time.sleep", return_value=None)
+    @patch("requests.Session.post")
+    def test_06_no_wait_after_last_attempt(self, mock_post, mock_sleep):
+        """Prueba que no se espera tras el último intento y que el fallo
+        se marca como transitorio."""
+        mock_post.return_value = MagicMock(
+            status_code=503, text="Service Unavailable"
+        )
+
+        result = self.client.send_sms(self.message_data, max_retries=1)
+
+        self.assertEqual(result["status"], "failed")
+        self.assertTrue(result["transient"])
+        mock_sleep.assert_not_called()
+
+    def test_07_rate_limiter(self):
+        """Prueba el limitador de envíos compartido."""
+        limiter = RateLimiter(rate=2)
+        self.assertTrue(limiter.acquire(timeout=0))
+        self.assertTrue(limiter.acquire(timeout=0))
+        # Cupo agotado: no hay envío disponible sin esperar
+        self.assertFalse(limiter.acquire(timeout=0))
+        self.assertTrue(limiter.acquire(timeout=1))
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+from datetime import datetime
+
+from odoo.tests.common import BaseCase
+from odoo.addons.sms_es_connector.models.sms_es_encoding import (
+    count_segments,
+    detect_charset,
+    get_non_gsm_chars,
+)
+from odoo.addons.sms_es_connector.models.sms_es_phone import (
+    normalize_phone,
+    normalize_phones,
+)
+from odoo.addons.sms_es_connector.models.sms_es_schedule import SendWindow
+
+
+class TestSendWindow(BaseCase):
+
+    def test_01_even_spread(self):
+        """Prueba el reparto uniforme de envíos en una ventana."""
+        window = SendWindow(
+            datetime(2026, 3, 2, 10, 0), datetime(2026, 3, 2, 12, 0)
+        )
+        slots = window.slots(4)
+        self.assertEqual(
+            slots,
+            [
+                datetime(2026, 3, 2, 10, 0),
+                datetime(2026, 3, 2, 10, 30),
+                datetime(2026, 3, 2, 11, 0),
+                datetime(2026, 3, 2, 11, 30),
+            ],
+        )
+        # Los lotes obtienen los mismos momentos que el reparto completo
+        self.assertEqual(window.slots(4, first=2, length=2), slots[2:])
+
+    def test_02_quiet_hours_are_skipped(self):
+        """Prueba que no se programen envíos en el horario de silencio."""
+        # Silencio de 21:00 a 09:00 en Madrid (UTC+1 a principios de marzo)
+        # equivale a 20:00-08:00 UTC: de la ventana solo quedan 08:00-10:00.
+        window = SendWindow(
+            datetime(2026, 3, 2, 20, 0),
+            datetime(2026, 3, 3, 10, 0),
+            tz_name="Europe/Madrid",
+            quiet_start=21.0,
+            quiet_end=9.0,
+        )
+        self.assertEqual(window.total_seconds, 2 * 3600)
+        for slot in window.slots(10):
+            self.assertGreaterEqual(slot, datetime(2026, 3, 3, 8, 0))
+            self.assertLess(slot, datetime(2026, 3, 3, 10, 0))
+
+    def test_03_window_fully_silenced(self):
+        """Prueba una ventana sin tiempo permitido."""
+        window = SendWindow(
+            datetime(2026, 3, 2, 22, 0),
+            datetime(2026, 3, 2, 23, 0),
+            quiet_start=21.0,
+            quiet_end=9.0,
+        )
+        self.assertEqual(window.total_seconds, 0)
+        with self.assertRaises(ValueError):
+            window.slot(0, 1)
+
+
+class TestPhoneNormalization(BaseCase):
+
+    def test_01_spanish_formats(self):
+        """Prueba la normalización de los formatos nacionales."""
+        for number in (
+            "612345678",
+            "612 345 678",
+            "612-34-56-78",
+            "+34 612 345 678",
+            "0034612345678",
+            "34612345678",
+            "(+34) 612.345.678",
+        ):
+            self.assertEqual(normalize_phone(number), "34612345678", number)
+
+    def test_02_international_and_invalid(self):
+        """Prueba números extranjeros y números no válidos."""
+        self.assertEqual(normalize_phone("+44 7700 900123"), "447700900123")
+        self.assertEqual(normalize_phone("0044 7700 900123"), "447700900123")
+        for number in (
+            False,
+            "",
+            "123456789",  # No es un número español
+            "447700900123",  # Extranjero sin '+' ni '00'
+            "6123456789",  # Nacional con un dígito de más
+            "61234567",  # Demasiado corto
+            "+34 512 345 678",  # Prefijo español con número no válido
+            "612abc678",
+            "+0123456789",
+        ):
+            self.assertIsNone(normalize_phone(number), number)
+
+    def test_03_bulk_normalization(self):
+        """Prueba la normalización en bloque con números repetidos."""
+        self.assertEqual(
+            normalize_phones(["612345678", "612345678", "1"]),
+            {"612345678": "34612345678", "1": None},
+        )
+
+
+class TestSegmentCalculator(BaseCase):
+
+    def test_01_gsm_segments(self):
+        """Prueba el cálculo de partes en GSM-7."""
+        self.assertEqual(count_segments("a" * 160), ("gsm", 1, 160))
+        self.assertEqual(count_segments("a" * 161), ("gsm", 2, 161))
+        self.assertEqual(count_segments("a" * 306), ("gsm", 2, 306))
+        self.assertEqual(count_segments("a" * 307), ("gsm", 3, 307))
+        # Los caracteres de la tabla de extensión ocupan dos septetos
+        self.assertEqual(count_segments("€" * 80), ("gsm", 1, 160))
+        self.assertEqual(count_segments("€" * 81), ("gsm", 2, 162))
+        # Y nunca se parten entre dos fragmentos
+        self.assertEqual(count_segments("a" * 152 + "€" * 5)[1], 2)
+        self.assertEqual(count_segments("a" * 152 + "€" + "a" * 153)[1], 3)
+
+    def test_02_ucs_segments(self):
+        """Prueba el cálculo de partes en UCS-2."""
+        self.assertEqual(count_segments("á" * 70), ("ucs", 1, 70))
+        self.assertEqual(count_segments("á" * 71), ("ucs", 2, 71))
+        # Un emoji ocupa dos unidades UTF-16
+        self.assertEqual(count_segments("😀" * 35), ("ucs", 1, 70))
+        self.assertEqual(count_segments("😀" * 36), ("ucs", 2, 72))
+        # Codificación forzada
+        self.assertEqual(count_segments("Hola", "ucs"), ("ucs", 1, 4))
+
+    def test_03_charset_detection(self):
+        """Prueba la detección de caracteres fuera de GSM-7."""
+        self.assertEqual(detect_charset("Año [2026] ¿ok? 10€"), "gsm")
+        self.assertEqual(detect_charset("Envío rápido"), "ucs")
+        self.assertEqual(get_non_gsm_chars("Envío rápido í"), "íá")
@@ -65,7 +65,7 @@ class TestWebhookController(HttpCase):
             {
                 "name": "Test DLR Fallback",
                 "sender": "Odoo",
-                "receiver": "123123123",
+                "receiver": "623123123",
                 "text": "Test DLR processing.",
                 "state": "api_sent",
                 "msg_id": msg_uuid,
@@ -83,3 +83,76 @@ class TestWebhookController(HttpCase):
         self.assertEqual(response.status_code, 200)
         msg.invalidate_cache()
         self.assertEqual(msg.state, "undelivered")
+
+    def test_04_webhook_updates_delivery_summary(self):
+        """Prueba que el DLR actualice el resumen de entrega del mensaje."""
+        msg = self.SmsMessage.create(
+            {
+                "name": "Test DLR Summary",
+                "sender": "Odoo",
+                "receiver": "666777888",
+                "text": "Test DLR summary.",
+                "state": "api_sent",
+                "num_parts": 2,
+            }
+        )
+
+        for part_num, dlr_time in ((1, 1700000010.0), (2, 1700000005.0)):
+            dlr_payload = {
+                "event": "DELIVERED",
+                "partNum": part_num,
+                "numParts": 2,
+                "errorCode": 0,
+                "sendTime": 1700000000.0,
+                "dlrTime": dlr_time,
+                "custom": {"odoo_message_id": msg.id},
+            }
+            response = self.url_open(
+                url=self.webhook_url,
+                data=json.dumps(dlr_payload),
+                headers={"Content-Type": "application/json"},
+            )
+            self.assertEqual(response.status_code, 200)
+
+        msg.invalidate_cache()
+        self.assertEqual(msg.delivered_parts, 2)
+        self.assertEqual(msg.last_event, "DELIVERED")
+        # El DLR más antiguo, recibido después, no sustituye al último
+        self.assertEqual(msg.last_dlr_time, 1700000010.0)
+        self.assertEqual(msg.last_error_code, 0)
+
+    def test_05_duplicate_part_dlr_is_not_counted(self):
+        """Prueba que un DLR repetido de la misma parte no la cuente dos
+        veces como entregada."""
+        msg = self.SmsMessage.create(
+            {
+                "name": "Test DLR Duplicate",
+                "sender": "Odoo",
+                "receiver": "666777999",
+                "text": "Test DLR duplicate.",
+                "state": "api_sent",
+                "num_parts": 2,
+            }
+        )
+
+        for part_num in (1, 1, 2):
+            response = self.url_open(
+                url=self.webhook_url,
+                data=json.dumps(
+                    {
+                        "event": "DELIVERED",
+                        "partNum": part_num,
+                        "numParts": 2,
+                        "custom": {"odoo_message_id": msg.id},
+                    }
+                ),
+                headers={"Content-Type": "application/json"},
+            )
+            self.assertEqual(response.status_code, 200)
+            if part_num == 1:
+                msg.invalidate_cache()
+                self.assertEqual(msg.delivered_parts, 1)
+
+        msg.invalidate_cache()
+        self.assertEqual(msg.delivered_parts, 2)
+        self.assertEqual(msg.delivered_part_nums, "1,2")
@@ -1,11 +1,40 @@
 # -*- coding: utf-8 -*-
+import json
 import logging
+from datetime import datetime
+
 from odoo import models, fields, api
 from odoo.exceptions import UserError
 
+from ..models.sms_es_encoding import count_segments, get_non_gsm_chars
+from ..models.sms_es_phone import normalize_phones
+from ..models.sms_es_queue_job import QUEUE_LANES
+from ..models.sms_es_schedule import SendWindow
+from ..models.sms_es_template import SmsTemplate
+
 
 _logger = logging.getLogger(__name__)
 
+# Registros leídos por llamada a read() al resolver los destinatarios
+RECIPIENT_READ_BATCH = 1000
+
+# A partir de este número de registros el envío se prepara en segundo plano
+DEFAULT_ASYNC_SEND_THRESHOLD = 1000
+# Campos del asistente que se guardan en la campaña para el envío diferido
+SEND_OPTION_FIELDS = [
+    "res_model",
+    "sender",
+    "text",
+    "dcs",
+    "lane",
+    "schedule_mode",
+    "window_start",
+    "window_end",
+    "respect_quiet_hours",
+    "quiet_hours_start",
+    "quiet_hours_end",
+]
+
 
 class SmsComposeWizard(models.TransientModel):
     _name = "sms_es.compose.wizard"
@@ -23,11 +52,68 @@ class SmsComposeWizard(models.TransientModel):
         [
             ("gsm", "GSM (Estándar, 160 caracteres)"),
             ("ucs", "UCS-2 (Unicode, 70 caracteres)"),
+            ("auto", "Automática (según el texto)"),
         ],
         string="Codificación",
         required=True,
     )
 
+    # Cálculo de partes y coste antes de enviar
+    text_charset = fields.Selection(
+        [("gsm", "GSM"), ("ucs", "UCS-2")],
+        string="Codificación Resultante",
+        compute="_compute_segments",
+    )
+    text_length = fields.Integer(
+        string="Longitud", compute="_compute_segments"
+    )
+    text_parts = fields.Integer(
+        string="Partes por Mensaje", compute="_compute_segments"
+    )
+    non_gsm_chars = fields.Char(
+        string="Caracteres fuera de GSM", compute="_compute_segments"
+    )
+    recipient_count = fields.Integer(
+        string="Registros Seleccionados", compute="_compute_segments"
+    )
+    total_parts = fields.Integer(
+        string="Partes Totales", compute="_compute_segments"
+    )
+    estimated_cost = fields.Float(
+        string="Coste Estimado", compute="_compute_segments"
+    )
+    preview_text = fields.Text(
+        string="Vista Previa",
+        compute="_compute_preview_text",
+        help="Mensaje del primer registro seleccionado con los marcadores \
+            {{ campo }} sustituidos.",
+    )
+
+    lane = fields.Selection(
+        QUEUE_LANES,
+        string="Carril de Envío",
+        required=True,
+        default="transactional",
+    )
+
+    # Programación de campañas en una ventana de envío
+    schedule_mode = fields.Selection(
+        [
+            ("now", "Enviar ahora"),
+            ("window", "Repartir en una ventana de envío"),
+        ],
+        string="Programación",
+        required=True,
+        default="now",
+    )
+    window_start = fields.Datetime(string="Inicio de la Ventana")
+    window_end = fields.Datetime(string="Fin de la Ventana")
+    respect_quiet_hours = fields.Boolean(
+        string="Respetar Horario de Silencio", default=True
+    )
+    quiet_hours_start = fields.Float(string="Silencio Desde")
+    quiet_hours_end = fields.Float(string="Silencio Hasta")
+
     # Campos de opciones avanzadas (visibilidad controlada)
     config_use_flash = fields.Boolean(readonly=True)
     use_flash = fields.Boolean(string="Enviar como Mensaje Flash")
@@ -38,6 +124,46 @@ class SmsComposeWizard(models.TransientModel):
     )
     validate_period_minutes = fields.Integer(string="Validez (minutos)")
 
+    @api.depends("text", "res_model", "res_ids_str")
+    def _compute_preview_text(self):
+        for wizard in self:
+            template = SmsTemplate(wizard.text)
+            if template.is_static or not wizard.res_ids_str:
+                wizard.preview_text = wizard.text
+                continue
+            record = wizard.env[wizard.res_model].browse(
+                int(wizard.res_ids_str.split(",")[0])
+            )
+            try:
+                template.validate(record)
+                wizard.preview_text = template.render_records(record)[
+                    record.id
+                ]
+            except UserError as e:
+                wizard.preview_text = str(e)
+
+    @api.depends("text", "preview_text", "dcs", "res_ids_str")
+    def _compute_segments(self):
+        cost_per_part = float(
+            self.env["ir.config_parameter"]
+            .sudo()
+            .get_param("sms_es_connector.cost_per_part", 0.0)
+            or 0.0
+        )
+        for wizard in self:
+            # Con marcadores, el cálculo se hace sobre la vista previa
+            text = wizard.preview_text or wizard.text
+            charset, parts, length = count_segments(text, wizard.dcs)
+            wizard.text_charset = charset
+            wizard.text_length = length
+            wizard.text_parts = parts
+            wizard.non_gsm_chars = get_non_gsm_chars(text)
+            wizard.recipient_count = (
+                len(wizard.res_ids_str.split(",")) if wizard.res_ids_str else 0
+            )
+            wizard.total_parts = parts * wizard.recipient_count
+            wizard.estimated_cost = wizard.total_parts * cost_per_part
+
     @api.model
     def default_get(self, fields_list):
         # Asegúrate de tener 'import logging' y '_logger = ...'
@@ -78,6 +204,16 @@ class SmsComposeWizard(models.TransientModel):
                         "sms_es_connector.validate_period_minutes", 1440
                     )
                 ),
+                "quiet_hours_start": float(
+                    config_param.get_param(
+                        "sms_es_connector.quiet_hours_start", 21.0
+                    )
+                ),
+                "quiet_hours_end": float(
+                    config_param.get_param(
+                        "sms_es_connector.quiet_hours_end", 9.0
+                    )
+                ),
             }
         )
 
@@ -88,66 +224,223 @@ class SmsComposeWizard(models.TransientModel):
             res["res_ids_str"] = ",".join(
                 map(str, self.env.context["active_ids"])
             )
+            # Un envío a varios registros es una campaña masiva
+            if len(self.env.context["active_ids"]) > 1:
+                res["lane"] = "bulk"
 
         return res
 
     def _get_recipient_number(self, record):
         """
         Intenta obtener el número de móvil/teléfono del registro.
+        Para varios registros, use `_get_recipient_numbers`.
+        """
+        return self._get_recipient_numbers(record).get(record.id, (None,))[0]
+
+    def _get_recipient_fields(self, model):
+        """
+        Campos a leer para resolver el número de los registros de `model`.
         La lógica puede ser extendida según las necesidades.
+        :return: Tupla (campos de teléfono propios, campos de contacto en
+            orden de prioridad).
+        """
+        model_fields = model._fields
+        phone_fields = [
+            fname for fname in ("mobile", "phone") if fname in model_fields
+        ]
+        # 1. El propio modelo de Contacto (res.partner)
+        if model._name == "res.partner":
+            return phone_fields, []
+        # 2. Leads/Oportunidades: primero el número del propio Lead y, si no
+        # tiene, el del contacto asociado
+        if model._name == "crm.lead":
+            return phone_fields, ["partner_id"]
+        # 3. Otros modelos (Ventas, Facturas): la dirección de entrega, si
+        # existe, o el contacto
+        partner_fields = [
+            fname
+            for fname in ("partner_shipping_id", "partner_id")
+            if fname in model_fields
+        ]
+        return [], partner_fields
+
+    def _get_recipient_numbers(self, records):
         """
-        # 1. Lógica específica para el propio modelo de Contacto (res.partner)
-        if self.res_model == "res.partner":
-            return record.mobile or record.phone
-
-        # 2. Lógica específica para Leads/Oportunidades (crm.lead)
-        if self.res_model == "crm.lead":
-            # Prioridad 1: El móvil o teléfono del propio Lead
-            if record.mobile:
-                return record.mobile
-            if record.phone:
-                return record.phone
-            # Prioridad 2: Si no tiene, buscar en el contacto asociado
-            # (si existe)
-            if record.partner_id:
-                return record.partner_id.mobile or record.partner_id.phone
-            return None  # No se encontró número
-
-        # 3. Lógica genérica para otros modelos (Ventas, Facturas) que usan
-        # partner_id
-        if hasattr(record, "partner_id"):
-            # Usamos getattr para acceder de forma segura a
-            # 'partner_shipping_id',
-            # que puede no existir. Si no existe, usamos partner_id.
-            partner = (
-                getattr(record, "partner_shipping_id", None)
-                or record.partner_id
+        Resuelve en bloque el número y el nombre de los registros de origen
+        con unas pocas llamadas a read(), en lugar de cargar los campos
+        registro a registro.
+        :param records: Registros de origen.
+        :return: Diccionario {id: (número o None, nombre a mostrar)}.
+        """
+        phone_fields, partner_fields = self._get_recipient_fields(records)
+        fnames = ["display_name"] + phone_fields + partner_fields
+
+        recipients = {}
+        pending_partners = {}
+        ids = records.ids
+        for start in range(0, len(ids), RECIPIENT_READ_BATCH):
+            chunk = records.browse(ids[start:start + RECIPIENT_READ_BATCH])
+            # load=None devuelve los Many2one como ids, sin name_get
+            for row in chunk.read(fnames, load=None):
+                number = next(
+                    (row[fname] for fname in phone_fields if row[fname]),
+                    None,
+                )
+                recipients[row["id"]] = (number, row["display_name"])
+                if not number:
+                    partner_id = next(
+                        (row[fname] for fname in partner_fields if row[fname]),
+                        None,
+                    )
+                    if partner_id:
+                        pending_partners[row["id"]] = partner_id
+
+        if pending_partners:
+            Partner = self.env["res.partner"]
+            partner_phone_fields = [
+                fname
+                for fname in ("mobile", "phone")
+                if fname in Partner._fields
+            ]
+            partner_ids = list(set(pending_partners.values()))
+            partner_numbers = {}
+            for start in range(0, len(partner_ids), RECIPIENT_READ_BATCH):
+                partners = Partner.browse(
+                    partner_ids[start:start + RECIPIENT_READ_BATCH]
+                )
+                for row in partners.read(partner_phone_fields):
+                    partner_numbers[row["id"]] = next(
+                        (
+                            row[fname]
+                            for fname in partner_phone_fields
+                            if row[fname]
+                        ),
+                        None,
+                    )
+            for record_id, partner_id in pending_partners.items():
+                recipients[record_id] = (
+                    partner_numbers.get(partner_id),
+                    recipients[record_id][1],
+                )
+
+        return recipients
+
+    def _get_send_window(self):
+        """
+        Construye la ventana de envío configurada en el asistente.
+        :return: SendWindow, o None si el envío es inmediato.
+        """
+        if self.schedule_mode != "window":
+            return None
+        if not self.window_start or not self.window_end:
+            raise UserError("Indique el inicio y el fin de la ventana.")
+        if self.window_end <= self.window_start:
+            raise UserError(
+                "El fin de la ventana debe ser posterior a su inicio."
             )
-            if partner:
-                return partner.mobile or partner.phone
 
-        return None
+        quiet_start = quiet_end = None
+        if self.respect_quiet_hours:
+            quiet_start = self.quiet_hours_start
+            quiet_end = self.quiet_hours_end
+        window = SendWindow(
+            self.window_start,
+            self.window_end,
+            tz_name=self.env.context.get("tz") or self.env.user.tz or "UTC",
+            quiet_start=quiet_start,
+            quiet_end=quiet_end,
+        )
+        if not window.total_seconds:
+            raise UserError(
+                "La ventana de envío queda completamente dentro del \
+                    horario de silencio."
+            )
+        return window
 
-    def action_send_sms(self):
-        self.ensure_one()
-        if not self.res_ids_str:
-            raise UserError("No se ha seleccionado ningún registro.")
+    def _create_campaign(self, records, state="running"):
+        """
+        Crea la campaña que agrupa los mensajes de este envío.
+        :param records: Registros de origen seleccionados.
+        :param state: Estado inicial de la campaña.
+        :return: Registro sms_es.campaign.
+        """
+        model_name = self.env["ir.model"]._get(self.res_model).name
+        now = fields.Datetime.to_string(fields.Datetime.now())
+        return self.env["sms_es.campaign"].create(
+            {
+                "name": f"{model_name}: {len(records)} registros ({now})",
+                "state": state,
+                "res_model": self.res_model,
+                "lane": self.lane,
+            }
+        )
 
-        res_ids = [int(i) for i in self.res_ids_str.split(",")]
-        records = self.env[self.res_model].browse(res_ids)
+    def _check_send(self, records):
+        """
+        Validaciones previas al envío, comunes al envío inmediato y al
+        envío en segundo plano.
+        """
+        if self.dcs == "gsm" and get_non_gsm_chars(self.text):
+            raise UserError(
+                "El texto contiene caracteres que no se pueden enviar en \
+                    GSM: %s. Elija UCS-2 o la codificación automática."
+                % get_non_gsm_chars(self.text)
+            )
+        SmsTemplate(self.text).validate(records)
+        self._get_send_window()
+
+    def _get_send_options(self):
+        """
+        Opciones del asistente necesarias para crear los mensajes más
+        tarde, serializables en JSON.
+        """
+        options = {}
+        for fname in SEND_OPTION_FIELDS:
+            value = self[fname]
+            if isinstance(value, datetime):
+                value = fields.Datetime.to_string(value)
+            options[fname] = value
+        return options
 
-        all_messages = self.env["sms_es.message"]
+    def _send_to_records(self, records, campaign, offset=0, total=None):
+        """
+        Crea y encola los mensajes de un bloque de registros.
+        :param records: Registros de origen del bloque.
+        :param campaign: Campaña a la que pertenecen los mensajes.
+        :param offset: Posición del bloque dentro de toda la selección.
+        :param total: Tamaño de toda la selección, para repartir los
+            envíos en la ventana.
+        :return: Tupla (mensajes creados, nombres de registros omitidos).
+        """
+        total = total or len(records)
+        template = SmsTemplate(self.text)
+        send_window = self._get_send_window()
+        message_vals_list = []
         skipped_records = []
+        display_names = {}
 
-        for record in records:
-            receiver_number = self._get_recipient_number(record)
+        recipients = self._get_recipient_numbers(records)
+        normalized = normalize_phones(
+            number for number, _name in recipients.values() if number
+        )
+        for index, record in enumerate(records, start=offset):
+            receiver_number, display_name = recipients.get(
+                record.id, (None, str(record.id))
+            )
             if not receiver_number:
-                skipped_records.append(record.display_name)
+                skipped_records.append(display_name)
+                continue
+            if not normalized.get(receiver_number):
+                skipped_records.append(
+                    f"{display_name} (número no válido: {receiver_number})"
+                )
                 continue
+            receiver_number = normalized[receiver_number]
+            display_names[record.id] = display_name
 
             # Crear el registro del mensaje
             message_vals = {
-                "name": f"SMS para {record.display_name}",
+                "name": f"SMS para {display_name}",
                 "text": self.text,
                 "sender": self.sender,
                 "receiver": receiver_number,
@@ -155,6 +448,8 @@ class SmsComposeWizard(models.TransientModel):
                 # Relacionar el mensaje con su origen
                 "res_id": record.id,
                 "res_model": self.res_model,
+                "lane": self.lane,
+                "campaign_id": campaign.id,
             }
             # Añadir campos directos para acceso rápido si el modelo coincide
             if self.res_model == "res.partner":
@@ -166,25 +461,106 @@ class SmsComposeWizard(models.TransientModel):
             elif self.res_model == "account.move":
                 message_vals["account_move_id"] = record.id
 
-            new_message = self.env["sms_es.message"].create(message_vals)
-            all_messages |= new_message
+            # Repartir los envíos de forma uniforme sobre la ventana según
+            # la posición del registro en toda la selección
+            if send_window:
+                message_vals["scheduled_datetime"] = send_window.slot(
+                    index, total
+                )
+
+            message_vals_list.append(message_vals)
+
+        # Personalizar el texto de cada mensaje con una sola lectura en
+        # bloque de los campos de la plantilla
+        texts = template.render_records(
+            records.browse([vals["res_id"] for vals in message_vals_list])
+        )
+        rendered_vals_list = []
+        for message_vals in message_vals_list:
+            text = texts[message_vals["res_id"]]
+            # Un marcador puede introducir caracteres fuera de GSM-7 (p. ej.
+            # "María"): forzar GSM los corrompería, así que se omite el
+            # registro. En modo automático count_segments elige UCS-2.
+            non_gsm_chars = self.dcs == "gsm" and get_non_gsm_chars(text)
+            if non_gsm_chars:
+                display_name = display_names[message_vals["res_id"]]
+                skipped_records.append(
+                    f"{display_name} (caracteres no GSM: {non_gsm_chars})"
+                )
+                continue
+            message_vals["text"] = text
+            message_vals["dcs"] = count_segments(text, self.dcs)[0]
+            rendered_vals_list.append(message_vals)
+        message_vals_list = rendered_vals_list
+
+        messages = self.env["sms_es.message"].create(message_vals_list)
+        # Poner todos los mensajes creados en la cola
+        messages.action_queue_sms()
+        return messages, skipped_records
+
+    def _get_async_send_threshold(self):
+        return int(
+            self.env["ir.config_parameter"]
+            .sudo()
+            .get_param(
+                "sms_es_connector.async_send_threshold",
+                DEFAULT_ASYNC_SEND_THRESHOLD,
+            )
+        )
+
+    def action_send_sms(self):
+        self.ensure_one()
+        if not self.res_ids_str:
+            raise UserError("No se ha seleccionado ningún registro.")
+
+        res_ids = [int(i) for i in self.res_ids_str.split(",")]
+        records = self.env[self.res_model].browse(res_ids)
+        self._check_send(records)
+
+        # Las selecciones grandes se preparan en segundo plano por bloques,
+        # para no superar el tiempo máximo de la petición HTTP
+        threshold = self._get_async_send_threshold()
+        if threshold and len(res_ids) > threshold:
+            campaign = self._create_campaign(records, state="preparing")
+            campaign.write(
+                {
+                    "send_options": json.dumps(self._get_send_options()),
+                    "send_res_ids": self.res_ids_str,
+                    "send_total": len(res_ids),
+                }
+            )
+            _logger.info(
+                "Envío de %d registros diferido a la campaña %d.",
+                len(res_ids),
+                campaign.id,
+            )
+            return {
+                "type": "ir.actions.act_window",
+                "res_model": "sms_es.campaign",
+                "res_id": campaign.id,
+                "view_mode": "form",
+                "target": "current",
+            }
+
+        campaign = self._create_campaign(records)
+        all_messages, skipped_records = self._send_to_records(
+            records, campaign
+        )
 
         if not all_messages:
             raise UserError(
                 "No se pudo crear ningún mensaje. Verifique que los \
-                siguientes registros tengan un número de teléfono o móvil:\n\n"
+                siguientes registros tengan un número de teléfono o móvil \
+                válido:\n\n"
                 + "\n".join(skipped_records)
             )
 
-        # Poner todos los mensajes creados en la cola
-        all_messages.action_queue_sms()
-
         if skipped_records:
             # Notificar al usuario si algunos registros no tenían número
             # (Esto se podría hacer con un pop-up más avanzado si se desea)
             _logger.warning(
                 "No se pudo enviar SMS a los siguientes "
-                "registros por falta de número: %s",
+                "registros sin número válido: %s",
                 ", ".join(skipped_records),
             )
 